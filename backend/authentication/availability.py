@@ -0,0 +1,118 @@
+import hashlib
+import math
+import threading
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+# Every username and email in use, held in memory by each process as a Bloom
+# filter. A value the filter does not hold is free, so the validation
+# endpoints answer most keystrokes without a query; a value it holds is
+# confirmed against auth_user. Saving a user's username or email replaces a
+# token in the shared cache, and a filter loaded before the current token
+# gives no negative answers: until it is reloaded, after
+# AVAILABILITY_FILTER_TIMEOUT seconds or after rebuild(), every value is
+# checked against auth_user, so a name registered through another process
+# never shows as free. Bulk updates send no signal and are only picked up on
+# reload. Registration itself always checks the database.
+
+GENERATION_KEY = 'authentication:availability'
+CHANGED_KEY = 'authentication:availability:changed'
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        capacity = max(capacity, 1)
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big')
+        return [(h1 + n * h2) % self.size for n in range(self.hashes)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+def _key(field, value):
+    return '%s:%s' % (field, value)
+
+
+KEYS = [GENERATION_KEY, CHANGED_KEY]
+
+# (filter, monotonic load time, generation, changed token), replaced as a
+# whole so a reader never pairs one load's filter with another's token.
+_loaded = None
+_lock = threading.Lock()
+
+
+def _fresh(generation):
+    return (_loaded is not None and generation == _loaded[2]
+            and time.monotonic() - _loaded[1] < settings.AVAILABILITY_FILTER_TIMEOUT)
+
+
+def _load(generation, changed):
+    global _loaded
+    with _lock:
+        if not _fresh(generation):
+            # Room for the signups made before the next reload.
+            capacity = 2 * (User.objects.count() + settings.AVAILABILITY_FILTER_HEADROOM)
+            bloom = BloomFilter(capacity, settings.AVAILABILITY_FILTER_ERROR_RATE)
+            for username, email in User.objects.values_list('username', 'email').iterator():
+                bloom.add(_key('username', username))
+                bloom.add(_key('email', email))
+            # ``changed`` was read before the scan, so a user saved during
+            # it leaves this filter stale rather than silently missing.
+            _loaded = bloom, time.monotonic(), generation, changed
+    return _loaded
+
+
+def _free(loaded, changed, field, value):
+    bloom, _, _, loaded_changed = loaded
+    return changed == loaded_changed and _key(field, value) not in bloom
+
+
+def get_filter():
+    """The process-wide filter, reloaded when stale or after :func:`rebuild`."""
+    values = cache.get_many(KEYS)
+    generation = values.get(GENERATION_KEY)
+    return (_loaded if _fresh(generation) else _load(generation, values.get(CHANGED_KEY)))[0]
+
+
+def taken(field, value):
+    """Whether a user has ``value`` as ``field`` (``'username'`` or ``'email'``)."""
+    values = cache.get_many(KEYS)
+    generation, changed = values.get(GENERATION_KEY), values.get(CHANGED_KEY)
+    loaded = _loaded if _fresh(generation) else _load(generation, changed)
+    if _free(loaded, changed, field, value):
+        return False
+    return User.objects.filter(**{field: value}).exists()
+
+
+async def ataken(field, value):
+    values = await cache.aget_many(KEYS)
+    generation, changed = values.get(GENERATION_KEY), values.get(CHANGED_KEY)
+    loaded = _loaded if _fresh(generation) else await sync_to_async(_load)(generation, changed)
+    if _free(loaded, changed, field, value):
+        return False
+    return await User.objects.filter(**{field: value}).aexists()
+
+
+def changed():
+    """Make filters loaded so far confirm every value against auth_user."""
+    cache.set(CHANGED_KEY, uuid.uuid4().hex, None)
+
+
+def rebuild():
+    """Make every process sharing the cache reload its filter on its next check."""
+    cache.set(GENERATION_KEY, uuid.uuid4().hex, None)
@@ -0,0 +1,147 @@
+import datetime
+import logging
+import os
+import queue
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections, transaction
+from django.utils.timezone import now
+
+from .models import QueuedEmail
+
+logger = logging.getLogger(__name__)
+
+# Wake-up tokens for the worker pool. The messages themselves live in the
+# QueuedEmail table, so a full queue only delays delivery until the next
+# poll; nothing is dropped and pending mail survives a restart.
+_wakeups = queue.Queue(maxsize=settings.EMAIL_QUEUE_MAXSIZE)
+_workers = []
+_workers_lock = threading.Lock()
+_pid = None  # process that started _workers
+
+
+def queue_email(message):
+    """Persist an EmailMessage and hand it to the worker pool on commit."""
+    email = QueuedEmail.objects.create(subject=message.subject, body=message.body,
+                                       from_email=message.from_email, to=list(message.to))
+    transaction.on_commit(_wake)
+    return email
+
+
+def _wake():
+    if not settings.EMAIL_QUEUE_WORKERS:
+        return
+    start_workers()
+    try:
+        _wakeups.put_nowait(None)
+    except queue.Full:
+        pass
+
+
+def start_workers():
+    """Start this process's EMAIL_QUEUE_WORKERS threads, if not running.
+
+    Called by the server entry points (finance_tracker.wsgi and .asgi) and
+    again on each wake-up. The workers first poll after
+    EMAIL_QUEUE_POLL_INTERVAL seconds, so mail left pending by a restart
+    goes out without waiting for the next queue_email(). Threads that died,
+    or that ran in the parent of a forked process, are replaced.
+    """
+    global _pid, _wakeups
+    with _workers_lock:
+        if _pid != os.getpid():
+            _pid = os.getpid()
+            _workers.clear()
+            _wakeups = queue.Queue(maxsize=settings.EMAIL_QUEUE_MAXSIZE)
+        _workers[:] = [worker for worker in _workers if worker.is_alive()]
+        while len(_workers) < settings.EMAIL_QUEUE_WORKERS:
+            worker = threading.Thread(target=_work, name='email-worker-%d' % len(_workers),
+                                      daemon=True)
+            worker.start()
+            _workers.append(worker)
+
+
+def _work():
+    while True:
+        try:
+            _wakeups.get(timeout=settings.EMAIL_QUEUE_POLL_INTERVAL)
+        except queue.Empty:
+            pass  # poll anyway so retries whose backoff expired go out
+        try:
+            # Messages of a worker or process that died mid-batch.
+            release_stale_claims()
+            while process():
+                pass
+        except Exception:
+            logger.exception('Email worker failed')
+        finally:
+            close_old_connections()
+
+
+def _claim(batch_size):
+    token = uuid.uuid4()
+    due = list(QueuedEmail.objects
+               .filter(status=QueuedEmail.PENDING, next_attempt_at__lte=now())
+               .order_by('next_attempt_at')
+               .values_list('pk', flat=True)[:batch_size])
+    if not due:
+        return []
+    # Only rows still pending flip to this token, so concurrent workers and
+    # processes never send the same message twice.
+    QueuedEmail.objects.filter(pk__in=due, status=QueuedEmail.PENDING).update(
+        status=QueuedEmail.SENDING, claim=token, claimed_at=now())
+    return list(QueuedEmail.objects.filter(claim=token, status=QueuedEmail.SENDING))
+
+
+def process(batch_size=None):
+    """Send one batch of due messages over a single SMTP connection.
+
+    Returns the number of messages claimed, so callers can loop until 0.
+    """
+    emails = _claim(batch_size or settings.EMAIL_QUEUE_BATCH_SIZE)
+    if not emails:
+        return 0
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        for email in emails:
+            _failed(email, e)
+        return len(emails)
+    try:
+        for email in emails:
+            message = EmailMessage(email.subject, email.body, email.from_email, email.to,
+                                   connection=connection)
+            try:
+                message.send(fail_silently=False)
+            except Exception as e:
+                _failed(email, e)
+            else:
+                QueuedEmail.objects.filter(pk=email.pk).update(
+                    status=QueuedEmail.SENT, sent_at=now(), claim=None, last_error='')
+    finally:
+        connection.close()
+    return len(emails)
+
+
+def _failed(email, error):
+    attempts = email.attempts + 1
+    if attempts >= settings.EMAIL_QUEUE_MAX_ATTEMPTS:
+        status = QueuedEmail.FAILED
+        logger.error('Giving up on email %s after %d attempts: %s', email.pk, attempts, error)
+    else:
+        status = QueuedEmail.PENDING
+    delay = settings.EMAIL_QUEUE_RETRY_DELAY * 2 ** (attempts - 1)
+    QueuedEmail.objects.filter(pk=email.pk).update(
+        status=status, attempts=attempts, claim=None, last_error=str(error),
+        next_attempt_at=now() + datetime.timedelta(seconds=delay))
+
+
+def release_stale_claims():
+    """Return messages claimed by a worker that died mid-batch to the queue."""
+    cutoff = now() - datetime.timedelta(seconds=settings.EMAIL_QUEUE_CLAIM_TIMEOUT)
+    return QueuedEmail.objects.filter(status=QueuedEmail.SENDING, claimed_at__lt=cutoff).update(
+        status=QueuedEmail.PENDING, claim=None)
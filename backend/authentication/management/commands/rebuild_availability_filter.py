@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from authentication.availability import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Make every server process reload its username/email availability filter.'
+
+    def handle(self, *args, **options):
+        rebuild()
+        self.stdout.write('Availability filters will be reloaded on their next check')
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from authentication.mail import process, release_stale_claims
+
+
+class Command(BaseCommand):
+    help = 'Send all due messages in the outgoing email queue, one SMTP connection per batch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            help='Messages per SMTP connection (default EMAIL_QUEUE_BATCH_SIZE).')
+
+    def handle(self, *args, **options):
+        released = release_stale_claims()
+        if released:
+            self.stdout.write('Released %d stale claims' % released)
+        total = 0
+        while True:
+            claimed = process(options['batch_size'])
+            if not claimed:
+                break
+            total += claimed
+        self.stdout.write('Processed %d messages' % total)
@@ -0,0 +1,12 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from . import availability
+
+
+@receiver(post_save, sender=User)
+def mark_availability_changed(sender, instance, update_fields=None, **kwargs):
+    # Logins save only last_login, which leaves the filters valid.
+    if update_fields is None or {'username', 'email'} & set(update_fields):
+        availability.changed()
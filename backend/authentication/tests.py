@@ -1,3 +1,180 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core import mail as outbox
+from django.core.cache import cache
+from django.core.mail import get_connection
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils.timezone import now
+
+from . import availability, mail
+from .models import QueuedEmail
 
 # Create your tests here.
+class AvailabilityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user('taken', email='taken@example.com')
+
+    def setUp(self):
+        cache.clear()
+        availability.rebuild()
+        availability.get_filter()
+
+    def check(self, field, value):
+        return self.client.post(reverse('validate-' + field), json.dumps({field: value}),
+                                content_type='application/json').status_code
+
+    def test_free_values_need_no_query(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.check('username', 'free'), 200)
+            self.assertEqual(self.check('email', 'free@example.com'), 200)
+
+    def test_taken_values_are_confirmed(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.check('username', 'taken'), 409)
+        self.assertEqual(self.check('email', 'taken@example.com'), 409)
+
+    def test_new_user_is_added(self):
+        User.objects.create_user('newcomer', email='new@example.com')
+        self.assertTrue(availability.taken('username', 'newcomer'))
+        self.assertTrue(availability.taken('email', 'new@example.com'))
+
+    def test_signup_elsewhere_is_not_free(self):
+        # The filter loaded in setUp predates the signup, as in a process
+        # that did not handle it.
+        User.objects.create_user('elsewhere', email='elsewhere@example.com')
+        self.assertNotIn('username:elsewhere', availability.get_filter())
+        with self.assertNumQueries(1):
+            self.assertEqual(self.check('username', 'elsewhere'), 409)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.check('username', 'free'), 200)
+        availability.rebuild()
+        availability.get_filter()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.check('username', 'free'), 200)
+
+    def test_login_keeps_filter(self):
+        user = User.objects.get(username='taken')
+        user.set_password('x')
+        user.save(update_fields=['password'])
+        self.client.post(reverse('login'), {'username': 'taken', 'password': 'x'})
+        self.client.logout()
+        user.refresh_from_db()
+        self.assertIsNotNone(user.last_login)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.check('username', 'free'), 200)
+
+    def test_bloom_filter(self):
+        bloom = availability.BloomFilter(1000, 0.01)
+        for n in range(1000):
+            bloom.add('user%d' % n)
+        self.assertTrue(all('user%d' % n in bloom for n in range(1000)))
+        self.assertLess(sum('other%d' % n in bloom for n in range(1000)), 30)
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+                   EMAIL_QUEUE_RETRY_DELAY=60, EMAIL_QUEUE_MAX_ATTEMPTS=3, EMAIL_QUEUE_CLAIM_TIMEOUT=600)
+class EmailQueueTests(TestCase):
+    def queue(self, count=1):
+        return [QueuedEmail.objects.create(subject='Hello %d' % n, body='Hi', from_email='app@example.com',
+                                           to=['user%d@example.com' % n])
+                for n in range(count)]
+
+    def failing(self):
+        return mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                          side_effect=OSError('connection refused'))
+
+    def test_batch_over_one_connection(self):
+        self.queue(3)
+        with mock.patch('authentication.mail.get_connection', wraps=get_connection) as connect:
+            self.assertEqual(mail.process(batch_size=2), 2)
+        connect.assert_called_once()
+        self.assertEqual(len(outbox.outbox), 2)
+        self.assertEqual(mail.process(batch_size=2), 1)
+        self.assertEqual(mail.process(batch_size=2), 0)
+        self.assertEqual(len(outbox.outbox), 3)
+        self.assertEqual(set(QueuedEmail.objects.values_list('status', flat=True)), {QueuedEmail.SENT})
+
+    def test_retry_with_backoff(self):
+        email, = self.queue()
+        with self.failing():
+            start = now()
+            self.assertEqual(mail.process(), 1)
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts, email.last_error),
+                             (QueuedEmail.PENDING, 1, 'connection refused'))
+            self.assertGreaterEqual(email.next_attempt_at, start + datetime.timedelta(seconds=60))
+            # Not due again until the delay has passed.
+            self.assertEqual(mail.process(), 0)
+
+            QueuedEmail.objects.update(next_attempt_at=now())
+            start = now()
+            mail.process()
+            email.refresh_from_db()
+            self.assertEqual(email.attempts, 2)
+            self.assertGreaterEqual(email.next_attempt_at, start + datetime.timedelta(seconds=120))
+
+        QueuedEmail.objects.update(next_attempt_at=now())
+        mail.process()
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.last_error), (QueuedEmail.SENT, ''))
+        self.assertEqual(len(outbox.outbox), 1)
+
+    def test_failed_after_max_attempts(self):
+        email, = self.queue()
+        with self.failing(), self.assertLogs('authentication.mail', 'ERROR'):
+            for _ in range(3):
+                QueuedEmail.objects.update(next_attempt_at=now())
+                mail.process()
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (QueuedEmail.FAILED, 3))
+        QueuedEmail.objects.update(next_attempt_at=now())
+        self.assertEqual(mail.process(), 0)
+
+    def test_release_stale_claims(self):
+        stale, fresh = self.queue(2)
+        QueuedEmail.objects.update(status=QueuedEmail.SENDING, claimed_at=now())
+        QueuedEmail.objects.filter(pk=stale.pk).update(claimed_at=now() - datetime.timedelta(seconds=601))
+        self.assertEqual(mail.release_stale_claims(), 1)
+        self.assertEqual(mail.process(), 1)
+        self.assertEqual([message.to for message in outbox.outbox], [stale.to])
+        fresh.refresh_from_db()
+        self.assertEqual(fresh.status, QueuedEmail.SENDING)
+
+    @override_settings(EMAIL_QUEUE_WORKERS=0)
+    def test_registration_queues_mail(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('register'), {
+                'username': 'queued', 'email': 'queued@example.com', 'password': 'secret1'})
+        self.assertContains(response, 'Account created successfully')
+        self.assertEqual(outbox.outbox, [])
+        email = QueuedEmail.objects.get()
+        self.assertEqual((email.to, email.status), (['queued@example.com'], QueuedEmail.PENDING))
+
+        out = io.StringIO()
+        call_command('send_queued_mail', stdout=out)
+        self.assertEqual(out.getvalue(), 'Processed 1 messages\n')
+        self.assertEqual(outbox.outbox[0].subject, 'Activate your account')
+
+    @override_settings(EMAIL_QUEUE_WORKERS=2)
+    def test_start_workers_replaces_dead_and_inherited_threads(self):
+        with mock.patch('authentication.mail.threading.Thread') as thread, \
+                mock.patch.object(mail, '_workers', []), mock.patch.object(mail, '_pid', None), \
+                mock.patch.object(mail, '_wakeups', mail._wakeups):
+            thread.return_value.is_alive.return_value = True
+            mail.start_workers()
+            mail.start_workers()
+            self.assertEqual(thread.call_count, 2)
+            thread.return_value.is_alive.return_value = False
+            mail.start_workers()
+            self.assertEqual(thread.call_count, 4)
+            thread.return_value.is_alive.return_value = True
+            with mock.patch('authentication.mail.os.getpid', return_value=-1):
+                mail.start_workers()
+            self.assertEqual(thread.call_count, 6)
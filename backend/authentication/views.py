@@ -1,4 +1,3 @@
-import threading
 from django.core.mail import EmailMessage
 import json
 from django.http import JsonResponse
@@ -11,6 +10,8 @@ from django.utils.encoding import force_bytes, force_str, DjangoUnicodeDecodeErr
 from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
 from django.contrib.sites.shortcuts import get_current_site
 from django.urls import reverse
+from . import availability
+from .mail import queue_email
 from .utils import account_activation_token
 from django.contrib import auth
 
@@ -54,7 +55,7 @@ class RegistrationView(View):
                     'noreply@finance_tracker.com',
                     [email],
                 )
-                EmailThread(email).start()
+                queue_email(email)
                 messages.success(request, 'Account created successfully, check your email to activate')
                 return render(request, 'authentication/register.html')
         return render(request, 'authentication/register.html', context)
@@ -89,20 +90,20 @@ class LogoutView(View):
         
     
 class UsernameValidationView(View):
-    def post(self, request):
+    async def post(self, request):
         data = json.loads(request.body)
         username = data['username']
         if not str(username).isalnum():
             return JsonResponse({'username_error': 'Username should only contain alphanumeric characters'}, status=400)
-        if User.objects.filter(username=username).exists():
+        if await availability.ataken('username', username):
             return JsonResponse({'username_error': 'Sorry, this username is already taken. Please choose another one'}, status=409)
         return JsonResponse({'username_valid': True})
     
 class EmailValidationView(View):
-    def post(self, request):
+    async def post(self, request):
         data = json.loads(request.body)
         email = data['email']
-        if User.objects.filter(email=email).exists():
+        if await availability.ataken('email', email):
             return JsonResponse({'email_error': 'Sorry, this email is already taken. Please choose another one'}, status=409)
         return JsonResponse({'email_valid': True})
     
@@ -127,11 +128,3 @@ class VerificationView(View):
             pass
 
         return redirect('login')
-    
-    
-class EmailThread(threading.Thread):
-    def __init__(self, email):
-        self.email = email
-        threading.Thread.__init__(self)
-    def run(self):
-        self.email.send(fail_silently=False)
\ No newline at end of file
@@ -0,0 +1,22 @@
+from django.contrib import admin
+
+from .kinds import kind_for_label
+from .labels import references
+from .models import Budget, BudgetAlert, DataVersion, ExchangeRate, MonthlyRollup
+
+# Register your models here.
+admin.site.register(MonthlyRollup)
+admin.site.register(DataVersion)
+admin.site.register(ExchangeRate)
+admin.site.register(Budget)
+admin.site.register(BudgetAlert)
+
+
+class LabelAdmin(admin.ModelAdmin):
+    """Admin for Category and Source that lists the budgets and recurring
+    rules blocking a delete, as it does for PROTECTed transactions."""
+
+    def get_deleted_objects(self, objs, request):
+        deleted, counts, perms_needed, protected = super().get_deleted_objects(objs, request)
+        used = references(kind_for_label(self.model), [obj.pk for obj in objs])
+        return deleted, counts, perms_needed, [*protected, *map(str, used)]
@@ -0,0 +1,88 @@
+import datetime
+
+from django.conf import settings
+from django.db.models import Count, Sum
+
+from .money import CENT
+from .rates import aget_table, get_table, needs_table, rate_date
+
+
+def date_window(params, default_days=None):
+    """Return the (start, end) dates requested by ``params``.
+
+    ``params`` is a QueryDict such as ``request.GET``. It may carry either
+    ``days`` (a window ending today) or explicit ``start``/``end`` ISO dates.
+    Raises ValueError on malformed input.
+    """
+    if default_days is None:
+        default_days = settings.SUMMARY_WINDOW_DAYS
+    end = params.get('end')
+    end = datetime.date.fromisoformat(end) if end else datetime.date.today()
+    start = params.get('start')
+    if start:
+        start = datetime.date.fromisoformat(start)
+    else:
+        days = int(params.get('days', default_days))
+        if days < 0:
+            raise ValueError('days must not be negative')
+        start = end - datetime.timedelta(days=days)
+    if start > end:
+        raise ValueError('start must not be after end')
+    return start, end
+
+
+def summary_queryset(queryset, group_field, start=None, end=None, currency=None):
+    """Total and count of ``amount`` per ``group_field`` value.
+
+    A single GROUP BY query, whatever the number of rows or groups; pass the
+    evaluated rows to :func:`collect`. With ``currency``, rows in other
+    currencies are further grouped by currency and day so that collect()
+    can convert them.
+    """
+    if start is not None:
+        queryset = queryset.filter(date__gte=start)
+    if end is not None:
+        queryset = queryset.filter(date__lte=end)
+    queryset = queryset.order_by()
+    if currency is None:
+        queryset = queryset.values(group_field)
+    else:
+        queryset = queryset.values(group_field, 'currency', rate_date=rate_date(currency))
+    return queryset.annotate(total=Sum('amount'), count=Count('id'))
+
+
+def collect(rows, group_field, currency=None, table=None):
+    """Fold grouped rows into ``{value: {'total', 'count', 'average'}}``.
+
+    Rows in a currency other than ``currency`` are converted with the
+    RateTable ``table``.
+    """
+    result = {}
+    for row in rows:
+        total = row['total']
+        if currency is not None and row['currency'] != currency:
+            total = table.convert(total, row['currency'], currency, row['rate_date'])
+        merged = result.setdefault(row[group_field], {'total': 0, 'count': 0})
+        merged['total'] += total
+        merged['count'] += row['count']
+    # SQLite returns decimal aggregates unscaled; PostgreSQL already gives
+    # cents, so quantizing just makes both backends agree.
+    for merged in result.values():
+        merged['total'] = merged['total'].quantize(CENT)
+        merged['average'] = (merged['total'] / merged['count']).quantize(CENT)
+    return result
+
+
+def summarize(queryset, group_field, start=None, end=None, currency=None):
+    rows = list(summary_queryset(queryset, group_field, start, end, currency))
+    return collect(rows, group_field, currency, get_table() if needs_table(rows, currency) else None)
+
+
+async def asummarize(queryset, group_field, start=None, end=None, currency=None):
+    rows = [row async for row in summary_queryset(queryset, group_field, start, end, currency)]
+    table = await aget_table() if needs_table(rows, currency) else None
+    return collect(rows, group_field, currency, table)
+
+
+def totals(summary):
+    return {key: value['total'] for key, value in summary.items()}
@@ -0,0 +1,105 @@
+import copy
+
+from django.conf import settings
+from django.db import transaction
+
+from . import labels
+from .importers import validate
+from .signals import transactions_changed
+
+OPERATIONS = ('create', 'update', 'delete')
+
+
+def _row(kind, data, instance=None, names=None):
+    """Map a JSON operation onto the row dict validate() expects.
+
+    Updates may send only the fields that changed; the rest come from the
+    stored row, whose label name is looked up in ``names``. Raises
+    ValueError if a field other than the amount is not a string.
+    """
+    row = {}
+    for key, field in (('amount', 'amount'), ('date', 'date'),
+                       ('description', 'description'), ('label', kind.label_field),
+                       ('currency', 'currency')):
+        value = data.get(field)
+        if value is None and instance is not None:
+            if field == kind.label_field:
+                value = names[getattr(instance, kind.label_attname)]
+            else:
+                value = getattr(instance, field)
+                value = value.isoformat() if field == 'date' else value
+        if value is not None and field != 'amount' and not isinstance(value, str):
+            raise ValueError('%s must be a string' % field)
+        row[key] = value
+    return row
+
+
+def apply_batch(kind, owner, operations):
+    """Apply a list of create/update/delete operations for ``owner``.
+
+    Each operation is a dict with an ``op`` key; updates and deletes name the
+    row by ``id`` and only see the owner's rows. Invalid operations are
+    reported and skipped, the valid ones are written in one transaction with
+    one bulk_create, one bulk_update and one DELETE. Returns one result dict
+    per operation, in order.
+    """
+    if not isinstance(operations, list):
+        raise ValueError('operations must be a list')
+    if len(operations) > settings.BATCH_MAX_OPERATIONS:
+        raise ValueError('At most %d operations per batch' % settings.BATCH_MAX_OPERATIONS)
+    results = [None] * len(operations)
+    ids = [data.get('id') for data in operations
+           if isinstance(data, dict) and data.get('op') in ('update', 'delete')]
+    ids = [pk for pk in ids if type(pk) is int]
+
+    with transaction.atomic():
+        existing = kind.model.objects.filter(owner=owner).select_for_update().in_bulk(ids)
+        names = labels.names(kind, {getattr(row, kind.label_attname) for row in existing.values()})
+        created, updated, previous, deleted = [], [], [], []
+        seen = set()
+        for index, data in enumerate(operations):
+            op = data.get('op') if isinstance(data, dict) else None
+            if op not in OPERATIONS:
+                results[index] = {'status': 'error', 'error': 'op must be one of %s' % ', '.join(OPERATIONS)}
+                continue
+            pk = data.get('id')
+            if op != 'create':
+                if type(pk) is not int or pk not in existing:
+                    results[index] = {'id': pk, 'status': 'error', 'error': 'Not found'}
+                    continue
+                if pk in seen:
+                    results[index] = {'id': pk, 'status': 'error',
+                                      'error': 'Row appears more than once in the batch'}
+                    continue
+                seen.add(pk)
+            if op == 'delete':
+                deleted.append(existing[pk])
+                results[index] = {'id': pk, 'status': 'deleted'}
+                continue
+            instance = existing.get(pk)
+            try:
+                row = validate(kind, owner, _row(kind, data, instance, names))
+            except ValueError as e:
+                results[index] = {'id': pk, 'status': 'error', 'error': str(e)}
+                continue
+            if op == 'create':
+                created.append((index, row))
+                continue
+            previous.append(copy.copy(instance))
+            for field in ('amount', 'date', 'description', 'currency', kind.label_attname):
+                setattr(instance, field, getattr(row, field))
+            updated.append(instance)
+            results[index] = {'id': pk, 'status': 'updated'}
+
+        rows = kind.model.objects.bulk_create([row for _, row in created])
+        for (index, _), row in zip(created, rows):
+            results[index] = {'id': row.pk, 'status': 'created'}
+        if updated:
+            kind.model.objects.bulk_update(
+                updated, ['amount', 'date', 'description', 'currency', kind.label_field])
+        if deleted:
+            kind.model.objects.filter(owner=owner, pk__in=[row.pk for row in deleted]).delete()
+        if rows or updated or deleted:
+            transactions_changed.send(sender=kind.model, added=rows + updated,
+                                      removed=previous + deleted)
+    return results
@@ -0,0 +1,107 @@
+import datetime
+from collections import defaultdict
+
+from django.db.models import DecimalField, Exists, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .aggregation import summarize
+from .kinds import kind_named
+from .labels import set_label_names
+from .models import Budget, BudgetAlert, MonthlyRollup
+from .money import CENT
+from .rates import MissingRate
+from .rollups import month_start, next_month
+
+
+def status_queryset(owner, month, **filters):
+    """``owner``'s budgets annotated with their consumption in ``month``.
+
+    A single query: ``spent`` is the month's rollup bucket in the budget's
+    currency, ``foreign`` tells whether the month also holds rows in other
+    currencies and ``alerted`` whether the month's alert was raised.
+    """
+    rollups = MonthlyRollup.objects.filter(owner=OuterRef('owner'), kind=OuterRef('kind'),
+                                           label=OuterRef('label'), month=month)
+    own = rollups.filter(currency=OuterRef('currency')).values('total')[:1]
+    return (Budget.objects.filter(owner=owner, **filters).order_by('kind', 'label')
+            .annotate(spent=Coalesce(Subquery(own), Value(0),
+                                     output_field=DecimalField(max_digits=16, decimal_places=2)),
+                      foreign=Exists(rollups.exclude(currency=OuterRef('currency'))),
+                      alerted=Exists(BudgetAlert.objects.filter(budget=OuterRef('pk'), month=month))))
+
+
+def _convert_foreign(owner, month, budgets):
+    # Rows in other currencies convert at their own day's rate, so re-read
+    # the month for those budgets: one query per kind and budget currency.
+    groups = defaultdict(list)
+    for budget in budgets:
+        if budget.foreign:
+            groups[budget.kind, budget.currency].append(budget)
+    end = next_month(month) - datetime.timedelta(days=1)
+    for (name, currency), group in groups.items():
+        kind = kind_named(name)
+        rows = kind.model.objects.filter(owner=owner, **{
+            kind.label_field + '__in': [budget.label for budget in group]})
+        try:
+            summary = summarize(rows, kind.label_field, month, end, currency)
+        except MissingRate:
+            summary = None
+        for budget in group:
+            # None when some row has no exchange rate.
+            budget.spent = summary.get(budget.label, {'total': 0})['total'] if summary is not None else None
+
+
+def status(owner, month=None, **filters):
+    """Evaluate ``owner``'s budgets for ``month`` (default: the current one).
+
+    Returns the budgets of :func:`status_queryset` with ``spent`` and
+    ``remaining`` in the budget's currency, both None when some row cannot
+    be converted, and ``label_name``, ordered by kind and name. Costs one query unless some rows are
+    in another currency.
+    """
+    month = month_start(month or datetime.date.today())
+    budgets = list(status_queryset(owner, month, **filters))
+    _convert_foreign(owner, month, budgets)
+    set_label_names(budgets)
+    budgets.sort(key=lambda budget: (budget.kind, budget.label_name))
+    for budget in budgets:
+        if budget.spent is None:
+            budget.remaining = None
+        else:
+            budget.spent = budget.spent.quantize(CENT)
+            budget.remaining = budget.amount - budget.spent
+    return budgets
+
+
+def reached(budget):
+    return budget.spent is not None and budget.spent * 100 >= budget.amount * budget.alert_at
+
+
+def as_dict(budget):
+    return {'id': budget.pk, 'kind': budget.kind, 'label': budget.label_name,
+            'amount': budget.amount, 'currency': budget.currency, 'alert_at': budget.alert_at,
+            'spent': budget.spent, 'remaining': budget.remaining,
+            'over': budget.remaining is not None and budget.remaining < 0,
+            'alerted': budget.alerted}
+
+
+def evaluate(kind, rows):
+    """Raise the alerts of budgets that ``rows`` took past their threshold.
+
+    Must run after the rollups took ``rows`` into account, inside the same
+    transaction. Only this month's rows count; each owner with such rows
+    costs one query, plus an INSERT when some budget crosses its threshold.
+    """
+    month = month_start(datetime.date.today())
+    date_field = kind.model._meta.get_field('date')
+    labels = defaultdict(set)
+    for obj in rows:
+        if month_start(date_field.to_python(obj.date)) == month:
+            labels[obj.owner_id].add(getattr(obj, kind.label_attname))
+    alerts = []
+    for owner_id, owner_labels in labels.items():
+        for budget in status(owner_id, month, kind=kind.name, label__in=owner_labels):
+            if not budget.alerted and reached(budget):
+                alerts.append(BudgetAlert(budget=budget, month=month, spent=budget.spent))
+    if alerts:
+        BudgetAlert.objects.bulk_create(alerts, ignore_conflicts=True)
@@ -0,0 +1,82 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.cache import cache
+
+from expenses.models import Category
+from income.models import Source
+from userpreferences.models import UserPreference
+
+DEFAULT_CURRENCY = '(VND - Vietnamese Dong)'
+
+
+def _key(*parts):
+    return 'core:' + ':'.join(str(part) for part in parts)
+
+
+def _get_or_set(key, compute):
+    # REFERENCE_CACHE_VERSION lets a deploy that changes a cached value's
+    # shape orphan the old entries instead of reading them back.
+    version = settings.REFERENCE_CACHE_VERSION
+    value = cache.get(key, version=version)
+    if value is None:
+        value = compute()
+        cache.set(key, value, settings.REFERENCE_CACHE_TIMEOUT, version=version)
+    return value
+
+
+async def _aget_or_set(key, compute):
+    version = settings.REFERENCE_CACHE_VERSION
+    value = await cache.aget(key, version=version)
+    if value is None:
+        value = await compute()
+        await cache.aset(key, value, settings.REFERENCE_CACHE_TIMEOUT, version=version)
+    return value
+
+
+def invalidate(*parts):
+    cache.delete(_key(*parts), version=settings.REFERENCE_CACHE_VERSION)
+
+
+def get_currency(user):
+    def compute():
+        currency = (UserPreference.objects.filter(user=user)
+                    .values_list('currency', flat=True).first())
+        return currency or DEFAULT_CURRENCY
+    return _get_or_set(_key('currency', user.pk), compute)
+
+
+async def aget_currency(user):
+    async def compute():
+        currency = await (UserPreference.objects.filter(user=user)
+                          .values_list('currency', flat=True).afirst())
+        return currency or DEFAULT_CURRENCY
+    return await _aget_or_set(_key('currency', user.pk), compute)
+
+
+def get_categories():
+    return _get_or_set(_key('categories'), lambda: list(Category.objects.all()))
+
+
+def get_sources():
+    return _get_or_set(_key('sources'), lambda: list(Source.objects.all()))
+
+
+async def aget_categories():
+    async def compute():
+        return [category async for category in Category.objects.all()]
+    return await _aget_or_set(_key('categories'), compute)
+
+
+async def aget_sources():
+    async def compute():
+        return [source async for source in Source.objects.all()]
+    return await _aget_or_set(_key('sources'), compute)
+
+
+def get_currencies():
+    def compute():
+        with open(os.path.join(settings.BASE_DIR, 'currencies.json'), 'r') as json_file:
+            return [{'name': n, 'value': v} for n, v in json.load(json_file).items()]
+    return _get_or_set(_key('currencies'), compute)
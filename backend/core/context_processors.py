@@ -0,0 +1,41 @@
+from django.utils.functional import SimpleLazyObject
+
+from django.conf import settings
+
+from . import cache, rates, versions
+
+
+def reference_data(request):
+    """Expose the cached currency, currency/category/source lists to templates.
+
+    Values are lazy, so pages that never print them cost nothing.
+    """
+    def currency():
+        if request.user.is_authenticated:
+            return cache.get_currency(request.user)
+        return cache.DEFAULT_CURRENCY
+
+    return {
+        'currency': SimpleLazyObject(currency),
+        'currency_code': SimpleLazyObject(lambda: rates.currency_code(currency())),
+        'currencies': SimpleLazyObject(cache.get_currencies),
+        'categories': SimpleLazyObject(cache.get_categories),
+        'sources': SimpleLazyObject(cache.get_sources),
+    }
+
+
+def fragment_cache(request):
+    """Expose ``data_version`` and ``fragment_timeout`` for ``{% cache %}`` keys.
+
+    The version is the one core.versions.conditional already read, if any.
+    """
+    def data_version():
+        version = getattr(request, 'data_version', None)
+        if version is None and request.user.is_authenticated:
+            version = request.data_version = versions.get(request.user)[0]
+        return version
+
+    return {
+        'data_version': SimpleLazyObject(data_version),
+        'fragment_timeout': settings.TEMPLATE_FRAGMENT_TIMEOUT,
+    }
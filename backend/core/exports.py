@@ -0,0 +1,155 @@
+import csv
+import datetime
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+from .labels import ids as label_ids
+
+CSV_CONTENT_TYPE = 'text/csv'
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def export_response(kind, owner, params):
+    """Build the StreamingHttpResponse for an export request's GET ``params``.
+
+    Raises ValueError on a bad format or date.
+    """
+    format = params.get('format', 'csv')
+    if format not in ('csv', 'xlsx'):
+        raise ValueError('format must be csv or xlsx')
+    start = params.get('start')
+    end = params.get('end')
+    rows = export_rows(kind, owner,
+                       start=datetime.date.fromisoformat(start) if start else None,
+                       end=datetime.date.fromisoformat(end) if end else None,
+                       labels=params.getlist(kind.label_field))
+    if format == 'xlsx':
+        response = StreamingHttpResponse(xlsx_stream(kind, rows), content_type=XLSX_CONTENT_TYPE)
+    else:
+        response = StreamingHttpResponse(csv_stream(kind, rows), content_type=CSV_CONTENT_TYPE)
+    filename = '%s-%s.%s' % (kind.model._meta.app_label,
+                             datetime.date.today().isoformat(), format)
+    response['Content-Disposition'] = 'attachment; filename="%s"' % filename
+    return response
+
+
+def export_rows(kind, owner, start=None, end=None, labels=None):
+    """Stream (date, label, description, amount, currency) tuples, oldest first.
+
+    Uses a values_list projection and a chunked iterator (a server-side
+    cursor on PostgreSQL), so only one chunk of rows is ever in memory.
+    """
+    rows = kind.model.objects.filter(owner=owner)
+    if start:
+        rows = rows.filter(date__gte=start)
+    if end:
+        rows = rows.filter(date__lte=end)
+    if labels:
+        rows = rows.filter(**{kind.label_field + '__in': label_ids(kind, labels).values()})
+    return (rows.order_by('date', 'id')
+            .values_list('date', kind.label_field + '__name', 'description', 'amount', 'currency')
+            .iterator(chunk_size=settings.EXPORT_CHUNK_SIZE))
+
+
+def header(kind):
+    return ['Date', kind.label_field.capitalize(), 'Description', 'Amount', 'Currency']
+
+
+class _Echo:
+    # csv.writer needs a file; hand each formatted line straight back.
+    def write(self, value):
+        return value
+
+
+def csv_stream(kind, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header(kind))
+    for row in rows:
+        yield writer.writerow(row)
+
+
+class _ChunkSink:
+    """Write-only file that hands buffered bytes to a generator on drain()."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets></workbook>'),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'),
+}
+
+
+def _xlsx_cell(value):
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return '<c><v>%s</v></c>' % value
+    if isinstance(value, datetime.date):
+        value = value.isoformat()
+    return '<c t="inlineStr"><is><t>%s</t></is></c>' % escape(str(value))
+
+
+def xlsx_stream(kind, rows):
+    """Yield an .xlsx workbook as it is written.
+
+    The zip is written to a non-seekable sink, so zipfile emits data
+    descriptors and each sheet row can be sent as soon as it is compressed.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS.items():
+            archive.writestr(name, content)
+        yield sink.drain()
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                        b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                        b'<sheetData>')
+            for row in _with_header(kind, rows):
+                sheet.write(('<row>%s</row>' % ''.join(_xlsx_cell(v) for v in row)).encode())
+                data = sink.drain()
+                if data:
+                    yield data
+            sheet.write(b'</sheetData></worksheet>')
+    yield sink.drain()
+
+
+def _with_header(kind, rows):
+    yield header(kind)
+    yield from rows
@@ -0,0 +1,255 @@
+import csv
+import datetime
+import hashlib
+import io
+import re
+
+from django.conf import settings
+from django.db import transaction
+
+from .labels import label_id
+from .money import parse_amount
+from .rates import preferred_currency, validate_currency
+from .signals import transactions_changed
+
+OFX_CHUNK_SIZE = 64 * 1024
+OFX_TAG_RE = re.compile(r'^(/?)([A-Za-z0-9.]+)>(.*)$', re.S)
+MAX_REPORTED_ERRORS = 20
+
+
+class ImportResult:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.duplicates = 0
+        self.skipped = 0
+        self.errors = []  # first MAX_REPORTED_ERRORS (line, message) pairs
+        self.invalid = 0
+
+    def error(self, line, message):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def __str__(self):
+        return ('%d rows read: %d created, %d duplicates, %d skipped, %d invalid'
+                % (self.rows, self.created, self.duplicates, self.skipped, self.invalid))
+
+
+def parse_csv(stream, kind):
+    """Yield (line, row) pairs from a CSV text stream with a header row.
+
+    The label column may be called ``category`` or ``source`` for either kind.
+    A line the csv module cannot parse, e.g. one with a field over its size
+    limit, is yielded as a ValueError and reported like an invalid row.
+    """
+    reader = csv.DictReader(stream)
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            # line_num still counts the lines read before the failing one.
+            yield reader.line_num + 1, ValueError(str(e))
+            continue
+        row = {(key or '').strip().lower(): (value or '').strip() for key, value in row.items()}
+        label = row.get(kind.label_field) or row.get('category') or row.get('source') or ''
+        yield reader.line_num, {
+            'amount': row.get('amount', ''),
+            'date': row.get('date', ''),
+            'description': row.get('description', ''),
+            'label': label,
+            'currency': row.get('currency', ''),
+        }
+
+
+def _ofx_tokens(stream):
+    # OFX 1.x is SGML with unclosed leaf tags and files may be one long line,
+    # so tokenize on '<' over fixed-size chunks rather than per line.
+    pending = ''
+    while True:
+        chunk = stream.read(OFX_CHUNK_SIZE)
+        if not chunk:
+            break
+        parts = (pending + chunk).split('<')
+        pending = parts.pop()
+        for part in parts:
+            match = OFX_TAG_RE.match(part)
+            if match:
+                yield match.group(1) == '/', match.group(2).upper(), match.group(3).strip()
+    match = OFX_TAG_RE.match(pending)
+    if match:
+        yield match.group(1) == '/', match.group(2).upper(), match.group(3).strip()
+
+
+def parse_ofx(stream, kind, label=None):
+    """Yield (n, row) pairs for the STMTTRN records of an OFX text stream.
+
+    Debits become expenses and credits become income; transactions of the
+    other direction are yielded as ``None`` so they are counted as skipped.
+    Rows are in the statement's CURDEF currency.
+    """
+    label = label or settings.IMPORT_DEFAULT_LABEL
+    record = None
+    currency = ''
+    n = 0
+    for closing, tag, value in _ofx_tokens(stream):
+        if tag == 'CURDEF' and not closing:
+            currency = value
+        elif tag == 'STMTTRN':
+            if not closing:
+                record = {}
+                continue
+            if record is None:
+                continue
+            n += 1
+            amount = record.get('TRNAMT', '')
+            debit = amount.startswith('-')
+            if debit != (kind.name == 'expense'):
+                yield n, None
+            else:
+                date = record.get('DTPOSTED', '')[:8]
+                if len(date) == 8 and date.isdigit():
+                    date = '%s-%s-%s' % (date[:4], date[4:6], date[6:])
+                yield n, {
+                    'amount': amount.lstrip('+-'),
+                    'date': date,
+                    'description': record.get('NAME') or record.get('MEMO', ''),
+                    'label': label,
+                    'currency': record.get('CURSYM') or currency,
+                    'fitid': record.get('FITID', ''),
+                }
+            record = None
+        elif record is not None and not closing:
+            record[tag] = value
+
+
+def build(kind, owner, row):
+    """Validate a parsed row like the add views do and return an unsaved instance.
+
+    Raises ValueError with the message the add form would show.
+    """
+    instance = validate(kind, owner, row)
+    instance.import_hash = row_hash(kind, instance, row['label'], fitid=row.get('fitid', ''))
+    return instance
+
+
+def validate(kind, owner, row):
+    """Like build(), but without the import hash used to skip re-imported rows."""
+    if not row['amount']:
+        raise ValueError('Amount is required')
+    if not row['description']:
+        raise ValueError('description is required')
+    if not row['date']:
+        raise ValueError('Date is required')
+    if not row['label']:
+        raise ValueError('%s is required' % kind.label_field.capitalize())
+    amount = parse_amount(row['amount'])
+    try:
+        date = datetime.date.fromisoformat(row['date'])
+    except ValueError:
+        raise ValueError('Date must be in YYYY-MM-DD format')
+    currency = validate_currency(row.get('currency') or preferred_currency(owner))
+    # Categories and sources are shared by every user, so imports only
+    # accept existing names, like the add form.
+    label = label_id(kind, row['label'])
+    return kind.model(owner=owner, amount=amount, date=date,
+                      description=row['description'], currency=currency,
+                      **{kind.label_attname: label})
+
+
+def row_hash(kind, instance, label, occurrence=1, fitid=''):
+    parts = [instance.owner_id, instance.date.isoformat(), instance.amount,
+             instance.description, label]
+    # The bank's transaction id tells OFX repeats apart. Otherwise the
+    # first occurrence keeps the original hash, so files imported before
+    # occurrences were counted are still recognised.
+    if fitid:
+        parts.append('fitid:' + fitid)
+    elif occurrence > 1:
+        parts.append(occurrence)
+    key = '\x1f'.join(str(part) for part in parts)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def import_rows(kind, owner, rows, batch_size=None, progress=None):
+    """Validate and insert (line, row) pairs in batches.
+
+    Each batch is one transaction: a lookup of already imported row hashes,
+    a bulk_create and the rollup update. Memory is bounded by the batch size,
+    so it stays flat however long ``rows`` is. ``progress`` is called with
+    the running ImportResult after each batch.
+
+    Identical rows without an OFX FITID are numbered by occurrence, so real
+    repeats such as two same-day coffees are all kept while re-importing
+    the file creates nothing. The counts are only kept for the current
+    date, which keeps memory flat; repeats are told apart as long as the
+    rows of a day are together, as in bank exports and our own exports.
+    """
+    batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+    result = ImportResult()
+    batch = {}
+    occurrences, occurrences_date = {}, None
+    for line, row in rows:
+        result.rows += 1
+        if row is None:
+            result.skipped += 1
+            continue
+        try:
+            if isinstance(row, ValueError):
+                raise row
+            instance = build(kind, owner, row)
+        except ValueError as e:
+            result.error(line, str(e))
+            continue
+        if instance.date != occurrences_date:
+            occurrences, occurrences_date = {}, instance.date
+        if not row.get('fitid'):
+            occurrence = occurrences[instance.import_hash] = occurrences.get(instance.import_hash, 0) + 1
+            if occurrence > 1:
+                instance.import_hash = row_hash(kind, instance, row['label'], occurrence)
+        if instance.import_hash in batch:
+            result.duplicates += 1
+            continue
+        batch[instance.import_hash] = instance
+        if len(batch) >= batch_size:
+            _flush(kind, owner, batch, result)
+            batch = {}
+            if progress:
+                progress(result)
+    if batch:
+        _flush(kind, owner, batch, result)
+    if progress:
+        progress(result)
+    return result
+
+
+def _flush(kind, owner, batch, result):
+    with transaction.atomic():
+        existing = set(kind.model.objects
+                       .filter(owner=owner, import_hash__in=list(batch))
+                       .values_list('import_hash', flat=True))
+        new = [instance for key, instance in batch.items() if key not in existing]
+        kind.model.objects.bulk_create(new)
+        transactions_changed.send(sender=kind.model, added=new)
+    result.duplicates += len(existing)
+    result.created += len(new)
+
+
+def import_file(kind, owner, binary_file, format=None, name='', batch_size=None,
+                progress=None):
+    """Import an uploaded or opened binary CSV/OFX file for ``owner``."""
+    if format is None:
+        format = 'ofx' if name.lower().endswith(('.ofx', '.qfx')) else 'csv'
+    stream = io.TextIOWrapper(binary_file, encoding='utf-8-sig', errors='replace', newline='')
+    if format == 'ofx':
+        rows = parse_ofx(stream, kind)
+    elif format == 'csv':
+        rows = parse_csv(stream, kind)
+    else:
+        raise ValueError('Unsupported import format %r' % format)
+    try:
+        return import_rows(kind, owner, rows, batch_size=batch_size, progress=progress)
+    finally:
+        stream.detach()
@@ -0,0 +1,36 @@
+from collections import namedtuple
+
+from expenses.models import Category, Expense
+from income.models import Income, Source
+
+# The two transaction models share a shape: an owner, a date, an amount and a
+# label, a foreign key to ``label_model`` (``category`` for expenses,
+# ``source`` for income). ``label_attname`` is the attribute holding its id.
+TransactionKind = namedtuple('TransactionKind',
+                             ['name', 'model', 'label_field', 'label_model', 'label_attname'])
+
+EXPENSE = TransactionKind('expense', Expense, 'category', Category, 'category_id')
+INCOME = TransactionKind('income', Income, 'source', Source, 'source_id')
+
+KINDS = (EXPENSE, INCOME)
+
+
+def kind_for(model):
+    for kind in KINDS:
+        if kind.model is model:
+            return kind
+    raise LookupError('%s is not a transaction model' % model.__name__)
+
+
+def kind_for_label(model):
+    for kind in KINDS:
+        if kind.label_model is model:
+            return kind
+    raise LookupError('%s is not a label model' % model.__name__)
+
+
+def kind_named(name):
+    for kind in KINDS:
+        if kind.name == name:
+            return kind
+    raise LookupError('No transaction kind %r' % name)
@@ -0,0 +1,94 @@
+from . import cache
+from .kinds import KINDS
+from .models import Budget, RecurringTransaction
+
+# Expense.category and Income.source are foreign keys to the Category and
+# Source tables. Queries group and filter on the ids; names are looked up
+# here, from the reference data cache, only when a result is displayed or a
+# name comes in from a form, an import or the batch API.
+
+
+def _labels(kind):
+    return cache.get_categories() if kind.name == 'expense' else cache.get_sources()
+
+
+async def _alabels(kind):
+    return await (cache.aget_categories() if kind.name == 'expense' else cache.aget_sources())
+
+
+def _invalidate(kind):
+    cache.invalidate('categories' if kind.name == 'expense' else 'sources')
+
+
+def names(kind, needed=()):
+    """``{id: name}`` of every category (expenses) or source (income).
+
+    If one of the ``needed`` ids is missing, the cached list is stale and
+    is read again.
+    """
+    result = {label.pk: label.name for label in _labels(kind)}
+    if any(pk not in result for pk in needed):
+        _invalidate(kind)
+        result = {label.pk: label.name for label in _labels(kind)}
+    return result
+
+
+async def anames(kind, needed=()):
+    result = {label.pk: label.name for label in await _alabels(kind)}
+    if any(pk not in result for pk in needed):
+        _invalidate(kind)
+        result = {label.pk: label.name for label in await _alabels(kind)}
+    return result
+
+
+def ids(kind, wanted, create=False):
+    """``{name: id}`` for the ``wanted`` names.
+
+    Names with no row are left out, or with ``create`` inserted first (the
+    unique name constraint keeps concurrent inserts from duplicating one).
+    """
+    wanted = set(wanted)
+    found = {label.name: label.pk for label in _labels(kind) if label.name in wanted}
+    missing = wanted - found.keys()
+    if missing:
+        if create:
+            kind.label_model.objects.bulk_create(
+                [kind.label_model(name=name) for name in missing], ignore_conflicts=True)
+        rows = dict(kind.label_model.objects.filter(name__in=missing).values_list('name', 'pk'))
+        if rows:
+            _invalidate(kind)
+            found.update(rows)
+    return found
+
+
+def label_id(kind, name, create=False):
+    """The id of the label called ``name``; ValueError if there is none."""
+    name = (name or '').strip()
+    if not name:
+        raise ValueError('%s is required' % kind.label_field.capitalize())
+    if len(name) > kind.label_model._meta.get_field('name').max_length:
+        raise ValueError('%s is too long' % kind.label_field.capitalize())
+    pk = ids(kind, [name], create).get(name)
+    if pk is None:
+        raise ValueError('Unknown %s %s' % (kind.label_field, name))
+    return pk
+
+
+def references(kind, pks):
+    """The budgets and recurring rules of ``kind`` whose label is one of ``pks``.
+
+    They hold the label id without a foreign key (see core.models), so
+    core.receivers and the admin check them before a label is deleted.
+    """
+    return [*Budget.objects.filter(kind=kind.name, label__in=pks),
+            *RecurringTransaction.objects.filter(kind=kind.name, label__in=pks)]
+
+
+def set_label_names(rows):
+    """Set ``label_name`` on budgets or recurring rules from their ``kind`` and label id."""
+    for kind in KINDS:
+        matching = [row for row in rows if row.kind == kind.name]
+        if matching:
+            found = names(kind, {row.label for row in matching})
+            for row in matching:
+                row.label_name = found.get(row.label, '')
@@ -0,0 +1,297 @@
+import collections
+import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Sum
+from django.utils.functional import cached_property
+
+from . import labels
+from .kinds import KINDS, INCOME
+from .models import ExchangeRate, MonthlyRollup
+from .money import CENT
+from .pagination import LAST, NEXT, PREVIOUS, pack, unpack
+from .rates import MissingRate, get_table, rate_date
+
+# One line of the combined ledger. ``amount`` is signed (expenses are
+# negative) and in the entry's own ``currency``; ``value`` is the same
+# amount in the ledger currency and ``balance`` the running balance in it.
+# Entries in a currency without an exchange rate count as zero.
+Entry = collections.namedtuple('Entry', 'kind id date amount currency label description value balance')
+
+COLUMNS = 'kind, id, date, amount, currency, label, description, value'
+DESC = 'date DESC, kind DESC, id DESC'
+ASC = 'date ASC, kind ASC, id ASC'
+
+
+def opening_balance(owner, currency=None, before=None):
+    """Income minus expenses over the owner's whole history, or its months
+    before the month starting on ``before``.
+
+    Read from the rollups; buckets in other currencies are re-read from the
+    raw rows by day and converted.
+    """
+    balance = Decimal(0)
+    totals = MonthlyRollup.objects.filter(owner=owner)
+    if before is not None:
+        totals = totals.filter(month__lt=before)
+    totals = totals.values('kind', 'currency').annotate(total=Sum('total')).order_by()
+    foreign = {}
+    for row in totals:
+        sign = 1 if row['kind'] == INCOME.name else -1
+        if currency is not None and row['currency'] != currency:
+            foreign.setdefault(row['kind'], set()).add(row['currency'])
+            continue
+        balance += sign * row['total']
+    for kind in KINDS:
+        if kind.name not in foreign:
+            continue
+        sign = 1 if kind is INCOME else -1
+        rows = kind.model.objects.filter(owner=owner, currency__in=foreign[kind.name])
+        if before is not None:
+            rows = rows.filter(date__lt=before)
+        rows = (rows.order_by().values('currency', rate_date=rate_date(currency))
+                .annotate(total=Sum('amount'), count=Count('id')))
+        table = get_table()
+        for row in rows:
+            try:
+                balance += sign * table.convert(row['total'], row['currency'], currency,
+                                                row['rate_date'])
+            except MissingRate:
+                pass
+    return balance.quantize(CENT)
+
+
+def _rate_sql(currency_sql, date_sql):
+    # Rate in effect on a date: the latest one on or before it.
+    return ('CASE WHEN %s = %%s THEN 1 ELSE (SELECT rate FROM %s WHERE currency = %s AND date <= %s '
+            'ORDER BY date DESC LIMIT 1) END'
+            % (currency_sql, ExchangeRate._meta.db_table, currency_sql, date_sql))
+
+
+def _value_sql(table, amount_sql, currency):
+    """``amount_sql`` converted to ``currency`` by joining on the rate in effect on each row's date."""
+    if currency is None:
+        return amount_sql, []
+    row_currency, row_date = '%s.currency' % table, '%s.date' % table
+    sql = ('COALESCE(CASE WHEN %s = %%s THEN %s ELSE %s * (%s) / (%s) END, 0)'
+           % (row_currency, amount_sql, amount_sql, _rate_sql(row_currency, row_date),
+              _rate_sql('%s', row_date)))
+    base = settings.EXCHANGE_RATE_BASE
+    return sql, [currency, base, currency, base, currency]
+
+
+def _signed_amount(kind):
+    meta = kind.model._meta
+    return '%s%s.%s' % ('' if kind is INCOME else '-', meta.db_table, meta.get_field('amount').column)
+
+
+def balance_at(owner, boundary, inclusive, currency=None):
+    """Balance of the entries before ``boundary`` in ledger order, plus the
+    boundary entry itself if ``inclusive``.
+
+    The months before the boundary's come from the rollups (see
+    opening_balance()); only the boundary month's rows are read, so the
+    cost does not grow with the history.
+    """
+    date, boundary_kind, pk = boundary
+    month = date.replace(day=1)
+    sums, params = [], []
+    for kind in KINDS:
+        table = kind.model._meta.db_table
+        value, value_params = _value_sql(table, _signed_amount(kind), currency)
+        sql = 'SELECT COALESCE(SUM(%s), 0) FROM %s WHERE owner_id = %%s AND date >= %%s' % (value, table)
+        params += value_params + [owner.pk, month]
+        if kind.name == boundary_kind:
+            sql += ' AND (date < %%s OR (date = %%s AND id %s %%s))' % ('<=' if inclusive else '<')
+            params += [date, date, pk]
+        else:
+            # Kinds sort before or after the boundary kind on its date.
+            sql += ' AND date %s %%s' % ('<=' if kind.name < boundary_kind else '<')
+            params.append(date)
+        sums.append('(%s)' % sql)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT %s' % ' + '.join(sums), params)
+        month_total, = cursor.fetchone()
+    return opening_balance(owner, currency, before=month) + Decimal(str(month_total))
+
+
+def _branch(kind, owner, boundary, older, limit, currency):
+    """SELECT for one kind, limited to the rows past ``boundary`` in paging order.
+
+    The (date, kind, id) comparison is spelled out per kind so each branch
+    stays a range scan on the (owner, date, id) index.
+    """
+    meta = kind.model._meta
+    amount = _signed_amount(kind)
+    value, params = _value_sql(meta.db_table, amount, currency)
+    sql = ("SELECT '%s' AS kind, id, date, %s AS amount, currency, %s AS label, description, "
+           "%s AS value FROM %s WHERE owner_id = %%s"
+           % (kind.name, amount, meta.get_field(kind.label_field).column, value, meta.db_table))
+    params.append(owner.pk)
+    if boundary is not None:
+        date, boundary_kind, pk = boundary
+        op = '<' if older else '>'
+        if kind.name == boundary_kind:
+            sql += ' AND (date %s %%s OR (date = %%s AND id %s %%s))' % (op, op)
+            params += [date, date, pk]
+        elif (kind.name < boundary_kind) == older:
+            # Sorts past the boundary kind on the boundary date.
+            sql += ' AND date %s= %%s' % op
+            params.append(date)
+        else:
+            sql += ' AND date %s %%s' % op
+            params.append(date)
+    order = 'date DESC, id DESC' if older else 'date ASC, id ASC'
+    return 'SELECT * FROM (%s ORDER BY %s LIMIT %d) AS %s' % (sql, order, limit, kind.name), params
+
+
+def _entries(owner, boundary, older, limit, start_balance, currency):
+    """Up to ``limit`` entries past ``boundary`` with running balances.
+
+    Walking back in time (``older``), each balance is ``start_balance``
+    minus the values of the newer entries on the page; walking forward,
+    it is ``start_balance`` plus the values up to and including the entry.
+    Both are window sums over the page, so only ``limit`` rows per kind are
+    read, however long the history.
+    """
+    branches, params = [], []
+    for kind in KINDS:
+        sql, branch_params = _branch(kind, owner, boundary, older, limit, currency)
+        branches.append(sql)
+        params += branch_params
+    order = DESC if older else ASC
+    if older:
+        balance = '%%s - (SUM(value) OVER (ORDER BY %s ROWS UNBOUNDED PRECEDING) - value)' % DESC
+    else:
+        balance = '%%s + SUM(value) OVER (ORDER BY %s ROWS UNBOUNDED PRECEDING)' % ASC
+    sql = ('SELECT %s, %s AS balance FROM (SELECT * FROM (%s) AS entries ORDER BY %s LIMIT %d) AS page '
+           'ORDER BY %s' % (COLUMNS, balance, ' UNION ALL '.join(branches), order, limit, order))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [start_balance] + params)
+        rows = cursor.fetchall()
+    # Branches select label ids; names come from the cached label lists.
+    names = {kind.name: labels.names(kind, {row[5] for row in rows if row[0] == kind.name})
+             for kind in KINDS}
+    return [_entry(row, names[row[0]]) for row in rows]
+
+
+def _decimal(value):
+    return Decimal(str(value)).quantize(CENT)
+
+
+def _entry(row, names):
+    kind, pk, date, amount, currency, label, description, value, balance = row
+    if isinstance(date, str):
+        # SQLite returns dates from raw queries as text.
+        date = datetime.date.fromisoformat(date)
+    return Entry(kind, pk, date, _decimal(amount), currency, names.get(label, ''), description,
+                 _decimal(value), _decimal(balance))
+
+
+def encode_cursor(direction, entry=None):
+    if entry is None:
+        return pack([direction])
+    return pack([direction, entry.date.isoformat(), entry.kind, entry.id])
+
+
+def decode_cursor(token):
+    """Return (direction, boundary), or None for a missing or garbled token."""
+    if not token:
+        return None
+    try:
+        payload = unpack(token)
+        if payload == [LAST]:
+            return LAST, None
+        direction, date, kind, pk = payload
+        if direction not in (NEXT, PREVIOUS) or kind not in [k.name for k in KINDS]:
+            return None
+        return direction, (datetime.date.fromisoformat(date), kind, int(pk))
+    except (ValueError, TypeError):
+        return None
+
+
+class LedgerPaginator:
+    """Keyset pagination over an owner's income and expenses, newest first.
+
+    Cursors only name the boundary entry. The balance at the boundary is
+    recomputed by balance_at(), so edits to older rows show up on every
+    page. Each page is then one UNION ALL query of at most ``per_page + 1``
+    rows per kind. Values and balances are in ``currency``; None adds up
+    amounts as they are.
+    """
+
+    def __init__(self, owner, per_page, currency=None):
+        self.owner = owner
+        self.per_page = per_page
+        self.currency = currency
+
+    def get_page(self, token):
+        return LedgerPage(self, decode_cursor(token))
+
+
+class LedgerPage:
+    def __init__(self, paginator, cursor):
+        self.paginator = paginator
+        self.cursor = cursor
+
+    @cached_property
+    def _window(self):
+        owner, per_page = self.paginator.owner, self.paginator.per_page
+        currency = self.paginator.currency
+        direction = self.cursor[0] if self.cursor else None
+        if direction == PREVIOUS:
+            _, boundary = self.cursor
+            balance = balance_at(owner, boundary, True, currency)
+            rows = _entries(owner, boundary, False, per_page + 1, balance, currency)
+            return rows[:per_page][::-1], len(rows) > per_page, True
+        if direction == LAST:
+            rows = _entries(owner, None, False, per_page + 1, Decimal(0), currency)
+            return rows[:per_page][::-1], len(rows) > per_page, False
+        if direction == NEXT:
+            _, boundary = self.cursor
+            balance = balance_at(owner, boundary, False, currency)
+            rows = _entries(owner, boundary, True, per_page + 1, balance, currency)
+        else:
+            rows = _entries(owner, None, True, per_page + 1, opening_balance(owner, currency),
+                            currency)
+        return rows[:per_page], direction == NEXT, len(rows) > per_page
+
+    @property
+    def object_list(self):
+        return self._window[0]
+
+    def has_previous(self):
+        return self._window[1]
+
+    def has_next(self):
+        return self._window[2]
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+    @property
+    def next_cursor(self):
+        if self.has_next():
+            return encode_cursor(NEXT, self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous():
+            return encode_cursor(PREVIOUS, self.object_list[0])
+
+    @property
+    def last_cursor(self):
+        return encode_cursor(LAST)
+
+    @cached_property
+    def total(self):
+        return (MonthlyRollup.objects.filter(owner=self.paginator.owner)
+                .aggregate(count=Sum('count'))['count'] or 0)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
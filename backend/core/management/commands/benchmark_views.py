@@ -0,0 +1,69 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.seeding import seed
+
+
+class Command(BaseCommand):
+    help = ('Seed users of increasing size and time the list, search, summary, add '
+            'and edit views against each. Everything is rolled back afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000],
+                            help='Rows per kind for each seeded user.')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Requests per view; the median is reported.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.stdout.write('%8s  %-28s %10s %10s %8s' % ('rows', 'view', 'median ms', 'max ms', 'queries'))
+        for size in options['sizes']:
+            with transaction.atomic():
+                owner, = seed(1, size, size, prefix='benchmark', seed=options['seed'])
+                for name, call in self.calls(owner):
+                    timings, queries = self.measure(call, options['repeat'])
+                    self.stdout.write('%8d  %-28s %10.1f %10.1f %8d' % (
+                        size, name, statistics.median(timings), max(timings), queries))
+                transaction.set_rollback(True)
+
+    def calls(self, owner):
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(owner)
+        expense = owner.expense_set.latest('date', 'id')
+        income = owner.income_set.latest('date', 'id')
+        expense_form = {'amount': '12.50', 'description': 'benchmark', 'expense_date': '2024-01-15',
+                        'category': 'Food'}
+        income_form = {'amount': '100.00', 'description': 'benchmark', 'income_date': '2024-01-15',
+                       'source': 'Salary'}
+        search = {'searchText': 'food'}
+        return [
+            ('expenses index', lambda: client.get(reverse('expenses'))),
+            ('expenses search', lambda: client.get(reverse('search_expenses'), search)),
+            ('expenses summary', lambda: client.get(reverse('expense_category_summary'))),
+            ('expenses add', lambda: client.post(reverse('add-expenses'), expense_form)),
+            ('expenses edit', lambda: client.post(
+                reverse('expense-edit', args=[expense.pk]), expense_form)),
+            ('income index', lambda: client.get(reverse('income'))),
+            ('income search', lambda: client.get(reverse('search_income'), search)),
+            ('income summary', lambda: client.get(reverse('income_source_summary'))),
+            ('income add', lambda: client.post(reverse('add-income'), income_form)),
+            ('income edit', lambda: client.post(
+                reverse('income-edit', args=[income.pk]), income_form)),
+        ]
+
+    def measure(self, call, repeat):
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = call()
+                timings.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                self.stderr.write('  %s returned %d' % (response.request['PATH_INFO'], response.status_code))
+        return timings, len(queries)
@@ -0,0 +1,117 @@
+import datetime
+import random
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from core import labels, typeahead
+from core.kinds import KINDS
+from core.pagination import CursorPaginator
+from core.rollups import rebuild, row_count, summarize
+from core.search import search
+from core.typeahead import suggest
+
+
+class Command(BaseCommand):
+    help = ('Seed throwaway data, EXPLAIN the list, search and summary queries and '
+            'fail if any of them needs a full table scan or a sort the index '
+            'should have provided. Everything is rolled back afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000,
+                            help='Expense and income rows to seed (default 2000).')
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        if vendor not in ('postgresql', 'sqlite'):
+            raise CommandError('Query plan checks support PostgreSQL and SQLite, not %s' % vendor)
+        failures = []
+        with transaction.atomic():
+            owner = self.seed(options['rows'])
+            if vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+                    # Tiny seeded tables make sequential scans the cheapest
+                    # plan; discourage them to see whether an index applies.
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            for name, sql, ordered in self.capture(owner, vendor):
+                plan = self.explain(sql, vendor)
+                problem = self.find_problem(plan, vendor, ordered)
+                status = 'FAIL (%s)' % problem if problem else 'ok'
+                self.stdout.write('%-36s %s' % (name, status))
+                if problem:
+                    failures.append(name)
+                    self.stdout.write(plan)
+            transaction.set_rollback(True)
+        if failures:
+            raise CommandError('%d quer%s fell back to a scan or sort: %s' % (
+                len(failures), 'y' if len(failures) == 1 else 'ies', ', '.join(failures)))
+
+    def seed(self, rows):
+        owner = User.objects.create_user(username='query-plan-check')
+        other = User.objects.create_user(username='query-plan-check-other')
+        today = datetime.date.today()
+        for kind in KINDS:
+            label_ids = list(labels.ids(kind, ['%s %d' % (kind.name, n) for n in range(8)],
+                                        create=True).values())
+            kind.model.objects.bulk_create(
+                kind.model(owner=random.choice((owner, other)),
+                           amount=Decimal(random.randint(1, 500000)).scaleb(-2),
+                           date=today - datetime.timedelta(days=random.randint(0, 3 * 365)),
+                           description='seeded %s %d' % (kind.name, n),
+                           **{kind.label_attname: random.choice(label_ids)})
+                for n in range(rows))
+            rebuild(kind)
+            typeahead.rebuild(kind)
+        return owner
+
+    def capture(self, owner, vendor):
+        today = datetime.date.today()
+        for kind in KINDS:
+            page = CursorPaginator(kind.model.objects.filter(owner=owner), 5).get_page(None)
+            calls = [
+                ('list page', True, lambda: page.object_list),
+                ('list next page', True, lambda: CursorPaginator(
+                    kind.model.objects.filter(owner=owner), 5).get_page(page.next_cursor).object_list),
+                ('row count', False, lambda: row_count(kind, owner)),
+                ('summary', False, lambda: summarize(
+                    kind, owner, today - datetime.timedelta(days=180), today)),
+                ('search amount', False, lambda: search(kind, owner, '125')),
+                ('search date', False, lambda: search(kind, owner, today.strftime('%Y-%m'))),
+                ('typeahead', False, lambda: suggest(kind, owner, 'seeded')),
+            ]
+            if vendor == 'postgresql':
+                # Substring search is only indexed through pg_trgm.
+                calls.append(('search text', False, lambda: search(kind, owner, 'seeded')))
+            for name, ordered, call in calls:
+                with CaptureQueriesContext(connection) as queries:
+                    call()
+                # The Category/Source tables are small and read whole into the cache.
+                selects = [q['sql'] for q in queries if q['sql'].lstrip().upper().startswith('SELECT')
+                           and kind.label_model._meta.db_table not in q['sql']]
+                for n, sql in enumerate(selects, 1):
+                    suffix = ' #%d' % n if len(selects) > 1 else ''
+                    yield '%s %s%s' % (kind.name, name, suffix), sql, ordered
+
+    def explain(self, sql, vendor):
+        prefix = 'EXPLAIN ' if vendor == 'postgresql' else 'EXPLAIN QUERY PLAN '
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql)
+            return '\n'.join(' '.join(str(col) for col in row) for row in cursor.fetchall())
+
+    def find_problem(self, plan, vendor, ordered):
+        for line in plan.splitlines():
+            if vendor == 'postgresql':
+                if 'Seq Scan' in line:
+                    return 'sequential scan'
+                if ordered and line.strip().lstrip('->').strip().startswith(('Sort ', 'Incremental Sort')):
+                    return 'sort'
+            else:
+                if ' SCAN ' in ' %s ' % line and 'USING' not in line and 'SCAN CONSTANT' not in line:
+                    return 'table scan'
+                if ordered and 'TEMP B-TREE' in line:
+                    return 'sort'
+        return None
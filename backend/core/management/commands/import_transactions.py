@@ -0,0 +1,39 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core.importers import import_file
+from core.kinds import KINDS
+
+
+class Command(BaseCommand):
+    help = 'Stream a CSV or OFX bank export into a user\'s expenses or income.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--user', required=True, help='Username that will own the rows.')
+        parser.add_argument('--kind', required=True, choices=[kind.name for kind in KINDS])
+        parser.add_argument('--format', choices=['csv', 'ofx'],
+                            help='File format; detected from the extension by default.')
+        parser.add_argument('--batch-size', type=int,
+                            help='Rows per bulk insert (default IMPORT_BATCH_SIZE).')
+
+    def handle(self, *args, **options):
+        try:
+            owner = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError('No user named %r' % options['user'])
+        kind = next(kind for kind in KINDS if kind.name == options['kind'])
+
+        def progress(result):
+            self.stdout.write(str(result))
+
+        try:
+            with open(options['path'], 'rb') as binary_file:
+                result = import_file(kind, owner, binary_file, format=options['format'],
+                                     name=options['path'], batch_size=options['batch_size'],
+                                     progress=progress)
+        except (OSError, ValueError) as e:
+            raise CommandError(e)
+        for line, message in result.errors:
+            self.stderr.write('line %d: %s' % (line, message))
+        self.stdout.write(self.style.SUCCESS('Done. %s' % result))
@@ -0,0 +1,60 @@
+import csv
+import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core import rates, versions
+from core.models import ExchangeRate
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = ('Load exchange rates from a CSV file with date, currency and rate columns. '
+            'The rate is the value of one unit of the currency in EXCHANGE_RATE_BASE; '
+            'existing rates for the same currency and date are replaced.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='Defaults to EXCHANGE_RATES_FILE.')
+
+    def handle(self, *args, **options):
+        path = options['path'] or settings.EXCHANGE_RATES_FILE
+        try:
+            with open(path, newline='') as rates_file:
+                loaded = self.load(csv.DictReader(rates_file))
+        except OSError as e:
+            raise CommandError(e)
+        rates.clear()
+        self.stdout.write(self.style.SUCCESS('Loaded %d rates from %s' % (loaded, path)))
+
+    def load(self, reader):
+        loaded = 0
+        batch = []
+        with transaction.atomic():
+            for row in reader:
+                batch.append(self.parse(reader.line_num, row))
+                if len(batch) >= BATCH_SIZE:
+                    loaded += self.save(batch)
+                    batch = []
+            loaded += self.save(batch)
+            # Converted summaries change with the rates; make clients refetch.
+            versions.bump_all()
+        return loaded
+
+    def parse(self, line, row):
+        try:
+            rate = Decimal(row['rate'].strip())
+            if not rate.is_finite() or rate <= 0:
+                raise InvalidOperation
+            return ExchangeRate(currency=rates.validate_currency(row['currency']),
+                                date=datetime.date.fromisoformat(row['date'].strip()), rate=rate)
+        except (AttributeError, KeyError, InvalidOperation, ValueError) as e:
+            raise CommandError('line %d: invalid row %r (%s)' % (line, row, e))
+
+    def save(self, batch):
+        ExchangeRate.objects.bulk_create(batch, update_conflicts=True,
+                                         unique_fields=['currency', 'date'], update_fields=['rate'])
+        return len(batch)
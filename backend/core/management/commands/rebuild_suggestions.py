@@ -0,0 +1,27 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core.kinds import KINDS
+from core.typeahead import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the description typeahead suggestions from the transaction tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only rebuild the suggestions of this username.')
+        parser.add_argument('--kind', choices=[kind.name for kind in KINDS],
+                            help='Only rebuild expense or income suggestions.')
+
+    def handle(self, *args, **options):
+        owner = None
+        if options['user']:
+            try:
+                owner = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError('No user named %r' % options['user'])
+        for kind in KINDS:
+            if options['kind'] and kind.name != options['kind']:
+                continue
+            created = rebuild(kind, owner=owner)
+            self.stdout.write('%s: %d suggestions' % (kind.name, created))
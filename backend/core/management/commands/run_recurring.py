@@ -0,0 +1,31 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.recurring import run_batch
+
+
+class Command(BaseCommand):
+    help = ('Insert the expense/income rows of every recurring transaction that is due. '
+            'Safe to run from cron on several nodes at once.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            help='Rules per transaction (default RECURRING_BATCH_SIZE).')
+        parser.add_argument('--date', help='Materialize occurrences up to this ISO date instead of today.')
+
+    def handle(self, *args, **options):
+        today = None
+        if options['date']:
+            try:
+                today = datetime.date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError('--date must be in YYYY-MM-DD format')
+        rules = created = 0
+        while True:
+            claimed, rows = run_batch(options['batch_size'], today)
+            if not claimed:
+                break
+            rules += claimed
+            created += rows
+        self.stdout.write('%d rules due: %d rows created' % (rules, created))
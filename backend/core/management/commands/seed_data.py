@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.seeding import seed
+
+
+class Command(BaseCommand):
+    help = 'Bulk-create users with realistic expense and income histories for benchmarking.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--expenses', type=int, default=1000, help='Expenses per user.')
+        parser.add_argument('--incomes', type=int, default=100, help='Income rows per user.')
+        parser.add_argument('--days', type=int, default=730,
+                            help='Spread rows over this many days before today.')
+        parser.add_argument('--prefix', default='seed', help='Username prefix.')
+        parser.add_argument('--seed', type=int, help='Random seed for reproducible data.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            users = seed(options['users'], options['expenses'], options['incomes'],
+                         days=options['days'], prefix=options['prefix'], seed=options['seed'])
+        self.stdout.write(self.style.SUCCESS('Created %d users (%s .. %s)' % (
+            len(users), users[0].username if users else '-', users[-1].username if users else '-')))
@@ -0,0 +1,139 @@
+import bisect
+import threading
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Each thread records into its own store, so the request path never takes a
+# lock; the registry lock is only held once per thread and while exporting.
+# The stores of threads that have exited are folded into _retired, so a
+# thread-per-request server does not grow the registry.
+_registry = {}  # thread -> {view: ViewStats}
+_retired = {}
+_registry_lock = threading.Lock()
+_local = threading.local()
+
+
+class ViewStats:
+    __slots__ = ('latency_buckets', 'latency_sum', 'query_buckets', 'query_sum',
+                 'db_seconds', 'response_bytes', 'statuses')
+
+    def __init__(self):
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.query_buckets = [0] * (len(QUERY_BUCKETS) + 1)
+        self.query_sum = 0
+        self.db_seconds = 0.0
+        self.response_bytes = 0
+        self.statuses = {}
+
+    def merge(self, other):
+        for n, value in enumerate(other.latency_buckets):
+            self.latency_buckets[n] += value
+        for n, value in enumerate(other.query_buckets):
+            self.query_buckets[n] += value
+        self.latency_sum += other.latency_sum
+        self.query_sum += other.query_sum
+        self.db_seconds += other.db_seconds
+        self.response_bytes += other.response_bytes
+        for status, value in other.statuses.copy().items():
+            self.statuses[status] = self.statuses.get(status, 0) + value
+
+
+def _fold_finished():
+    # Called with _registry_lock held.
+    for thread in [thread for thread in _registry if not thread.is_alive()]:
+        for view, stats in _registry.pop(thread).items():
+            _retired.setdefault(view, ViewStats()).merge(stats)
+
+
+def _store():
+    store = getattr(_local, 'store', None)
+    if store is None:
+        store = _local.store = {}
+        with _registry_lock:
+            _fold_finished()
+            _registry[threading.current_thread()] = store
+    return store
+
+
+def record(view, status, seconds, queries, db_seconds, response_bytes):
+    store = _store()
+    stats = store.get(view)
+    if stats is None:
+        stats = store[view] = ViewStats()
+    stats.latency_buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+    stats.latency_sum += seconds
+    stats.query_buckets[bisect.bisect_left(QUERY_BUCKETS, queries)] += 1
+    stats.query_sum += queries
+    stats.db_seconds += db_seconds
+    stats.response_bytes += response_bytes
+    stats.statuses[status] = stats.statuses.get(status, 0) + 1
+
+
+def snapshot():
+    """Merge every thread's store into one {view: ViewStats} dict."""
+    merged = {}
+    with _registry_lock:
+        _fold_finished()
+        stores = list(_registry.values())
+        for view, stats in _retired.items():
+            merged.setdefault(view, ViewStats()).merge(stats)
+    for store in stores:
+        for view, stats in store.copy().items():
+            merged.setdefault(view, ViewStats()).merge(stats)
+    return merged
+
+
+def reset():
+    with _registry_lock:
+        for store in _registry.values():
+            store.clear()
+        _retired.clear()
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _histogram(lines, name, view, bounds, buckets, total):
+    cumulative = 0
+    for bound, count in zip(bounds, buckets):
+        cumulative += count
+        lines.append('%s_bucket{view="%s",le="%s"} %d' % (name, view, bound, cumulative))
+    cumulative += buckets[-1]
+    lines.append('%s_bucket{view="%s",le="+Inf"} %d' % (name, view, cumulative))
+    lines.append('%s_sum{view="%s"} %s' % (name, view, total))
+    lines.append('%s_count{view="%s"} %d' % (name, view, cumulative))
+
+
+def render():
+    """Return all metrics in the Prometheus text exposition format."""
+    stats = sorted(snapshot().items())
+    sections = [
+        ('finance_request_duration_seconds', 'histogram', 'Request latency by URL name.'),
+        ('finance_request_db_queries', 'histogram', 'Database queries per request by URL name.'),
+        ('finance_request_db_seconds_total', 'counter', 'Time spent in database queries by URL name.'),
+        ('finance_response_bytes_total', 'counter', 'Response body bytes by URL name.'),
+        ('finance_requests_total', 'counter', 'Requests by URL name and status code.'),
+    ]
+    lines = []
+    for name, type, help in sections:
+        lines.append('# HELP %s %s' % (name, help))
+        lines.append('# TYPE %s %s' % (name, type))
+        for view, view_stats in stats:
+            view = _label(view)
+            if name == 'finance_request_duration_seconds':
+                _histogram(lines, name, view, LATENCY_BUCKETS,
+                           view_stats.latency_buckets, view_stats.latency_sum)
+            elif name == 'finance_request_db_queries':
+                _histogram(lines, name, view, QUERY_BUCKETS,
+                           view_stats.query_buckets, view_stats.query_sum)
+            elif name == 'finance_request_db_seconds_total':
+                lines.append('%s{view="%s"} %s' % (name, view, view_stats.db_seconds))
+            elif name == 'finance_response_bytes_total':
+                lines.append('%s{view="%s"} %d' % (name, view, view_stats.response_bytes))
+            else:
+                for status, count in sorted(view_stats.statuses.items()):
+                    lines.append('%s{view="%s",status="%s"} %d' % (name, view, status, count))
+    return '\n'.join(lines) + '\n'
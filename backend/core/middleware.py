@@ -0,0 +1,168 @@
+import logging
+import mimetypes
+import os
+import time
+from urllib.parse import urlsplit
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed, SuspiciousFileOperation
+from django.db import connection
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCounter:
+    """connection.execute_wrapper() hook counting queries and their time."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+class MetricsMiddleware:
+    """Record latency, query count/time and response size per URL name.
+
+    Works for both sync and async views. See core.metrics for the storage
+    and the /metrics endpoint for the Prometheus output.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - started, counter)
+        return response
+
+    async def __acall__(self, request):
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - started, counter)
+        return response
+
+    def record(self, request, response, seconds, counter):
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        size = 0 if response.streaming else len(response.content)
+        metrics.record(view, response.status_code, seconds, counter.count, counter.seconds, size)
+        budget = settings.METRICS_QUERY_BUDGET
+        if budget is not None and counter.count > budget:
+            logger.warning('%s %s (%s) ran %d queries, over the budget of %d',
+                           request.method, request.path, view, counter.count, budget)
+
+
+def _accepted_encodings(header):
+    accepted = set()
+    for part in header.split(','):
+        coding, *params = [item.strip() for item in part.split(';')]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding and quality > 0:
+            accepted.add(coding.lower())
+    return accepted
+
+
+class PrecompressedStaticMiddleware:
+    """Serve STATIC_ROOT in production, using the precompressed variants.
+
+    Files are those written by collectstatic with
+    core.storage.CompressedManifestStaticFilesStorage. The .br or .gz
+    variant is sent when the client accepts it. Content-hashed names never
+    change content, so they are cached for a year as immutable. Other names
+    must be revalidated with If-Modified-Since. Other requests pass through.
+    """
+
+    sync_capable = True
+    async_capable = True
+    IMMUTABLE = 'public, max-age=31536000, immutable'
+    VARIANTS = (('br', '.br'), ('gzip', '.gz'))
+
+    def __init__(self, get_response):
+        if not settings.STATIC_ROOT:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.root = settings.STATIC_ROOT
+        self.prefix = '/' + urlsplit(settings.STATIC_URL).path.lstrip('/')
+        self.hashed = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.serve(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        return self.serve(request) or await self.get_response(request)
+
+    def serve(self, request):
+        if request.method not in ('GET', 'HEAD') or not request.path_info.startswith(self.prefix):
+            return None
+        name = request.path_info[len(self.prefix):]
+        try:
+            path = safe_join(self.root, name)
+        except SuspiciousFileOperation:
+            return None
+        if not os.path.isfile(path):
+            return None
+        accepted = _accepted_encodings(request.headers.get('Accept-Encoding', ''))
+        variants = [(coding, path + suffix) for coding, suffix in self.VARIANTS
+                    if os.path.isfile(path + suffix)]
+        coding, served = next(((coding, variant) for coding, variant in variants if coding in accepted),
+                              (None, path))
+        stat = os.stat(served)
+        if name not in self.hashed and not was_modified_since(
+                request.headers.get('If-Modified-Since'), stat.st_mtime):
+            return HttpResponseNotModified()
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if request.method == 'HEAD':
+            content = b''
+        else:
+            with open(served, 'rb') as f:
+                content = f.read()
+        response = HttpResponse(content, content_type=content_type)
+        response['Content-Length'] = stat.st_size
+        if coding:
+            response['Content-Encoding'] = coding
+        if variants:
+            response['Vary'] = 'Accept-Encoding'
+        if name in self.hashed:
+            response['Cache-Control'] = self.IMMUTABLE
+        else:
+            response['Cache-Control'] = 'no-cache'
+            response['Last-Modified'] = http_date(stat.st_mtime)
+        return response
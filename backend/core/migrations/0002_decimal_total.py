@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:05
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+KINDS = [
+    ('expense', 'expenses', 'Expense', 'category'),
+    ('income', 'income', 'Income', 'source'),
+]
+
+
+def resum_rollups(apps, schema_editor):
+    # The float totals carried rounding drift; recompute them exactly from
+    # the now-decimal transaction amounts.
+    MonthlyRollup = apps.get_model('core', 'MonthlyRollup')
+    MonthlyRollup.objects.all().delete()
+    for kind, app_label, model_name, label_field in KINDS:
+        Model = apps.get_model(app_label, model_name)
+        grouped = (Model.objects.order_by()
+                   .values('owner_id', label_field, month=TruncMonth('date'))
+                   .annotate(total=Sum('amount'), count=Count('id')))
+        MonthlyRollup.objects.bulk_create(
+            (MonthlyRollup(owner_id=row['owner_id'], kind=kind, month=row['month'],
+                           label=row[label_field], total=row['total'], count=row['count'])
+             for row in grouped.iterator()),
+            batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('expenses', '0005_decimal_amount'),
+        ('income', '0005_decimal_amount'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='monthlyrollup',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=16),
+        ),
+        migrations.RunPython(resum_rollups, migrations.RunPython.noop),
+    ]
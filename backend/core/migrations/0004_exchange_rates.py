@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:19
+
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def currency_from_preferences(apps, schema_editor):
+    # Amounts were entered in the owner's preferred currency, stored as e.g.
+    # "USD - United States Dollar".
+    UserPreference = apps.get_model('userpreferences', 'UserPreference')
+    MonthlyRollup = apps.get_model('core', 'MonthlyRollup')
+    for user_id, currency in UserPreference.objects.exclude(currency=None).values_list('user_id', 'currency'):
+        match = re.search(r'\b[A-Z]{3}\b', currency)
+        if match and match.group() != 'VND':
+            MonthlyRollup.objects.filter(owner_id=user_id).update(currency=match.group())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_data_version'),
+        ('userpreferences', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=3)),
+                ('date', models.DateField()),
+                ('rate', models.DecimalField(decimal_places=10, max_digits=20)),
+            ],
+        ),
+        migrations.RemoveConstraint(
+            model_name='monthlyrollup',
+            name='unique_monthly_rollup',
+        ),
+        migrations.AddField(
+            model_name='monthlyrollup',
+            name='currency',
+            field=models.CharField(default='VND', max_length=3),
+        ),
+        migrations.AddConstraint(
+            model_name='monthlyrollup',
+            constraint=models.UniqueConstraint(fields=('owner', 'kind', 'month', 'label', 'currency'), name='unique_monthly_rollup_currency'),
+        ),
+        migrations.AddConstraint(
+            model_name='exchangerate',
+            constraint=models.UniqueConstraint(fields=('currency', 'date'), name='unique_exchange_rate'),
+        ),
+        migrations.RunPython(currency_from_preferences, migrations.RunPython.noop),
+    ]
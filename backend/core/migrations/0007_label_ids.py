@@ -0,0 +1,147 @@
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Substr, Trim, TruncMonth
+
+KINDS = [('expense', 'expenses', 'Expense', 'category', 'Category'),
+         ('income', 'income', 'Income', 'source', 'Source')]
+
+
+def labels_to_ids(apps, schema_editor):
+    # Budgets and recurring rules point at their label row by id; names no
+    # label row has yet get one, as the transaction migrations did.
+    for kind, app, _, _, label_model in KINDS:
+        Label = apps.get_model(app, label_model)
+        for model in ('Budget', 'RecurringTransaction'):
+            rows = apps.get_model('core', model).objects.filter(kind=kind)
+            rows.update(label=Trim(Substr('label', 1, 255)))
+            existing = set(Label.objects.values_list('name', flat=True))
+            used = rows.order_by().values_list('label', flat=True).distinct()
+            Label.objects.bulk_create(Label(name=name) for name in used if name not in existing)
+            rows.update(label_ref=Subquery(Label.objects.filter(name=OuterRef('label')).values('pk')[:1]))
+
+
+def ids_to_labels(apps, schema_editor):
+    for kind, app, _, _, label_model in KINDS:
+        Label = apps.get_model(app, label_model)
+        for model in ('Budget', 'RecurringTransaction'):
+            apps.get_model('core', model).objects.filter(kind=kind).update(
+                label=Subquery(Label.objects.filter(pk=OuterRef('label_ref')).values('name')[:1]))
+
+
+def _rebuild_rollups(apps, label):
+    MonthlyRollup = apps.get_model('core', 'MonthlyRollup')
+    MonthlyRollup.objects.all().delete()
+    for kind, app, model, field, _ in KINDS:
+        grouped = (apps.get_model(app, model).objects.order_by()
+                   .values('owner_id', 'currency', label=label(field), month=TruncMonth('date'))
+                   .annotate(total=Sum('amount'), count=Count('id')))
+        MonthlyRollup.objects.bulk_create(
+            (MonthlyRollup(owner_id=row['owner_id'], kind=kind, month=row['month'],
+                           label=row['label'], currency=row['currency'],
+                           total=row['total'], count=row['count'])
+             for row in grouped.iterator()), batch_size=1000)
+
+
+def rollups_by_id(apps, schema_editor):
+    # The rollups are derived data: recompute them keyed by label id.
+    _rebuild_rollups(apps, lambda field: F(field))
+
+
+def rollups_by_name(apps, schema_editor):
+    _rebuild_rollups(apps, lambda field: F(field + '__name'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_recurring_transactions'),
+        ('expenses', '0008_category_fk'),
+        ('income', '0008_source_fk'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='monthlyrollup',
+            name='unique_monthly_rollup_currency',
+        ),
+        migrations.RemoveConstraint(
+            model_name='budget',
+            name='unique_budget',
+        ),
+        migrations.AddField(
+            model_name='budget',
+            name='label_ref',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='recurringtransaction',
+            name='label_ref',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.RunPython(labels_to_ids, ids_to_labels),
+        # Unapplying re-adds the name columns to tables that have rows.
+        migrations.AlterField(
+            model_name='budget',
+            name='label',
+            field=models.CharField(max_length=266, default=''),
+        ),
+        migrations.AlterField(
+            model_name='recurringtransaction',
+            name='label',
+            field=models.CharField(max_length=266, default=''),
+        ),
+        migrations.RemoveField(
+            model_name='budget',
+            name='label',
+        ),
+        migrations.RemoveField(
+            model_name='recurringtransaction',
+            name='label',
+        ),
+        migrations.RenameField(
+            model_name='budget',
+            old_name='label_ref',
+            new_name='label',
+        ),
+        migrations.RenameField(
+            model_name='recurringtransaction',
+            old_name='label_ref',
+            new_name='label',
+        ),
+        migrations.AlterField(
+            model_name='budget',
+            name='label',
+            field=models.BigIntegerField(),
+        ),
+        migrations.AlterField(
+            model_name='recurringtransaction',
+            name='label',
+            field=models.BigIntegerField(),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, rollups_by_name),
+        migrations.AlterField(
+            model_name='monthlyrollup',
+            name='label',
+            field=models.CharField(max_length=266, default=''),
+        ),
+        migrations.RemoveField(
+            model_name='monthlyrollup',
+            name='label',
+        ),
+        migrations.AddField(
+            model_name='monthlyrollup',
+            name='label',
+            field=models.BigIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.RunPython(rollups_by_id, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='monthlyrollup',
+            constraint=models.UniqueConstraint(fields=('owner', 'kind', 'month', 'label', 'currency'),
+                                               name='unique_monthly_rollup_currency'),
+        ),
+        migrations.AddConstraint(
+            model_name='budget',
+            constraint=models.UniqueConstraint(fields=('owner', 'kind', 'label'), name='unique_budget'),
+        ),
+    ]
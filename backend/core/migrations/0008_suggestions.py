@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:38
+
+import re
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+KINDS = [('expense', 'expenses', 'Expense', 'category_id'),
+         ('income', 'income', 'Income', 'source_id')]
+
+
+def fill_suggestions(apps, schema_editor):
+    # Same normalization as core.typeahead; the latest row of each
+    # description sets its spelling and category/source.
+    Suggestion = apps.get_model('core', 'Suggestion')
+    for kind, app, model, label_field in KINDS:
+        counted = {}
+        rows = (apps.get_model(app, model).objects.order_by('date', 'id')
+                .values_list('owner_id', 'description', label_field))
+        for owner_id, description, label in rows.iterator():
+            value = re.sub(r'\s+', ' ', description or '').strip()[:255]
+            if value:
+                entry = counted.setdefault((owner_id, value.lower()), [0, None, None])
+                entry[0] += 1
+                entry[1], entry[2] = value, label
+        Suggestion.objects.bulk_create(
+            (Suggestion(owner_id=owner_id, kind=kind, value=value, value_lower=value_lower,
+                        label=label, count=count)
+             for (owner_id, value_lower), (count, value, label) in counted.items()),
+            batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_label_ids'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Suggestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('expense', 'Expense'), ('income', 'Income')], max_length=7)),
+                ('value', models.CharField(max_length=255)),
+                ('value_lower', models.CharField(max_length=255)),
+                ('label', models.BigIntegerField()),
+                ('count', models.IntegerField(default=0)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', 'kind', 'value_lower'], name='suggestion_prefix_idx', opclasses=['', '', 'varchar_pattern_ops'])],
+                'constraints': [models.UniqueConstraint(fields=('owner', 'kind', 'value_lower'), name='unique_suggestion')],
+            },
+        ),
+        migrations.RunPython(fill_suggestions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def create_import_label(apps, schema_editor):
+    # OFX transactions carry no category/source; imports use this one and
+    # no longer create missing names.
+    for app, model in (('expenses', 'Category'), ('income', 'Source')):
+        apps.get_model(app, model).objects.get_or_create(name=settings.IMPORT_DEFAULT_LABEL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_suggestions'),
+        ('expenses', '0008_category_fk'),
+        ('income', '0008_source_fk'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_import_label, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+KINDS = [('expense', 'expenses', 'Category'), ('income', 'income', 'Source')]
+
+
+def drop_dangling_labels(apps, schema_editor):
+    # The label columns hold Category/Source ids without a foreign key (see
+    # core.models). Until deletes of labels in use were refused, deleting a
+    # category could leave budgets and recurring rules pointing at nothing;
+    # they showed a blank name and their rows could not be written.
+    for kind, app, label_model in KINDS:
+        labels = apps.get_model(app, label_model).objects.values('pk')
+        for model in ('Budget', 'RecurringTransaction', 'Suggestion', 'MonthlyRollup'):
+            (apps.get_model('core', model).objects
+             .filter(kind=kind).exclude(label__in=labels).delete())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_default_import_label'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_dangling_labels, migrations.RunPython.noop),
+    ]
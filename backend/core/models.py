@@ -0,0 +1,177 @@
+from django.db import models
+from django.contrib.auth.models import User
+
+# Create your models here.
+
+# ``label`` below is the id of a Category (expense) or Source (income) row,
+# depending on ``kind``, so it cannot be a single foreign key. Rollups and
+# suggestions only exist while transaction rows with that label do, and those
+# rows PROTECT their label. Budgets and recurring rules are checked by
+# core.receivers.protect_labels, which refuses to delete a label in use.
+class MonthlyRollup(models.Model):
+    EXPENSE = 'expense'
+    INCOME = 'income'
+    KIND_CHOICES = [
+        (EXPENSE, 'Expense'),
+        (INCOME, 'Income'),
+    ]
+
+    owner = models.ForeignKey(to=User, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=7, choices=KIND_CHOICES)
+    month = models.DateField()  # first day of the month
+    label = models.BigIntegerField()  # Category (expense) or Source (income) id
+    currency = models.CharField(max_length=3, default='VND')
+    total = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return '%s %s %s' % (self.kind, self.month, self.label)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'kind', 'month', 'label', 'currency'],
+                                    name='unique_monthly_rollup_currency'),
+        ]
+
+
+class ExchangeRate(models.Model):
+    """Value of one unit of ``currency`` in settings.EXCHANGE_RATE_BASE on ``date``.
+
+    Loaded from a rates file by the load_exchange_rates command; a rate
+    applies from its date until the next one.
+    """
+    currency = models.CharField(max_length=3)
+    date = models.DateField()
+    rate = models.DecimalField(max_digits=20, decimal_places=10)
+
+    def __str__(self):
+        return '%s %s %s' % (self.currency, self.date, self.rate)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['currency', 'date'], name='unique_exchange_rate'),
+        ]
+
+
+class DataVersion(models.Model):
+    """Counter bumped whenever one of the user's transactions changes.
+
+    Pages and JSON built from the user's data use it as their ETag, so an
+    unchanged client gets a 304 without the transaction tables being read.
+    """
+    owner = models.OneToOneField(to=User, on_delete=models.CASCADE)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return '%s v%d' % (self.owner, self.version)
+
+
+class Budget(models.Model):
+    """Monthly target for one category (expenses) or source (income).
+
+    Consumption is read from the month's MonthlyRollup buckets, which the
+    writing transaction keeps up to date, so checking a budget never
+    re-sums the month.
+    """
+    owner = models.ForeignKey(to=User, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=7, choices=MonthlyRollup.KIND_CHOICES)
+    label = models.BigIntegerField()  # Category (expense) or Source (income) id
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+    currency = models.CharField(max_length=3, default='VND')
+    alert_at = models.PositiveSmallIntegerField(default=100)  # percent of amount
+
+    def __str__(self):
+        return '%s %s %s' % (self.kind, self.label, self.amount)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'kind', 'label'], name='unique_budget'),
+        ]
+
+
+class BudgetAlert(models.Model):
+    """Raised once per budget and month, when consumption first reaches alert_at."""
+    budget = models.ForeignKey(to=Budget, on_delete=models.CASCADE)
+    month = models.DateField()  # first day of the month
+    spent = models.DecimalField(max_digits=16, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return '%s %s' % (self.budget, self.month)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['budget', 'month'], name='unique_budget_alert'),
+        ]
+
+
+class RecurringTransaction(models.Model):
+    """Rule that turns into an expense or income row on a fixed schedule.
+
+    The run_recurring command inserts every occurrence up to today;
+    ``occurrences`` counts those already inserted and ``next_date`` is the
+    date of the next one (None once past ``end_date``).
+    """
+    DAY = 'day'
+    WEEK = 'week'
+    MONTH = 'month'
+    YEAR = 'year'
+    FREQUENCY_CHOICES = [
+        (DAY, 'Daily'),
+        (WEEK, 'Weekly'),
+        (MONTH, 'Monthly'),
+        (YEAR, 'Yearly'),
+    ]
+
+    owner = models.ForeignKey(to=User, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=7, choices=MonthlyRollup.KIND_CHOICES)
+    label = models.BigIntegerField()  # Category (expense) or Source (income) id
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+    currency = models.CharField(max_length=3, default='VND')
+    description = models.TextField()
+    frequency = models.CharField(max_length=5, choices=FREQUENCY_CHOICES)
+    interval = models.PositiveSmallIntegerField(default=1)  # every N days/weeks/months/years
+    start_date = models.DateField()
+    end_date = models.DateField(null=True, blank=True)
+    occurrences = models.PositiveIntegerField(default=0)
+    next_date = models.DateField(null=True, blank=True)
+
+    def __str__(self):
+        return '%s %s every %d %s' % (self.kind, self.label, self.interval, self.frequency)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_date'], name='recurring_due_idx'),
+        ]
+
+
+class Suggestion(models.Model):
+    """A description the user has entered, for the add/edit form typeahead.
+
+    One row per distinct (case-insensitive) description, with the number of
+    rows that use it and the category/source of the latest one. Kept up to
+    date by the writing transaction, so a lookup is an index range scan on
+    ``value_lower`` instead of a scan of the user's rows.
+    """
+    owner = models.ForeignKey(to=User, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=7, choices=MonthlyRollup.KIND_CHOICES)
+    value = models.CharField(max_length=255)
+    value_lower = models.CharField(max_length=255)
+    label = models.BigIntegerField()  # Category (expense) or Source (income) id
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return '%s %s (%d)' % (self.kind, self.value, self.count)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'kind', 'value_lower'], name='unique_suggestion'),
+        ]
+        indexes = [
+            # varchar_pattern_ops lets PostgreSQL serve LIKE 'prefix%' from
+            # the index whatever the database collation; other backends
+            # ignore opclasses.
+            models.Index(fields=['owner', 'kind', 'value_lower'], name='suggestion_prefix_idx',
+                         opclasses=['', '', 'varchar_pattern_ops']),
+        ]
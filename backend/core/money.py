@@ -0,0 +1,31 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# Amounts are stored as DecimalField(max_digits=14, decimal_places=2) and
+# summed by the database, so totals are exact to the cent.
+MAX_DIGITS = 14
+DECIMAL_PLACES = 2
+CENT = Decimal(1).scaleb(-DECIMAL_PLACES)
+
+
+def parse_amount(value):
+    """Parse user input such as ``"1,234.5"`` into a Decimal rounded to cents.
+
+    Raises ValueError with a message suitable for the add/edit forms.
+    """
+    if isinstance(value, float):
+        # repr() gives the shortest string that round-trips, e.g. 0.1 -> '0.1'.
+        value = repr(value)
+    try:
+        amount = Decimal(str(value).replace(',', '').strip())
+    except InvalidOperation:
+        raise ValueError('Amount must be a number')
+    if not amount.is_finite():
+        raise ValueError('Amount must be a number')
+    # Checked first: quantize() raises InvalidOperation once the result has
+    # more digits than the context precision, e.g. for "1e30".
+    if amount.adjusted() >= MAX_DIGITS - DECIMAL_PLACES:
+        raise ValueError('Amount is too large')
+    amount = amount.quantize(CENT, rounding=ROUND_HALF_UP)
+    if len(amount.as_tuple().digits) > MAX_DIGITS:
+        raise ValueError('Amount is too large')
+    return amount
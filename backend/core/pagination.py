@@ -0,0 +1,125 @@
+import base64
+import datetime
+import json
+
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+NEXT = 'n'
+PREVIOUS = 'p'
+LAST = 'l'
+
+
+def pack(payload):
+    """Encode a JSON-serializable cursor payload as a URL-safe token."""
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+def unpack(token):
+    """Inverse of pack(); raises ValueError for a garbled token."""
+    return json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+
+
+def encode_cursor(direction, row=None):
+    return pack([direction] if row is None else [direction, row.date.isoformat(), row.pk])
+
+
+def decode_cursor(token):
+    """Return (direction, date, pk), or None for a missing or garbled token."""
+    if not token:
+        return None
+    try:
+        payload = unpack(token)
+        if payload == [LAST]:
+            return LAST, None, None
+        direction, date, pk = payload
+        if direction not in (NEXT, PREVIOUS):
+            return None
+        return direction, datetime.date.fromisoformat(date), int(pk)
+    except (ValueError, TypeError):
+        return None
+
+
+class CursorPaginator:
+    """Keyset pagination over a queryset, newest first by (date, id).
+
+    Each page is a single indexed range query of ``per_page + 1`` rows; there
+    is no COUNT(*) and no OFFSET, so deep pages cost the same as the first.
+    ``count`` is an optional callable giving a (possibly approximate) total.
+    """
+
+    def __init__(self, queryset, per_page, count=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.count = count
+
+    def get_page(self, token):
+        return CursorPage(self, decode_cursor(token))
+
+
+class CursorPage:
+    def __init__(self, paginator, cursor):
+        self.paginator = paginator
+        self.cursor = cursor
+
+    @cached_property
+    def _window(self):
+        per_page = self.paginator.per_page
+        queryset = self.paginator.queryset
+        direction = self.cursor[0] if self.cursor else None
+        if direction == PREVIOUS:
+            _, date, pk = self.cursor
+            rows = list(queryset.filter(Q(date__gt=date) | Q(date=date, pk__gt=pk))
+                        .order_by('date', 'id')[:per_page + 1])
+            more = len(rows) > per_page
+            return rows[:per_page][::-1], more, True
+        if direction == LAST:
+            rows = list(queryset.order_by('date', 'id')[:per_page + 1])
+            more = len(rows) > per_page
+            return rows[:per_page][::-1], more, False
+        if direction == NEXT:
+            _, date, pk = self.cursor
+            queryset = queryset.filter(Q(date__lt=date) | Q(date=date, pk__lt=pk))
+        rows = list(queryset.order_by('-date', '-id')[:per_page + 1])
+        return rows[:per_page], direction == NEXT, len(rows) > per_page
+
+    @property
+    def object_list(self):
+        return self._window[0]
+
+    def has_previous(self):
+        return self._window[1]
+
+    def has_next(self):
+        return self._window[2]
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+    @property
+    def next_cursor(self):
+        if self.has_next():
+            return encode_cursor(NEXT, self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous():
+            return encode_cursor(PREVIOUS, self.object_list[0])
+
+    @property
+    def last_cursor(self):
+        return encode_cursor(LAST)
+
+    @cached_property
+    def total(self):
+        if self.paginator.count is not None:
+            return self.paginator.count()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __repr__(self):
+        return '<Page %s of %s>' % (self.cursor, self.paginator.queryset.model.__name__)
@@ -0,0 +1,110 @@
+import bisect
+import re
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Case, DateField, F, Value, When
+
+from . import cache
+from .models import ExchangeRate
+
+CODE_RE = re.compile(r'\b[A-Z]{3}\b')
+DEFAULT_CURRENCY_CODE = 'VND'
+
+
+class MissingRate(ValueError):
+    pass
+
+
+def currency_code(preference):
+    """ISO code of a UserPreference.currency value such as ``"USD - United States Dollar"``."""
+    match = CODE_RE.search(preference or '')
+    return match.group() if match else DEFAULT_CURRENCY_CODE
+
+
+def preferred_currency(user):
+    return currency_code(cache.get_currency(user))
+
+
+async def apreferred_currency(user):
+    return currency_code(await cache.aget_currency(user))
+
+
+def validate_currency(code):
+    """Return ``code`` upper-cased, or raise ValueError if it is not a known currency."""
+    code = (code or '').strip().upper()
+    if code not in {currency['name'] for currency in cache.get_currencies()}:
+        raise ValueError('Unknown currency %s' % code)
+    return code
+
+
+class RateTable:
+    """All exchange rates, held in memory as sorted (date, rate) series per currency."""
+
+    def __init__(self, rows):
+        self.dates, self.rates = {}, {}
+        for currency, date, rate in rows:
+            self.dates.setdefault(currency, []).append(date)
+            self.rates.setdefault(currency, []).append(rate)
+
+    def rate(self, currency, date):
+        """Value of one unit of ``currency`` in the base currency on ``date``."""
+        if currency == settings.EXCHANGE_RATE_BASE:
+            return 1
+        n = bisect.bisect_right(self.dates.get(currency, ()), date) - 1
+        if n < 0:
+            raise MissingRate('No exchange rate for %s on %s' % (currency, date))
+        return self.rates[currency][n]
+
+    def convert(self, amount, currency, target, date):
+        if currency == target:
+            return amount
+        return amount * self.rate(currency, date) / self.rate(target, date)
+
+
+_table = None
+_loaded_at = 0
+_lock = threading.Lock()
+
+
+def _fresh():
+    return _table is not None and time.monotonic() - _loaded_at < settings.EXCHANGE_RATE_CACHE_TIMEOUT
+
+
+def get_table():
+    """The process-wide RateTable, reloaded after EXCHANGE_RATE_CACHE_TIMEOUT seconds."""
+    global _table, _loaded_at
+    if not _fresh():
+        with _lock:
+            if not _fresh():
+                rows = ExchangeRate.objects.order_by('currency', 'date').values_list(
+                    'currency', 'date', 'rate')
+                _table, _loaded_at = RateTable(rows.iterator()), time.monotonic()
+    return _table
+
+
+async def aget_table():
+    return _table if _fresh() else await sync_to_async(get_table)()
+
+
+def clear():
+    global _table
+    _table = None
+
+
+def rate_date(target):
+    """Grouping key that keeps rows in ``target`` together and splits other rows by date.
+
+    Aggregating with ``values(..., 'currency', rate_date=rate_date(target))``
+    gives one group per label for the target currency and one per label,
+    currency and day otherwise, so each group converts at a single rate.
+    """
+    return Case(When(currency=target, then=Value(None)), default=F('date'),
+                output_field=DateField())
+
+
+def needs_table(rows, target):
+    """Whether any grouped row is in a currency other than ``target``."""
+    return target is not None and any(row['currency'] != target for row in rows)
@@ -0,0 +1,78 @@
+from django.db.models import ProtectedError
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from expenses.models import Category
+from income.models import Source
+from userpreferences.models import UserPreference
+
+from . import budgets, cache, labels, rates, typeahead, versions
+from .kinds import kind_for, kind_for_label
+from .models import ExchangeRate
+from .rollups import apply_changes
+from .signals import transactions_changed
+
+
+@receiver(transactions_changed)
+def update_rollups(sender, added=(), removed=(), **kwargs):
+    apply_changes(kind_for(sender), added, removed)
+
+
+@receiver(transactions_changed)
+def check_budgets(sender, added=(), **kwargs):
+    # Connected after update_rollups, so the rollups already include ``added``.
+    budgets.evaluate(kind_for(sender), added)
+
+
+@receiver(transactions_changed)
+def update_suggestions(sender, added=(), removed=(), **kwargs):
+    typeahead.apply_changes(kind_for(sender), added, removed)
+
+
+@receiver(transactions_changed)
+def bump_data_version(sender, added=(), removed=(), **kwargs):
+    versions.bump({obj.owner_id for obj in [*added, *removed]})
+
+
+@receiver([post_save, post_delete], sender=UserPreference)
+def invalidate_currency(sender, instance, **kwargs):
+    cache.invalidate('currency', instance.user_id)
+
+
+@receiver(post_save, sender=UserPreference)
+def bump_data_version_on_currency(sender, instance, **kwargs):
+    # Pages validated by the data version show amounts in this currency.
+    versions.bump([instance.user_id])
+
+
+@receiver(pre_delete, sender=Category)
+@receiver(pre_delete, sender=Source)
+def protect_labels(sender, instance, **kwargs):
+    # Budgets and recurring rules hold the label id without a foreign key.
+    kind = kind_for_label(sender)
+    used = labels.references(kind, [instance.pk])
+    if used:
+        raise ProtectedError('Cannot delete %s %r: budgets or recurring rules use it'
+                             % (kind.label_field, instance.name), set(used))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Source)
+def bump_data_versions_on_label(sender, **kwargs):
+    # Every user's pages show the shared category/source names.
+    versions.bump_all()
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_categories(sender, **kwargs):
+    cache.invalidate('categories')
+
+
+@receiver([post_save, post_delete], sender=Source)
+def invalidate_sources(sender, **kwargs):
+    cache.invalidate('sources')
+
+
+@receiver([post_save, post_delete], sender=ExchangeRate)
+def clear_rates(sender, **kwargs):
+    rates.clear()
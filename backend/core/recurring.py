@@ -0,0 +1,105 @@
+import calendar
+import datetime
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from .kinds import kind_named
+from .models import RecurringTransaction
+from .signals import transactions_changed
+
+
+def occurrence(rule, n):
+    """Date of ``rule``'s ``n``-th occurrence, counting ``start_date`` as 0.
+
+    Monthly and yearly rules keep the start day, moved back to the last day
+    of shorter months (a rule starting on Jan 31 falls on Feb 28, Mar 31...).
+    """
+    step = n * rule.interval
+    start = rule.start_date
+    if rule.frequency == RecurringTransaction.DAY:
+        return start + datetime.timedelta(days=step)
+    if rule.frequency == RecurringTransaction.WEEK:
+        return start + datetime.timedelta(weeks=step)
+    if rule.frequency == RecurringTransaction.MONTH:
+        months = start.month - 1 + step
+        year, month = start.year + months // 12, months % 12 + 1
+    else:
+        year, month = start.year + step, start.month
+    return datetime.date(year, month, min(start.day, calendar.monthrange(year, month)[1]))
+
+
+def _next(rule, n):
+    date = occurrence(rule, n)
+    return None if rule.end_date is not None and date > rule.end_date else date
+
+
+def schedule(rule):
+    """Reset ``rule``'s position to its first occurrence. Call before saving a new rule."""
+    if rule.interval < 1:
+        raise ValueError('Interval must be at least 1')
+    rule.occurrences = 0
+    rule.next_date = _next(rule, 0)
+
+
+def due_dates(rule, today, limit):
+    """Pop at most ``limit`` of ``rule``'s occurrences up to ``today``, advancing the rule past them."""
+    dates = []
+    while rule.next_date is not None and rule.next_date <= today and len(dates) < limit:
+        dates.append(rule.next_date)
+        rule.occurrences += 1
+        rule.next_date = _next(rule, rule.occurrences)
+    return dates
+
+
+def materialize(rules, today=None):
+    """Insert the due occurrences of ``rules``, which the caller holds locked.
+
+    Must run inside a transaction. Costs, per kind with due rows, one
+    lookup of the occurrences that already exist (the unique
+    (recurrence, date) constraint makes a repeat insert fail rather than
+    duplicate) and one bulk_create; then one bulk_update of the rules.
+    At most RECURRING_MAX_OCCURRENCES rows are added per rule; a rule left
+    behind keeps a due next_date, so the next run_batch claims it again.
+    Returns the number of rows created.
+    """
+    today = today or datetime.date.today()
+    pending = defaultdict(list)
+    for rule in rules:
+        kind = kind_named(rule.kind)
+        for date in due_dates(rule, today, settings.RECURRING_MAX_OCCURRENCES):
+            pending[kind].append(kind.model(owner_id=rule.owner_id, amount=rule.amount, date=date,
+                                            description=rule.description, currency=rule.currency,
+                                            recurrence=rule, **{kind.label_attname: rule.label}))
+    created = 0
+    for kind, rows in pending.items():
+        existing = set(kind.model.objects
+                       .filter(recurrence__in={row.recurrence_id for row in rows},
+                               date__in={row.date for row in rows})
+                       .values_list('recurrence_id', 'date'))
+        rows = [row for row in rows if (row.recurrence_id, row.date) not in existing]
+        kind.model.objects.bulk_create(rows)
+        transactions_changed.send(sender=kind.model, added=rows)
+        created += len(rows)
+    RecurringTransaction.objects.bulk_update(rules, ['occurrences', 'next_date'])
+    return created
+
+
+def run_batch(batch_size=None, today=None):
+    """Materialize one batch of due rules, in one transaction.
+
+    The rules are claimed with SELECT ... FOR UPDATE SKIP LOCKED, so runs on
+    several nodes at once split the due rules between them instead of
+    waiting on or duplicating each other. Returns ``(rules, rows created)``;
+    loop until no rules are claimed.
+    """
+    today = today or datetime.date.today()
+    with transaction.atomic():
+        rules = list(RecurringTransaction.objects
+                     .filter(next_date__lte=today)
+                     .order_by('next_date', 'pk')
+                     .select_for_update(skip_locked=True)[:batch_size or settings.RECURRING_BATCH_SIZE])
+        if not rules:
+            return 0, 0
+        return len(rules), materialize(rules, today)
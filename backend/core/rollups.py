@@ -0,0 +1,182 @@
+import datetime
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum, Count
+from django.db.models.functions import TruncMonth
+
+from . import labels
+from .aggregation import collect, summary_queryset
+from .models import MonthlyRollup
+from .money import CENT
+from .rates import aget_table, get_table, needs_table
+
+
+def month_start(date):
+    return date.replace(day=1)
+
+
+def next_month(date):
+    return (date.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+
+def _row_key(kind, obj):
+    # Views assign raw POST strings to model fields before saving, so coerce
+    # through the field the same way the database did.
+    model = kind.model
+    date = model._meta.get_field('date').to_python(obj.date)
+    amount = model._meta.get_field('amount').to_python(obj.amount)
+    return (obj.owner_id, month_start(date), getattr(obj, kind.label_attname), obj.currency), amount
+
+
+def apply_changes(kind, added=(), removed=()):
+    """Fold written rows into the monthly rollups.
+
+    Must run inside the transaction that wrote the rows. Issues one UPDATE
+    (plus an INSERT for new buckets) per touched (owner, month, label,
+    currency).
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    for sign, rows in ((1, added), (-1, removed)):
+        for obj in rows:
+            key, amount = _row_key(kind, obj)
+            deltas[key][0] += sign * amount
+            deltas[key][1] += sign
+    emptied = False
+    for (owner_id, month, label, currency), (total, count) in deltas.items():
+        if not total and not count:
+            continue
+        bucket = MonthlyRollup.objects.filter(owner_id=owner_id, kind=kind.name,
+                                              month=month, label=label, currency=currency)
+        if bucket.update(total=F('total') + total, count=F('count') + count):
+            emptied = emptied or count < 0
+            continue
+        try:
+            with transaction.atomic():
+                MonthlyRollup.objects.create(owner_id=owner_id, kind=kind.name, month=month,
+                                             label=label, currency=currency,
+                                             total=total, count=count)
+        except IntegrityError:
+            # Another request created the bucket first.
+            bucket.update(total=F('total') + total, count=F('count') + count)
+    if emptied:
+        owners = {owner_id for owner_id, _, _, _ in deltas}
+        MonthlyRollup.objects.filter(owner_id__in=owners, kind=kind.name,
+                                     count__lte=0).delete()
+
+
+def rebuild(kind, owner=None, batch_size=1000):
+    """Recompute the rollups of ``kind`` from the transaction table."""
+    rows = kind.model.objects.all()
+    rollups = MonthlyRollup.objects.filter(kind=kind.name)
+    if owner is not None:
+        rows = rows.filter(owner=owner)
+        rollups = rollups.filter(owner=owner)
+    grouped = (rows.order_by()
+               .values('owner_id', kind.label_field, 'currency', month=TruncMonth('date'))
+               .annotate(total=Sum('amount'), count=Count('id')))
+    created = 0
+    with transaction.atomic():
+        rollups.delete()
+        batch = []
+        for row in grouped.iterator():
+            batch.append(MonthlyRollup(owner_id=row['owner_id'], kind=kind.name,
+                                       month=row['month'], label=row[kind.label_field],
+                                       currency=row['currency'],
+                                       total=row['total'], count=row['count']))
+            if len(batch) >= batch_size:
+                MonthlyRollup.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        MonthlyRollup.objects.bulk_create(batch)
+        created += len(batch)
+    return created
+
+
+def _summary_queries(kind, owner, start, end, currency):
+    # Whole months inside the window come from the rollup table; only the
+    # partial months at either edge are aggregated from raw rows. Returns
+    # (rollup buckets or None, raw row summary, whole-month date range).
+    first_full = start if start.day == 1 else next_month(start)
+    last_full = month_start(end + datetime.timedelta(days=1)) - datetime.timedelta(days=1)
+    rows = kind.model.objects.filter(owner=owner)
+    if first_full > last_full:
+        return None, summary_queryset(rows, kind.label_field, start, end, currency), None
+    buckets = (MonthlyRollup.objects
+               .filter(owner=owner, kind=kind.name,
+                       month__gte=first_full, month__lte=month_start(last_full))
+               .values('label', 'currency')
+               .annotate(total=Sum('total'), count=Sum('count')))
+    edges = Q(date__gte=start, date__lt=first_full) | Q(date__gt=last_full, date__lte=end)
+    return (buckets, summary_queryset(rows.filter(edges), kind.label_field, currency=currency),
+            (first_full, last_full))
+
+
+def _foreign_rows(kind, owner, buckets, months, currency):
+    # A month bucket in another currency cannot be converted at one rate, so
+    # re-read those months from the raw rows, grouped by day. Returns the
+    # remaining buckets and the extra query (or None).
+    foreign = {row['currency'] for row in buckets if row['currency'] != currency}
+    if currency is None or not foreign:
+        return buckets, None
+    rows = kind.model.objects.filter(owner=owner, currency__in=foreign)
+    return ([row for row in buckets if row['currency'] == currency],
+            summary_queryset(rows, kind.label_field, *months, currency=currency))
+
+
+def _merge(kind, buckets, edge_rows, currency, table):
+    edges = collect(edge_rows, kind.label_field, currency, table)
+    if buckets is None:
+        return edges
+    result = {}
+    for row in buckets:
+        merged = result.setdefault(row['label'], {'total': 0, 'count': 0})
+        merged['total'] += row['total'].quantize(CENT)
+        merged['count'] += row['count']
+    for label, row in edges.items():
+        merged = result.setdefault(label, {'total': 0, 'count': 0})
+        merged['total'] += row['total']
+        merged['count'] += row['count']
+    for row in result.values():
+        row['average'] = (row['total'] / row['count']).quantize(CENT) if row['count'] else None
+    return result
+
+
+def _named(result, names):
+    return {names.get(label, ''): row for label, row in result.items()}
+
+
+def summarize(kind, owner, start, end, currency=None):
+    """Like :func:`core.aggregation.summarize`, but served from the rollups.
+
+    Rows are grouped by label id and keyed by label name in the result.
+    With ``currency``, totals are converted to it; this costs one more query
+    only when whole months hold rows in other currencies.
+    """
+    buckets, edges, months = _summary_queries(kind, owner, start, end, currency)
+    edges = list(edges)
+    if buckets is not None:
+        buckets, foreign = _foreign_rows(kind, owner, list(buckets), months, currency)
+        if foreign is not None:
+            edges += foreign
+    table = get_table() if needs_table(edges, currency) else None
+    result = _merge(kind, buckets, edges, currency, table)
+    return _named(result, labels.names(kind, result))
+
+
+async def asummarize(kind, owner, start, end, currency=None):
+    buckets, edges, months = _summary_queries(kind, owner, start, end, currency)
+    edges = [row async for row in edges]
+    if buckets is not None:
+        buckets, foreign = _foreign_rows(kind, owner, [row async for row in buckets], months, currency)
+        if foreign is not None:
+            edges += [row async for row in foreign]
+    table = await aget_table() if needs_table(edges, currency) else None
+    result = _merge(kind, buckets, edges, currency, table)
+    return _named(result, await labels.anames(kind, result))
+
+
+def row_count(kind, owner):
+    """Number of ``owner``'s rows of ``kind``, read from the rollups."""
+    return (MonthlyRollup.objects.filter(owner=owner, kind=kind.name)
+            .aggregate(count=Sum('count'))['count'] or 0)
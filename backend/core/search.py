@@ -0,0 +1,115 @@
+import datetime
+import re
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import Q
+
+from . import labels
+
+NUMBER_RE = re.compile(r'^\d+(?:\.\d+)?$')
+DATE_RE = re.compile(r'^(\d{4})(?:-(\d{1,2})(?:-(\d{1,2}))?)?$')
+
+SearchTerms = namedtuple('SearchTerms', ['text', 'amount_range', 'date_range'])
+
+
+def _amount_range(text):
+    text = text.replace(',', '')
+    if not NUMBER_RE.match(text):
+        return None
+    try:
+        low = Decimal(text)
+    except InvalidOperation:
+        return None
+    # "12" matches 12.00-12.99, "12.5" matches 12.50-12.59.
+    return low, low + Decimal(1).scaleb(low.as_tuple().exponent)
+
+
+def _date_range(text):
+    match = DATE_RE.match(text)
+    if not match:
+        return None
+    year, month, day = (int(part) if part else None for part in match.groups())
+    try:
+        if day:
+            start = datetime.date(year, month, day)
+            return start, start
+        if month:
+            start = datetime.date(year, month, 1)
+            end = (start.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+            return start, end - datetime.timedelta(days=1)
+        return datetime.date(year, 1, 1), datetime.date(year, 12, 31)
+    except ValueError:
+        return None
+
+
+def parse_query(text):
+    """Split a search box string into text, amount and date criteria."""
+    text = (text or '').strip()
+    return SearchTerms(text, _amount_range(text), _date_range(text))
+
+
+def build_filter(kind, terms, names):
+    """Match on description, label name, amount or date.
+
+    Label names are matched against ``names`` (``{id: name}``), so the
+    query filters on label ids instead of comparing text per row.
+    """
+    text = terms.text.casefold()
+    matching = [pk for pk, name in names.items() if text in name.casefold()]
+    condition = Q(description__icontains=terms.text) | Q(**{kind.label_field + '__in': matching})
+    if terms.amount_range:
+        low, high = terms.amount_range
+        condition |= Q(amount__gte=low, amount__lt=high)
+    if terms.date_range:
+        start, end = terms.date_range
+        condition |= Q(date__gte=start, date__lte=end)
+    return condition
+
+
+def search_queryset(kind, owner, text, names, page=1, per_page=None):
+    """Return (queryset, per_page) for one page of ``owner``'s matching rows.
+
+    The queryset fetches one extra row so the caller can tell whether more
+    follow without a COUNT; see :func:`search`. Rows are dicts limited to the
+    fields the list tables display, with the label as an id. On PostgreSQL
+    the description lookup is served by the trigram index added in the
+    expenses/income migrations; SQLite falls back to a scan. Returns
+    (None, per_page) for an empty query.
+    """
+    if per_page is None:
+        per_page = settings.SEARCH_PAGE_SIZE
+    per_page = max(1, min(int(per_page), settings.SEARCH_MAX_PAGE_SIZE))
+    page = max(1, int(page))
+    terms = parse_query(text)
+    if not terms.text:
+        return None, per_page
+    offset = (page - 1) * per_page
+    rows = (kind.model.objects
+            .filter(build_filter(kind, terms, names), owner=owner)
+            .order_by('-date', '-id')
+            .values('id', 'amount', 'currency', kind.label_field, 'description', 'date')
+            [offset:offset + per_page + 1])
+    return rows, per_page
+
+
+def _named(kind, rows, names):
+    for row in rows:
+        row[kind.label_field] = names.get(row[kind.label_field], '')
+    return rows
+
+
+def search(kind, owner, text, page=1, per_page=None):
+    """Return one page of matching rows and whether more follow."""
+    names = labels.names(kind)
+    rows, per_page = search_queryset(kind, owner, text, names, page, per_page)
+    rows = [] if rows is None else list(rows)
+    return _named(kind, rows[:per_page], names), len(rows) > per_page
+
+
+async def asearch(kind, owner, text, page=1, per_page=None):
+    names = await labels.anames(kind)
+    rows, per_page = search_queryset(kind, owner, text, names, page, per_page)
+    rows = [] if rows is None else [row async for row in rows]
+    return _named(kind, rows[:per_page], names), len(rows) > per_page
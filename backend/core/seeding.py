@@ -0,0 +1,82 @@
+import datetime
+import random
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+
+from . import labels, typeahead
+from .kinds import EXPENSE, INCOME
+from .rollups import rebuild
+
+# (label, relative frequency, typical amount, spread, fixed day of month).
+# Amounts are log-normal around the typical value; rows with a fixed day
+# recur monthly (rent, salary) instead of falling on random days.
+EXPENSE_PROFILE = [
+    ('Food', 30, 12, 0.6, None),
+    ('Transport', 15, 8, 0.5, None),
+    ('Shopping', 12, 45, 0.9, None),
+    ('Entertainment', 8, 25, 0.7, None),
+    ('Health', 4, 60, 0.8, None),
+    ('Utilities', 3, 90, 0.3, 10),
+    ('Rent', 2, 900, 0.05, 1),
+]
+INCOME_PROFILE = [
+    ('Salary', 10, 3200, 0.05, 25),
+    ('Freelance', 4, 450, 0.7, None),
+    ('Interest', 3, 6, 0.4, 28),
+    ('Gifts', 1, 80, 0.8, None),
+]
+BATCH_SIZE = 2000
+
+
+def _rows(kind, profile, owner, count, days, rng, label_ids):
+    labels = [entry[0] for entry in profile]
+    weights = [entry[1] for entry in profile]
+    by_label = {entry[0]: entry for entry in profile}
+    today = datetime.date.today()
+    for n in range(count):
+        label, _, typical, spread, day = by_label[rng.choices(labels, weights)[0]]
+        date = today - datetime.timedelta(days=rng.randrange(days))
+        if day:
+            date = date.replace(day=min(day, 28))
+            if date > today:
+                date = (date.replace(day=1) - datetime.timedelta(days=1)).replace(day=min(day, 28))
+        amount = Decimal(max(1, round(rng.lognormvariate(0, spread) * typical * 100))).scaleb(-2)
+        yield kind.model(owner=owner, amount=amount, date=date,
+                         description='%s %d' % (label.lower(), n),
+                         **{kind.label_attname: label_ids[label]})
+
+
+def _bulk_insert(model, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            model.objects.bulk_create(batch)
+            batch = []
+    model.objects.bulk_create(batch)
+
+
+def seed(users, expenses, incomes, days=730, prefix='seed', seed=None):
+    """Create ``users`` users with ``expenses``/``incomes`` rows each.
+
+    Rows are bulk inserted in batches and the rollups and typeahead
+    suggestions are rebuilt for each seeded user. Returns the created users.
+    """
+    rng = random.Random(seed)
+    expense_ids = labels.ids(EXPENSE, [entry[0] for entry in EXPENSE_PROFILE], create=True)
+    income_ids = labels.ids(INCOME, [entry[0] for entry in INCOME_PROFILE], create=True)
+    start = User.objects.filter(username__startswith=prefix + '-').count()
+    created = []
+    for n in range(start, start + users):
+        owner = User.objects.create_user(username='%s-%d' % (prefix, n),
+                                         email='%s-%d@example.com' % (prefix, n))
+        _bulk_insert(EXPENSE.model, _rows(EXPENSE, EXPENSE_PROFILE, owner, expenses, days, rng,
+                                          expense_ids))
+        _bulk_insert(INCOME.model, _rows(INCOME, INCOME_PROFILE, owner, incomes, days, rng,
+                                         income_ids))
+        for kind in (EXPENSE, INCOME):
+            rebuild(kind, owner=owner)
+            typeahead.rebuild(kind, owner=owner)
+        created.append(owner)
+    return created
@@ -0,0 +1,136 @@
+import datetime
+
+from django.conf import settings
+from django.db.models import Count, DateField, F, Func, Sum, Window
+from django.db.models.functions import Trunc
+
+from . import labels
+from .money import CENT
+from .rates import aget_table, get_table, needs_table, rate_date
+from .rollups import next_month
+
+INTERVALS = ('day', 'week', 'month', 'year')
+
+
+class WindowSum(Func):
+    # SUM() OVER (...) of a per-group aggregate. Django's Sum refuses to wrap
+    # another aggregate, but a window over the grouped rows is valid SQL.
+    function = 'SUM'
+    window_compatible = True
+
+
+def bucket_start(interval, date):
+    """The first day of the ``interval`` bucket holding ``date``, as Trunc() computes it."""
+    if interval == 'week':
+        return date - datetime.timedelta(days=date.weekday())
+    if interval == 'month':
+        return date.replace(day=1)
+    if interval == 'year':
+        return date.replace(month=1, day=1)
+    return date
+
+
+def periods(interval, start, end):
+    """Every bucket start from ``start`` to ``end``, inclusive."""
+    step = {
+        'day': lambda date: date + datetime.timedelta(days=1),
+        'week': lambda date: date + datetime.timedelta(days=7),
+        'month': next_month,
+        'year': lambda date: date.replace(year=date.year + 1),
+    }[interval]
+    date = bucket_start(interval, start)
+    while date <= end:
+        yield date
+        date = step(date)
+
+
+def series_queryset(kind, owner, interval, start, end, currency=None):
+    """Per-bucket, per-label total and count, with running totals.
+
+    A single GROUP BY query: ``running`` is the label's cumulative total and
+    ``period_total`` the bucket's total across labels, both computed by
+    window functions over the grouped rows. With ``currency``, rows in other
+    currencies are grouped by currency and day as well, for conversion.
+    """
+    label = kind.label_field
+    fields = ['period', label]
+    extra = {}
+    if currency is not None:
+        fields.append('currency')
+        extra['rate_date'] = rate_date(currency)
+    return (kind.model.objects
+            .filter(owner=owner, date__gte=start, date__lte=end)
+            .annotate(period=Trunc('date', interval, output_field=DateField()))
+            .values(*fields, **extra)
+            .annotate(total=Sum('amount'), count=Count('id'))
+            .annotate(running=Window(WindowSum(Sum('amount')), partition_by=[F(label)],
+                                     order_by=F('period').asc()),
+                      period_total=Window(WindowSum(Sum('amount')), partition_by=[F('period')]))
+            .order_by('period', label))
+
+
+def collect(rows, kind, interval, start, end, currency=None, table=None, names=None):
+    """Lay query rows out as aligned lists, one entry per bucket.
+
+    Series are keyed by label id, or by name when ``names`` maps ids to
+    names. Buckets with no rows get a zero total; running totals carry over. When
+    some rows need converting, the window sums (which add up unconverted
+    amounts) are ignored and the running and bucket totals are recomputed
+    from the converted ones.
+    """
+    dates = list(periods(interval, start, end))
+    index = {date: n for n, date in enumerate(dates)}
+    zero = CENT * 0
+    totals = [zero] * len(dates)
+    series = {}
+    for row in rows:
+        n = index[row['period']]
+        label = series.setdefault(row[kind.label_field], {
+            'total': [zero] * len(dates), 'count': [0] * len(dates), 'running': [None] * len(dates)})
+        total = row['total']
+        if table is not None and row['currency'] != currency:
+            total = table.convert(total, row['currency'], currency, row['rate_date'])
+        label['total'][n] += total
+        label['count'][n] += row['count']
+        if table is None:
+            label['running'][n] = row['running']
+            totals[n] = row['period_total']
+    for label in series.values():
+        label['total'] = [value.quantize(CENT) for value in label['total']]
+        running = zero
+        for n, value in enumerate(label['running']):
+            if table is not None:
+                value = running + label['total'][n]
+            running = label['running'][n] = value.quantize(CENT) if value is not None else running
+    if table is not None:
+        totals = [sum(label['total'][n] for label in series.values()) + zero for n in range(len(dates))]
+    totals = [value.quantize(CENT) for value in totals]
+    if names is not None:
+        series = {names.get(label, ''): values for label, values in series.items()}
+    return {'interval': interval, 'start': start, 'end': end, 'currency': currency,
+            'periods': dates, 'totals': totals, 'series': series}
+
+
+def _check(interval, start, end):
+    if interval not in INTERVALS:
+        raise ValueError('interval must be one of %s' % ', '.join(INTERVALS))
+    count = sum(1 for _ in zip(periods(interval, start, end), range(settings.SERIES_MAX_POINTS + 1)))
+    if count > settings.SERIES_MAX_POINTS:
+        raise ValueError('Range spans more than %d %ss; use a longer interval'
+                         % (settings.SERIES_MAX_POINTS, interval))
+
+
+def series(kind, owner, interval, start, end, currency=None):
+    _check(interval, start, end)
+    rows = list(series_queryset(kind, owner, interval, start, end, currency))
+    table = get_table() if needs_table(rows, currency) else None
+    names = labels.names(kind, {row[kind.label_field] for row in rows})
+    return collect(rows, kind, interval, start, end, currency, table, names)
+
+
+async def aseries(kind, owner, interval, start, end, currency=None):
+    _check(interval, start, end)
+    rows = [row async for row in series_queryset(kind, owner, interval, start, end, currency)]
+    table = await aget_table() if needs_table(rows, currency) else None
+    names = await labels.anames(kind, {row[kind.label_field] for row in rows})
+    return collect(rows, kind, interval, start, end, currency, table, names)
@@ -0,0 +1,7 @@
+from django.dispatch import Signal
+
+# Sent after Expense/Income rows are written, inside the writing transaction.
+# ``sender`` is the model class; ``added`` and ``removed`` are iterables of
+# instances describing the rows as they are now and as they were before. An
+# edit sends the new row in ``added`` and a copy of the old one in ``removed``.
+transactions_changed = Signal()
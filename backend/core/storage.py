@@ -0,0 +1,54 @@
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # optional; only gzip variants are written without it
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.map', '.svg', '.json', '.txt', '.html', '.xml', '.ico', '.ttf', '.eot')
+MIN_SIZE = 256
+
+
+def compressors():
+    """``(suffix, compress)`` for each precompressed variant written."""
+    variants = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress))
+    return variants
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage that also writes .gz (and .br) files.
+
+    collectstatic copies each file under a content-hashed name, then writes
+    the compressed variants next to the original and hashed copies of text
+    files, so core.middleware.PrecompressedStaticMiddleware never
+    compresses on request. A variant that is not smaller is skipped.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        variants = compressors()
+        for name in sorted(names):
+            if name.endswith(COMPRESSIBLE) and self.exists(name):
+                self.compress(name, variants)
+
+    def compress(self, name, variants):
+        path = self.path(name)
+        with open(path, 'rb') as source:
+            data = source.read()
+        for suffix, compress in variants:
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+            if len(data) < MIN_SIZE:
+                continue
+            compressed = compress(data)
+            if len(compressed) < len(data):
+                with open(path + suffix, 'wb') as target:
+                    target.write(compressed)
@@ -0,0 +1,802 @@
+import datetime
+import gzip
+import io
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.db.models import ProtectedError
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from expenses.models import Category, Expense
+from income.models import Income
+from userpreferences.models import UserPreference
+from . import aggregation, importers, labels, metrics, rates, recurring, rollups, search, typeahead
+from . import cache as reference_cache
+from .batch import apply_batch
+from .context_processors import reference_data
+from .kinds import EXPENSE, INCOME
+from .ledger import LedgerPaginator
+from .pagination import CursorPaginator, pack
+from .models import Budget, BudgetAlert, ExchangeRate, MonthlyRollup, RecurringTransaction, Suggestion
+from .middleware import PrecompressedStaticMiddleware
+from .money import parse_amount
+from .seeding import seed
+from .storage import CompressedManifestStaticFilesStorage
+
+# Create your tests here.
+class LedgerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Cached category/source ids may belong to another class's rolled back rows.
+        cache.clear()
+        cls.user, = seed(1, 45, 12, prefix='ledger-test', seed=3)
+        seed(1, 20, 20, prefix='ledger-other', seed=4)
+
+    def expected(self):
+        rows = [('expense', row.pk, row.date, -row.amount) for row in Expense.objects.filter(owner=self.user)]
+        rows += [('income', row.pk, row.date, row.amount) for row in Income.objects.filter(owner=self.user)]
+        rows.sort(key=lambda row: (row[2], row[0], row[1]))
+        balance, entries = 0, []
+        for kind, pk, date, amount in rows:
+            balance += amount
+            entries.append((kind, pk, balance))
+        return entries[::-1]
+
+    def test_running_balance_across_pages(self):
+        paginator = LedgerPaginator(self.user, 7)
+        page, forward = paginator.get_page(None), []
+        while True:
+            forward += [(entry.kind, entry.id, entry.balance) for entry in page]
+            if not page.has_next():
+                break
+            page = paginator.get_page(page.next_cursor)
+        self.assertEqual(forward, self.expected())
+
+        page, backward = paginator.get_page(page.last_cursor), []
+        while True:
+            backward = [(entry.kind, entry.id, entry.balance) for entry in page] + backward
+            if not page.has_previous():
+                break
+            page = paginator.get_page(page.previous_cursor)
+        self.assertEqual(backward, forward)
+
+    def test_view(self):
+        cache.clear()
+        labels.names(EXPENSE), labels.names(INCOME)
+        self.client.force_login(self.user)
+        # session, user, data version, currency, opening balance, page, count
+        with self.assertNumQueries(7):
+            response = self.client.get(reverse('ledger'))
+        self.assertEqual(response.context['page_obj'].total, 57)
+        data = self.client.get(reverse('ledger-data')).json()
+        next_page = self.client.get(reverse('ledger-data'), {'cursor': data['next_cursor']}).json()
+        self.assertEqual([(row['kind'], row['id']) for row in data['results'] + next_page['results']],
+                         [(kind, pk) for kind, pk, _ in self.expected()[:40]])
+
+    def test_cursor_balance_follows_older_edits(self):
+        paginator = LedgerPaginator(self.user, 7)
+        cursor = paginator.get_page(None).next_cursor
+        oldest = Expense.objects.filter(owner=self.user).earliest('date', 'id')
+        oldest.amount += 10
+        oldest.save()
+        rollups.rebuild(EXPENSE, self.user)
+        page = paginator.get_page(cursor)
+        self.assertEqual([(entry.kind, entry.id, entry.balance) for entry in page], self.expected()[7:14])
+
+    def test_forged_cursor(self):
+        self.client.force_login(self.user)
+        first = self.client.get(reverse('ledger-data')).json()['results']
+        for payload in (['n', '2024-01-01', 'expense', 1, 'sNaN', '1e999999999'], ['n', 'x', 'expense', 1]):
+            response = self.client.get(reverse('ledger-data'), {'cursor': pack(payload)})
+            self.assertEqual(response.json()['results'], first)
+
+
+class CurrencyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cache.clear()
+        cls.user = User.objects.create_user('currency-test', password='x')
+        ExchangeRate.objects.bulk_create([
+            ExchangeRate(currency='EUR', date=datetime.date(2024, 1, 1), rate=Decimal('1.10')),
+            ExchangeRate(currency='EUR', date=datetime.date(2024, 2, 1), rate=Decimal('1.20')),
+            ExchangeRate(currency='VND', date=datetime.date(2024, 1, 1), rate=Decimal('0.00004')),
+        ])
+        food = labels.label_id(EXPENSE, 'Food', create=True)
+        rows = [('2024-01-10', 'EUR', '10.00'), ('2024-02-10', 'EUR', '10.00'),
+                ('2024-02-15', 'USD', '5.00'), ('2024-02-20', 'VND', '100000.00')]
+        for date, currency, amount in rows:
+            Expense.objects.create(owner=cls.user, date=date, currency=currency,
+                                   amount=Decimal(amount), category_id=food, description='x')
+        rollups.rebuild(EXPENSE, cls.user)
+
+    def setUp(self):
+        rates.clear()
+
+    def test_summary_converts_each_row_at_its_rate(self):
+        start, end = datetime.date(2024, 1, 1), datetime.date(2024, 2, 29)
+        # 11 + 12 + 5 + 4 USD
+        summary = rollups.summarize(EXPENSE, self.user, start, end, 'USD')
+        self.assertEqual(summary['Food']['total'], Decimal('32'))
+        self.assertEqual(summary['Food']['count'], 4)
+        self.assertEqual(summary, rollups.summarize(EXPENSE, self.user, start, datetime.date(2024, 2, 20), 'USD'))
+
+    def test_ledger_balance_in_ledger_currency(self):
+        entries = list(LedgerPaginator(self.user, 10, 'USD').get_page(None))
+        self.assertEqual([entry.value for entry in entries], [-4, -5, -12, -11])
+        self.assertEqual([entry.balance for entry in entries], [-32, -28, -23, -11])
+
+    def test_missing_rate(self):
+        Expense.objects.create(owner=self.user, date='2023-12-31', currency='EUR',
+                               amount=Decimal('1.00'), description='x',
+                               category_id=labels.label_id(EXPENSE, 'Food'))
+        rollups.rebuild(EXPENSE, self.user)
+        with self.assertRaises(rates.MissingRate):
+            rollups.summarize(EXPENSE, self.user, datetime.date(2023, 12, 1), datetime.date(2024, 2, 29), 'USD')
+
+
+class BudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cache.clear()
+        cls.user = User.objects.create_user('budget-test', password='x')
+        cls.labels = labels.ids(EXPENSE, ['Food', 'Rent'], create=True)
+        labels.ids(INCOME, ['Salary'], create=True)
+        cls.budget = Budget.objects.create(owner=cls.user, kind='expense', label=cls.labels['Food'],
+                                           amount=Decimal('100.00'), currency='USD', alert_at=80)
+        Budget.objects.create(owner=cls.user, kind='expense', label=cls.labels['Rent'],
+                              amount=Decimal('500.00'), currency='USD')
+        ExchangeRate.objects.create(currency='EUR', date=datetime.date(2000, 1, 1), rate=Decimal('2'))
+
+    def setUp(self):
+        cache.clear()
+        rates.clear()
+        self.client.force_login(self.user)
+
+    def add(self, amount, currency='USD', category='Food'):
+        self.client.post(reverse('add-expenses'), {
+            'amount': amount, 'currency': currency, 'description': 'x', 'category': category,
+            'expense_date': datetime.date.today().isoformat()}, follow=True)
+
+    def test_alert_raised_once_when_threshold_reached(self):
+        self.add('50.00')
+        self.assertFalse(BudgetAlert.objects.exists())
+        self.add('15.00', 'EUR')
+        self.add('5.00')
+        alert, = BudgetAlert.objects.all()
+        self.assertEqual((alert.budget, alert.spent), (self.budget, Decimal('80.00')))
+
+    def test_budget_data(self):
+        self.add('120.00')
+        self.add('10.00', category='Rent')
+        # session, user, data version, budgets with their rollups
+        with self.assertNumQueries(4):
+            data = self.client.get(reverse('budget-data')).json()
+        self.assertEqual([(row['label'], row['spent'], row['remaining'], row['over'], row['alerted'])
+                          for row in data['budgets']],
+                         [('Food', '120.00', '-20.00', True, True),
+                          ('Rent', '10.00', '490.00', False, False)])
+        self.add('10.00', 'EUR', 'Rent')
+        data = self.client.get(reverse('budget-data')).json()
+        self.assertEqual(data['budgets'][1]['spent'], '30.00')
+        data = self.client.get(reverse('budget-data'), {'month': '2000-01'}).json()
+        self.assertEqual([row['spent'] for row in data['budgets']], ['0.00', '0.00'])
+
+    def test_budgets_page(self):
+        response = self.client.post(reverse('budgets'), {'kind': 'income', 'source': 'Salary',
+                                                         'amount': '1000', 'alert_at': '90'})
+        self.assertRedirects(response, reverse('budgets'))
+        budget = Budget.objects.get(owner=self.user, kind='income', label=labels.label_id(INCOME, 'Salary'))
+        self.assertEqual((budget.amount, budget.alert_at), (Decimal('1000.00'), 90))
+        response = self.client.post(reverse('budgets'), {'kind': 'expense', 'category': 'Food',
+                                                         'amount': '10', 'alert_at': 'x'})
+        self.assertContains(response, 'Alert threshold must be')
+        self.assertContains(self.client.get(reverse('budgets')), 'Salary')
+        self.client.get(reverse('budget-delete', args=[budget.pk]))
+        self.assertFalse(Budget.objects.filter(pk=budget.pk).exists())
+
+    def test_label_in_use_cannot_be_deleted(self):
+        with self.assertRaises(ProtectedError), transaction.atomic():
+            Category.objects.filter(pk=self.labels['Rent']).delete()
+        Budget.objects.filter(label=self.labels['Rent']).delete()
+        Category.objects.filter(pk=self.labels['Rent']).delete()
+        self.assertNotIn('Rent', labels.ids(EXPENSE, ['Rent']))
+
+
+class RecurringTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cache.clear()
+        cls.user = User.objects.create_user('recurring-test', password='x')
+        cls.rent = labels.label_id(EXPENSE, 'Rent', create=True)
+        cls.salary = labels.label_id(INCOME, 'Salary', create=True)
+
+    def rule(self, kind, frequency, start, end=None, interval=1):
+        label = self.rent if kind == 'expense' else self.salary
+        rule = RecurringTransaction(owner=self.user, kind=kind, label=label, amount=Decimal('10.00'),
+                                    description='x', frequency=frequency, interval=interval,
+                                    start_date=start, end_date=end)
+        recurring.schedule(rule)
+        rule.save()
+        return rule
+
+    def test_month_end(self):
+        rule = self.rule('expense', 'month', datetime.date(2024, 1, 31))
+        self.assertEqual([recurring.occurrence(rule, n) for n in range(4)],
+                         [datetime.date(2024, 1, 31), datetime.date(2024, 2, 29),
+                          datetime.date(2024, 3, 31), datetime.date(2024, 4, 30)])
+
+    def test_run_is_idempotent(self):
+        monthly = self.rule('expense', 'month', datetime.date(2024, 1, 15), datetime.date(2024, 6, 1))
+        self.rule('income', 'week', datetime.date(2024, 1, 1), interval=2)
+        self.rule('expense', 'day', datetime.date(2025, 1, 1))
+        today = datetime.date(2024, 3, 31)
+        self.assertEqual(recurring.run_batch(2, today), (2, 3 + 7))
+        self.assertEqual(recurring.run_batch(2, today), (0, 0))
+        self.assertEqual(rollups.row_count(EXPENSE, self.user), 3)
+        self.assertEqual(rollups.row_count(INCOME, self.user), 7)
+        monthly.refresh_from_db()
+        self.assertEqual((monthly.occurrences, monthly.next_date), (3, datetime.date(2024, 4, 15)))
+
+        call_command('run_recurring', date='2024-12-31', stdout=io.StringIO())
+        self.assertEqual(Expense.objects.filter(recurrence=monthly).count(), 5)
+        monthly.refresh_from_db()
+        self.assertIsNone(monthly.next_date)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Expense.objects.create(owner=self.user, amount=1, date=datetime.date(2024, 1, 15),
+                                   category_id=self.rent, description='x', recurrence=monthly)
+
+    def test_view(self):
+        self.client.force_login(self.user)
+        start = datetime.date.today() - datetime.timedelta(days=6)
+        response = self.client.post(reverse('recurring'), {
+            'kind': 'income', 'source': 'Salary', 'amount': '5', 'description': 'pay',
+            'frequency': 'day', 'interval': '3', 'start_date': start.isoformat()})
+        self.assertRedirects(response, reverse('recurring'))
+        self.assertEqual(Income.objects.filter(owner=self.user, source__name='Salary').count(), 3)
+        response = self.client.post(reverse('recurring'), {
+            'kind': 'income', 'source': 'Salary', 'amount': '5', 'description': 'pay',
+            'frequency': 'day', 'interval': '0', 'start_date': start.isoformat()})
+        self.assertContains(response, 'Repeat every must be')
+        response = self.client.post(reverse('recurring'), {
+            'kind': 'income', 'source': 'Salary', 'amount': '5', 'description': 'pay',
+            'frequency': 'day', 'start_date': '1800-01-01'})
+        self.assertContains(response, 'First date must be on or after')
+        self.assertFalse(RecurringTransaction.objects.filter(start_date='1800-01-01').exists())
+
+    @override_settings(RECURRING_MAX_OCCURRENCES=10)
+    def test_catch_up_is_capped_per_batch(self):
+        rule = self.rule('expense', 'day', datetime.date(2024, 1, 1))
+        today = datetime.date(2024, 1, 25)
+        self.assertEqual(recurring.run_batch(today=today), (1, 10))
+        rule.refresh_from_db()
+        self.assertEqual(rule.next_date, datetime.date(2024, 1, 11))
+        call_command('run_recurring', date=today.isoformat(), stdout=io.StringIO())
+        self.assertEqual(Expense.objects.filter(recurrence=rule).count(), 25)
+
+
+class TypeaheadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cache.clear()
+        cls.user = User.objects.create_user('typeahead-test', password='x')
+        labels.ids(EXPENSE, ['Food', 'Transport'], create=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def add(self, description, category='Food'):
+        self.client.post(reverse('add-expenses'), {
+            'amount': '1', 'description': description, 'category': category,
+            'expense_date': datetime.date.today().isoformat()})
+
+    def suggest(self, prefix):
+        return self.client.get(reverse('autocomplete_expenses'), {'q': prefix}).json()['results']
+
+    def test_ranked_by_use(self):
+        self.add('Lunch')
+        self.add('Laundry')
+        self.add('lunch  with team')
+        self.add('Laundry')
+        self.add('laundry', 'Transport')
+        self.assertEqual(self.suggest('LA'), [{'description': 'laundry', 'category': 'Transport'}])
+        self.assertEqual([row['description'] for row in self.suggest('l')],
+                         ['laundry', 'Lunch', 'lunch with team'])
+        self.assertEqual(self.suggest('  '), [])
+
+    def test_follows_edits_and_deletes(self):
+        self.add('Taxi', 'Transport')
+        expense = Expense.objects.get(owner=self.user)
+        self.client.post(reverse('expense-edit', args=[expense.pk]), {
+            'amount': '1', 'description': 'Bus', 'category': 'Transport',
+            'expense_date': expense.date.isoformat()})
+        self.assertEqual(self.suggest('t'), [])
+        self.assertEqual(self.suggest('b'), [{'description': 'Bus', 'category': 'Transport'}])
+        self.client.get(reverse('expense-delete', args=[expense.pk]))
+        self.assertEqual(self.suggest('b'), [])
+        self.assertEqual(Suggestion.objects.count(), 0)
+
+    def test_rebuild(self):
+        self.add('Coffee')
+        self.add('coffee')
+        Suggestion.objects.all().delete()
+        self.assertEqual(typeahead.rebuild(EXPENSE, self.user), 1)
+        suggestion, = Suggestion.objects.all()
+        self.assertEqual((suggestion.value, suggestion.count), ('coffee', 2))
+
+
+class PrecompressedStaticTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        storage = CompressedManifestStaticFilesStorage(location=self.root)
+        storage.save('css/site.css', ContentFile(b'body { color: black; }\n' * 50))
+        list(storage.post_process({'css/site.css': (storage, 'css/site.css')}))
+        self.hashed = storage.hashed_files['css/site.css']
+        self.assertTrue(os.path.exists(os.path.join(self.root, self.hashed + '.gz')))
+
+    def get(self, name, **headers):
+        with self.settings(STATIC_ROOT=self.root, STATIC_URL='/static/'):
+            middleware = PrecompressedStaticMiddleware(lambda request: HttpResponse('view'))
+        middleware.hashed = {self.hashed}
+        return middleware(RequestFactory().get('/static/' + name, headers=headers))
+
+    def test_hashed_file(self):
+        response = self.get(self.hashed, accept_encoding='br, gzip')
+        self.assertEqual(gzip.decompress(response.content), b'body { color: black; }\n' * 50)
+        self.assertEqual((response['Content-Encoding'], response['Vary']), ('gzip', 'Accept-Encoding'))
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Content-Type'], 'text/css')
+
+    def test_unhashed_file(self):
+        response = self.get('css/site.css', accept_encoding='gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        response = self.get('css/site.css', if_modified_since=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_other_requests_pass_through(self):
+        for name in ('css/missing.css', '../outside.css'):
+            self.assertEqual(self.get(name).content, b'view')
+
+
+CSV_FIXTURE = """date,amount,description,category,currency
+2024-01-05,4.50,Coffee,Food,USD
+2024-01-05,4.50,Coffee,Food,USD
+2024-01-06,12,Fish & chips,Food,USD
+2024-01-07,abc,Bad amount,Food,USD
+2024-01-08,3,,Food,USD
+"""
+
+OFX_FIXTURE = """OFXHEADER:100
+DATA:OFXSGML
+
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><CURDEF>USD<BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240110120000<TRNAMT>-2.00<FITID>T1<NAME>Bank fee</STMTTRN>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240110120000<TRNAMT>-2.00<FITID>T2<NAME>Bank fee</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240111<TRNAMT>100.00<FITID>T3<NAME>Salary</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+
+class ImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cache.clear()
+        cls.user = User.objects.create_user('import-test', password='x')
+        labels.ids(EXPENSE, ['Food', 'Imported'], create=True)
+        labels.ids(INCOME, ['Imported'], create=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def load(self, kind, data, name):
+        return importers.import_file(kind, self.user, io.BytesIO(data.encode()), name=name, batch_size=2)
+
+    def test_csv(self):
+        result = self.load(EXPENSE, CSV_FIXTURE, 'expenses.csv')
+        self.assertEqual((result.rows, result.created, result.duplicates, result.invalid), (5, 3, 0, 2))
+        self.assertEqual(result.errors, [(5, 'Amount must be a number'), (6, 'description is required')])
+        self.assertEqual(Expense.objects.filter(owner=self.user, description='Coffee').count(), 2)
+        self.assertEqual(rollups.row_count(EXPENSE, self.user), 3)
+
+        result = self.load(EXPENSE, CSV_FIXTURE, 'expenses.csv')
+        self.assertEqual((result.created, result.duplicates), (0, 3))
+        self.assertEqual(Expense.objects.filter(owner=self.user).count(), 3)
+
+    def test_ofx(self):
+        result = self.load(EXPENSE, OFX_FIXTURE, 'statement.ofx')
+        self.assertEqual((result.rows, result.created, result.skipped), (3, 2, 1))
+        self.assertEqual(set(Expense.objects.filter(owner=self.user).values_list('description', 'currency')),
+                         {('Bank fee', 'USD')})
+        self.assertEqual(self.load(INCOME, OFX_FIXTURE, 'statement.ofx').created, 1)
+
+        result = self.load(EXPENSE, OFX_FIXTURE, 'statement.ofx')
+        self.assertEqual((result.created, result.duplicates), (0, 2))
+
+    def test_huge_amount_is_a_row_error(self):
+        data = CSV_FIXTURE.replace('abc', '1e30')
+        result = self.load(EXPENSE, data, 'expenses.csv')
+        self.assertEqual((result.created, result.invalid), (3, 2))
+        self.assertEqual(result.errors[0], (5, 'Amount is too large'))
+
+    def test_unparseable_line_is_a_row_error(self):
+        data = CSV_FIXTURE.replace('Fish & chips', 'x' * 200000)
+        result = self.load(EXPENSE, data, 'expenses.csv')
+        self.assertEqual(result.errors[0], (4, 'field larger than field limit (131072)'))
+        self.assertEqual((result.created, result.invalid), (2, 3))
+
+    def test_repeats_counted_per_date(self):
+        data = CSV_FIXTURE + '2024-01-09,1,Tea,Food,USD\n2024-01-05,4.50,Coffee,Food,USD\n'
+        self.assertEqual(self.load(EXPENSE, data, 'expenses.csv').created, 4)
+        # Same-day rows apart in the file count from one again, so the
+        # third coffee is taken for the first.
+        self.assertEqual(Expense.objects.filter(owner=self.user, description='Coffee').count(), 2)
+        self.assertEqual(self.load(EXPENSE, data, 'expenses.csv').created, 0)
+
+    def test_unknown_label_is_a_row_error(self):
+        data = CSV_FIXTURE.replace('Fish & chips,Food', 'Fish & chips,Takeaway')
+        result = self.load(EXPENSE, data, 'expenses.csv')
+        self.assertEqual(result.errors[0], (4, 'Unknown category Takeaway'))
+        result, = apply_batch(EXPENSE, self.user, [{'op': 'create', 'amount': '1', 'date': '2024-01-01',
+                                                    'description': 'x', 'category': 'Takeaway'}])
+        self.assertEqual(result['error'], 'Unknown category Takeaway')
+        self.assertFalse(Category.objects.filter(name='Takeaway').exists())
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cache.clear()
+        cls.user = User.objects.create_user('export-test', password='x')
+        food, = labels.ids(EXPENSE, ['Food'], create=True).values()
+        for day, description in ((2, 'Fish & chips'), (1, 'Coffee')):
+            Expense.objects.create(owner=cls.user, amount=Decimal('4.50'), description=description,
+                                   date=datetime.date(2024, 1, day), category_id=food, currency='USD')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def export(self, **params):
+        response = self.client.get(reverse('export-expenses'), params)
+        return b''.join(response.streaming_content)
+
+    def test_csv(self):
+        self.assertEqual(self.export().decode().splitlines(), [
+            'Date,Category,Description,Amount,Currency',
+            '2024-01-01,Food,Coffee,4.50,USD',
+            '2024-01-02,Food,Fish & chips,4.50,USD',
+        ])
+
+    def test_xlsx(self):
+        with zipfile.ZipFile(io.BytesIO(self.export(format='xlsx'))) as archive:
+            self.assertIsNone(archive.testzip())
+            sheet = archive.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row>'), 3)
+        self.assertIn('<c t="inlineStr"><is><t>Fish &amp; chips</t></is></c><c><v>4.50</v></c>', sheet)
+        self.assertIn('<c t="inlineStr"><is><t>2024-01-01</t></is></c>', sheet)
+
+    @override_settings(EXPORT_CHUNK_SIZE=1)
+    def test_filters(self):
+        Expense.objects.create(owner=self.user, amount=Decimal('1.00'), description='Bus',
+                               date=datetime.date(2024, 1, 2), currency='USD',
+                               category_id=labels.label_id(EXPENSE, 'Travel', create=True))
+        self.assertEqual(len(self.export().splitlines()), 4)
+        self.assertEqual(self.export(start='2024-01-02').decode().splitlines()[1:], [
+            '2024-01-02,Food,Fish & chips,4.50,USD',
+            '2024-01-02,Travel,Bus,1.00,USD',
+        ])
+        self.assertEqual(self.export(category='Travel').decode().splitlines()[1:],
+                         ['2024-01-02,Travel,Bus,1.00,USD'])
+        self.assertEqual(self.client.get(reverse('export-expenses'), {'format': 'pdf'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('export-expenses'), {'end': 'x'}).status_code, 400)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+
+    def test_finished_threads_are_folded(self):
+        threads = [threading.Thread(target=metrics.record, args=('ledger', 200, 0.01, 3, 0.001, 100))
+                   for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        metrics.record('ledger', 404, 0.2, 1, 0.0, 10)
+        stats = metrics.snapshot()['ledger']
+        self.assertEqual(stats.statuses, {200: 20, 404: 1})
+        self.assertEqual((stats.query_sum, stats.response_bytes), (61, 2010))
+        self.assertTrue(all(thread.is_alive() for thread in metrics._registry))
+
+    def test_endpoint(self):
+        user = User.objects.create_user('metrics-test', password='x', is_staff=True)
+        self.client.force_login(user)
+        self.client.get(reverse('ledger'))
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('finance_requests_total{view="ledger",status="200"} 1', body)
+        self.assertIn('finance_request_db_queries_bucket{view="ledger",le="+Inf"} 1', body)
+
+    def test_endpoint_is_staff_only(self):
+        self.client.force_login(User.objects.create_user('metrics-user', password='x'))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 302)
+
+    @override_settings(METRICS_QUERY_BUDGET=2)
+    def test_query_budget_warning(self):
+        self.client.force_login(User.objects.create_user('metrics-budget', password='x'))
+        with self.assertLogs('core.middleware', 'WARNING') as logs:
+            self.client.get(reverse('ledger'))
+        self.assertIn('GET /ledger (ledger) ran', logs.output[0])
+
+
+class SummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cache.clear()
+        cls.user = User.objects.create_user('summary-test')
+        cls.food = labels.label_id(EXPENSE, 'Food', create=True)
+        cls.rent = labels.label_id(EXPENSE, 'Rent', create=True)
+        for amount, day, category in (('1.10', datetime.date(2024, 1, 5), cls.food),
+                                      ('2.25', datetime.date(2024, 1, 20), cls.food),
+                                      ('500.00', datetime.date(2024, 1, 1), cls.rent),
+                                      ('9.00', datetime.date(2024, 2, 1), cls.food)):
+            Expense.objects.create(owner=cls.user, amount=Decimal(amount), date=day,
+                                   category_id=category, description='x')
+
+    def test_one_grouped_query(self):
+        rows = Expense.objects.filter(owner=self.user)
+        with self.assertNumQueries(1):
+            summary = aggregation.summarize(rows, 'category', datetime.date(2024, 1, 1),
+                                            datetime.date(2024, 1, 31))
+        self.assertEqual(summary, {
+            self.food: {'total': Decimal('3.35'), 'count': 2, 'average': Decimal('1.68')},
+            self.rent: {'total': Decimal('500.00'), 'count': 1, 'average': Decimal('500.00')},
+        })
+
+    def test_date_window(self):
+        self.assertEqual(aggregation.date_window({'days': '7', 'end': '2024-01-31'}),
+                         (datetime.date(2024, 1, 24), datetime.date(2024, 1, 31)))
+        self.assertEqual(aggregation.date_window({'start': '2024-01-01', 'end': '2024-01-31'}),
+                         (datetime.date(2024, 1, 1), datetime.date(2024, 1, 31)))
+        for params in ({'days': '-1'}, {'start': '2024-02-01', 'end': '2024-01-31'}, {'end': '31/01/2024'}):
+            with self.assertRaises(ValueError):
+                aggregation.date_window(params)
+
+
+class RollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cache.clear()
+        cls.user = User.objects.create_user('rollup-test', password='x')
+        cls.food = labels.label_id(EXPENSE, 'Food', create=True)
+        labels.label_id(EXPENSE, 'Rent', create=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def buckets(self):
+        return sorted(MonthlyRollup.objects.filter(owner=self.user, kind=EXPENSE.name)
+                      .values_list('month', 'label', 'currency', 'total', 'count'))
+
+    def assertMatchesRebuild(self):
+        maintained = self.buckets()
+        rollups.rebuild(EXPENSE, self.user)
+        self.assertEqual(maintained, self.buckets())
+
+    def add(self, amount, date, category='Food'):
+        self.client.post(reverse('add-expenses'), {'amount': amount, 'description': 'x',
+                                                   'expense_date': date, 'category': category})
+        return Expense.objects.filter(owner=self.user).latest('id')
+
+    def test_add_edit_delete(self):
+        first = self.add('10.00', '2024-01-05')
+        self.add('2.50', '2024-01-20')
+        self.add('7.25', '2024-02-01', 'Rent')
+        self.assertMatchesRebuild()
+        self.assertEqual(rollups.row_count(EXPENSE, self.user), 3)
+
+        # Moves the row to another month and category.
+        self.client.post(reverse('expense-edit', args=[first.pk]), {
+            'amount': '4.00', 'description': 'x', 'expense_date': '2024-03-10', 'category': 'Rent'})
+        first.refresh_from_db()
+        self.assertEqual(first.date, datetime.date(2024, 3, 10))
+        self.assertMatchesRebuild()
+
+        self.client.post(reverse('expense-delete', args=[first.pk]))
+        self.assertMatchesRebuild()
+        self.assertFalse(MonthlyRollup.objects.filter(owner=self.user, month=datetime.date(2024, 3, 1)).exists())
+
+    def test_summary_matches_raw_rows(self):
+        for amount, date in (('1.00', '2024-01-03'), ('2.00', '2024-01-31'), ('4.00', '2024-02-14'),
+                             ('8.00', '2024-03-01'), ('16.00', '2024-03-20')):
+            self.add(amount, date)
+        start, end = datetime.date(2024, 1, 15), datetime.date(2024, 3, 10)
+        raw = aggregation.summarize(Expense.objects.filter(owner=self.user), 'category', start, end)
+        self.assertEqual(rollups.summarize(EXPENSE, self.user, start, end), {'Food': raw[self.food]})
+
+    def test_rebuild_command(self):
+        self.add('10.00', '2024-01-05')
+        MonthlyRollup.objects.filter(owner=self.user).delete()
+        out = io.StringIO()
+        call_command('rebuild_rollups', user=self.user.username, kind=EXPENSE.name, stdout=out)
+        self.assertEqual(out.getvalue(), 'expense: 1 rollup rows\n')
+        self.assertEqual(rollups.row_count(EXPENSE, self.user), 1)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cache.clear()
+        cls.user = User.objects.create_user('search-test')
+        food = labels.label_id(EXPENSE, 'Food', create=True)
+        travel = labels.label_id(EXPENSE, 'Travel', create=True)
+        for amount, date, category, description in (
+                ('12.00', datetime.date(2024, 3, 9), food, 'lunch'),
+                ('12.99', datetime.date(2024, 3, 10), travel, 'taxi'),
+                ('13.00', datetime.date(2024, 4, 1), travel, 'Train to Hanoi'),
+                ('1.50', datetime.date(2023, 12, 31), food, 'coffee')):
+            Expense.objects.create(owner=cls.user, amount=Decimal(amount), date=date,
+                                   category_id=category, description=description)
+        other = User.objects.create_user('search-other')
+        Expense.objects.create(owner=other, amount=Decimal('12.00'), date=datetime.date(2024, 3, 9),
+                               category_id=food, description='lunch')
+
+    def setUp(self):
+        cache.clear()
+
+    def descriptions(self, text):
+        results, _ = search.search(EXPENSE, self.user, text)
+        return [row['description'] for row in results]
+
+    def test_parse_query(self):
+        self.assertEqual(search.parse_query(' 12.5 ').amount_range, (Decimal('12.5'), Decimal('12.6')))
+        self.assertEqual(search.parse_query('1,200').amount_range, (Decimal('1200'), Decimal('1201')))
+        self.assertEqual(search.parse_query('2024-02').date_range,
+                         (datetime.date(2024, 2, 1), datetime.date(2024, 2, 29)))
+        self.assertIsNone(search.parse_query('2024-13').date_range)
+        self.assertEqual(search.parse_query('food'), ('food', None, None))
+
+    def test_matches(self):
+        self.assertEqual(self.descriptions('hanoi'), ['Train to Hanoi'])
+        self.assertEqual(self.descriptions('food'), ['lunch', 'coffee'])
+        self.assertEqual(self.descriptions('12'), ['taxi', 'lunch'])
+        self.assertEqual(self.descriptions('2024-03'), ['taxi', 'lunch'])
+        self.assertEqual(self.descriptions('  '), [])
+
+    def test_pages(self):
+        results, has_next = search.search(EXPENSE, self.user, 'o', per_page=2)
+        self.assertEqual(([row['description'] for row in results], has_next),
+                         (['Train to Hanoi', 'lunch'], True))
+        self.assertEqual(results[0]['category'], 'Travel')
+        results, has_next = search.search(EXPENSE, self.user, 'o', page=2, per_page=2)
+        self.assertEqual(([row['description'] for row in results], has_next), (['coffee'], False))
+
+
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cache.clear()
+        cls.user = User.objects.create_user('pagination-test')
+        food = labels.label_id(EXPENSE, 'Food', create=True)
+        # Several rows per day, so pages split inside a run of equal dates.
+        Expense.objects.bulk_create(
+            Expense(owner=cls.user, amount=Decimal(n), date=datetime.date(2024, 1, 1 + n // 3),
+                    category_id=food, description='row %d' % n)
+            for n in range(13))
+
+    def setUp(self):
+        self.paginator = CursorPaginator(Expense.objects.filter(owner=self.user), 4)
+
+    def test_walk_forward_and_back(self):
+        expected = list(Expense.objects.filter(owner=self.user).order_by('-date', '-id')
+                        .values_list('pk', flat=True))
+        page, forward = self.paginator.get_page(None), []
+        self.assertFalse(page.has_previous())
+        while True:
+            forward.append([row.pk for row in page])
+            if not page.has_next():
+                break
+            page = self.paginator.get_page(page.next_cursor)
+        self.assertEqual([len(pks) for pks in forward], [4, 4, 4, 1])
+        self.assertEqual(sum(forward, []), expected)
+
+        backward = []
+        while page.has_previous():
+            page = self.paginator.get_page(page.previous_cursor)
+            backward.insert(0, [row.pk for row in page])
+        self.assertEqual(backward, forward[:-1])
+
+    def test_last_page(self):
+        page = self.paginator.get_page(self.paginator.get_page(None).last_cursor)
+        self.assertEqual([row.description for row in page], ['row 3', 'row 2', 'row 1', 'row 0'])
+        self.assertEqual((page.has_previous(), page.has_next()), (True, False))
+
+    def test_garbled_cursor_gives_first_page(self):
+        first = [row.pk for row in self.paginator.get_page(None)]
+        for token in ('garbage', pack(['n', 'x', 1]), pack(['q', '2024-01-01', 1])):
+            self.assertEqual([row.pk for row in self.paginator.get_page(token)], first)
+
+
+class QueryPlanTests(TestCase):
+    def test_check_query_plans(self):
+        # Fails with CommandError if a list, search or summary query scans
+        # a table or sorts instead of using the owner/date indexes.
+        cache.clear()
+        # The labels it seeds are rolled back but stay in the label cache.
+        self.addCleanup(cache.clear)
+        out = io.StringIO()
+        call_command('check_query_plans', rows=200, stdout=out)
+        self.assertIn('expense list next page', out.getvalue())
+        self.assertNotIn('FAIL', out.getvalue())
+        self.assertFalse(User.objects.filter(username__startswith='query-plan-check').exists())
+
+
+class ReferenceCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reference-test')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_currency_cached_until_preference_saved(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(reference_cache.get_currency(self.user), reference_cache.DEFAULT_CURRENCY)
+        with self.assertNumQueries(0):
+            reference_cache.get_currency(self.user)
+        UserPreference.objects.create(user=self.user, currency='USD - United States Dollar')
+        self.assertEqual(reference_cache.get_currency(self.user), 'USD - United States Dollar')
+
+    def test_lists_cached(self):
+        labels.label_id(EXPENSE, 'Food', create=True)
+        reference_cache.get_categories(), reference_cache.get_sources(), reference_cache.get_currencies()
+        with self.assertNumQueries(0):
+            self.assertIn('Food', [category.name for category in reference_cache.get_categories()])
+            reference_cache.get_sources()
+            self.assertTrue(reference_cache.get_currencies())
+
+    def test_context_processor_is_lazy(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        with self.assertNumQueries(0):
+            context = reference_data(request)
+        with self.assertNumQueries(1):
+            self.assertEqual(str(context['currency']), reference_cache.DEFAULT_CURRENCY)
+
+
+class MoneyTests(TestCase):
+    def test_parse_amount(self):
+        for value, expected in (('1,234.5', '1234.50'), (' 0.005 ', '0.01'), (0.1, '0.10'),
+                                (3, '3.00'), ('999999999999.99', '999999999999.99')):
+            self.assertEqual(parse_amount(value), Decimal(expected))
+        for value, message in (('abc', 'Amount must be a number'), ('NaN', 'Amount must be a number'),
+                               ('Infinity', 'Amount must be a number'),
+                               ('1000000000000', 'Amount is too large')):
+            with self.assertRaisesMessage(ValueError, message):
+                parse_amount(value)
+
+    def test_sums_are_exact(self):
+        cache.clear()
+        user = User.objects.create_user('money-test')
+        food = labels.label_id(EXPENSE, 'Food', create=True)
+        Expense.objects.bulk_create(Expense(owner=user, amount=parse_amount('0.10'), category_id=food,
+                                            date=datetime.date(2024, 1, 1), description='x')
+                                    for _ in range(10))
+        Expense.objects.create(owner=user, amount=parse_amount('0.20'), category_id=food,
+                               date=datetime.date(2024, 1, 2), description='x')
+        summary = aggregation.summarize(Expense.objects.filter(owner=user), 'category')
+        self.assertEqual(summary[food]['total'], Decimal('1.20'))
+        self.assertEqual(str(summary[food]['total']), '1.20')
@@ -0,0 +1,127 @@
+import re
+
+from django.conf import settings
+from django.db import transaction
+
+from . import labels
+from .models import Suggestion
+
+SPACES_RE = re.compile(r'\s+')
+MAX_LENGTH = Suggestion._meta.get_field('value').max_length
+
+
+def normalize(description):
+    """``description`` with whitespace runs collapsed, as stored in a Suggestion."""
+    return SPACES_RE.sub(' ', description or '').strip()[:MAX_LENGTH]
+
+
+def apply_changes(kind, added=(), removed=()):
+    """Fold written rows into the owners' suggestions.
+
+    Must run inside the transaction that wrote the rows. Costs nothing when
+    no description was added or removed (an edit that keeps the
+    description), otherwise one locking SELECT of the touched suggestions
+    and one bulk UPDATE, INSERT and DELETE as needed.
+    """
+    deltas = {}
+    for sign, rows in ((1, added), (-1, removed)):
+        for obj in rows:
+            value = normalize(obj.description)
+            if not value:
+                continue
+            delta = deltas.setdefault((obj.owner_id, value.lower()), [0, None, None])
+            delta[0] += sign
+            if sign > 0:
+                # The latest row sets the spelling and category/source offered.
+                delta[1], delta[2] = value, getattr(obj, kind.label_attname)
+    deltas = {key: delta for key, delta in deltas.items() if delta[0]}
+    if not deltas:
+        return
+    existing = {(suggestion.owner_id, suggestion.value_lower): suggestion
+                for suggestion in Suggestion.objects.select_for_update().filter(
+                    kind=kind.name, owner_id__in={owner_id for owner_id, _ in deltas},
+                    value_lower__in={value_lower for _, value_lower in deltas})}
+    changed, created = [], []
+    for (owner_id, value_lower), (count, value, label) in deltas.items():
+        suggestion = existing.get((owner_id, value_lower))
+        if suggestion is None:
+            if count > 0:
+                created.append(Suggestion(owner_id=owner_id, kind=kind.name, value=value,
+                                          value_lower=value_lower, label=label, count=count))
+            continue
+        suggestion.count += count
+        if value is not None:
+            suggestion.value, suggestion.label = value, label
+        changed.append(suggestion)
+    emptied = [suggestion.pk for suggestion in changed if suggestion.count <= 0]
+    if emptied:
+        Suggestion.objects.filter(pk__in=emptied).delete()
+    changed = [suggestion for suggestion in changed if suggestion.count > 0]
+    if changed:
+        Suggestion.objects.bulk_update(changed, ['count', 'value', 'label'])
+    if created:
+        # A concurrent transaction inserting the same description wins; its
+        # count is one short, which only nudges the ranking.
+        Suggestion.objects.bulk_create(created, ignore_conflicts=True)
+
+
+def rebuild(kind, owner=None, batch_size=1000):
+    """Recompute the suggestions of ``kind`` from the transaction table."""
+    rows = kind.model.objects.all()
+    suggestions = Suggestion.objects.filter(kind=kind.name)
+    if owner is not None:
+        rows = rows.filter(owner=owner)
+        suggestions = suggestions.filter(owner=owner)
+    counted = {}
+    for owner_id, description, label in (rows.order_by('date', 'id')
+                                         .values_list('owner_id', 'description', kind.label_attname)
+                                         .iterator()):
+        value = normalize(description)
+        if value:
+            entry = counted.setdefault((owner_id, value.lower()), [0, None, None])
+            entry[0] += 1
+            entry[1], entry[2] = value, label
+    with transaction.atomic():
+        suggestions.delete()
+        Suggestion.objects.bulk_create(
+            (Suggestion(owner_id=owner_id, kind=kind.name, value=value, value_lower=value_lower,
+                        label=label, count=count)
+             for (owner_id, value_lower), (count, value, label) in counted.items()),
+            batch_size=batch_size)
+    return len(counted)
+
+
+def suggestion_queryset(kind, owner, prefix, limit=None):
+    """``owner``'s most used descriptions starting with ``prefix``, ignoring case.
+
+    A range scan of the (owner, kind, value_lower) index, whose length
+    depends on the prefix and not on the number of rows; the matches are
+    then ranked by use. Returns None for an empty prefix.
+    """
+    if limit is None:
+        limit = settings.TYPEAHEAD_LIMIT
+    limit = max(1, min(int(limit), settings.TYPEAHEAD_MAX_LIMIT))
+    prefix = SPACES_RE.sub(' ', prefix or '').lstrip().lower()[:MAX_LENGTH]
+    if not prefix:
+        return None
+    return (Suggestion.objects
+            .filter(owner=owner, kind=kind.name, value_lower__startswith=prefix)
+            .order_by('-count', 'value_lower')
+            .values_list('value', 'label')[:limit])
+
+
+def _named(kind, rows, names):
+    return [{'description': value, kind.label_field: names.get(label, '')} for value, label in rows]
+
+
+def suggest(kind, owner, prefix, limit=None):
+    """Suggestions for the add/edit forms: description and its category/source."""
+    rows = suggestion_queryset(kind, owner, prefix, limit)
+    rows = [] if rows is None else list(rows)
+    return _named(kind, rows, labels.names(kind, {label for _, label in rows}))
+
+
+async def asuggest(kind, owner, prefix, limit=None):
+    rows = suggestion_queryset(kind, owner, prefix, limit)
+    rows = [] if rows is None else [row async for row in rows]
+    return _named(kind, rows, await labels.anames(kind, {label for _, label in rows}))
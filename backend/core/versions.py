@@ -0,0 +1,102 @@
+import datetime
+import functools
+from inspect import iscoroutinefunction
+
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .models import DataVersion
+
+
+def bump(owner_ids):
+    """Advance the data version of each owner. Run inside the writing transaction."""
+    now = timezone.now()
+    for owner_id in owner_ids:
+        version = DataVersion.objects.filter(owner_id=owner_id)
+        if version.update(version=F('version') + 1, updated_at=now):
+            continue
+        try:
+            with transaction.atomic():
+                DataVersion.objects.create(owner_id=owner_id, version=1, updated_at=now)
+        except IntegrityError:
+            # Another request created the row first.
+            version.update(version=F('version') + 1, updated_at=now)
+
+
+def bump_all():
+    """Advance every user's data version, for changes to shared data such as
+    category names or exchange rates."""
+    DataVersion.objects.update(version=F('version') + 1, updated_at=timezone.now())
+
+
+def get(user):
+    """Return ``(version, updated_at)``; ``(0, None)`` before the first write."""
+    row = DataVersion.objects.filter(owner=user).values_list('version', 'updated_at').first()
+    return row or (0, None)
+
+
+async def aget(user):
+    row = await DataVersion.objects.filter(owner=user).values_list('version', 'updated_at').afirst()
+    return row or (0, None)
+
+
+def _validators(user, version, updated_at):
+    # Responses also depend on today's date (default summary window), so the
+    # validators change at midnight even without writes.
+    today = datetime.date.today()
+    midnight = timezone.make_aware(datetime.datetime.combine(today, datetime.time()))
+    etag = '"%d-%d-%s"' % (user.pk, version, today.isoformat())
+    last_modified = max(updated_at, midnight) if updated_at else midnight
+    return etag, int(last_modified.timestamp())
+
+
+def _respond(response, etag, last_modified):
+    response.headers.setdefault('ETag', etag)
+    response.headers.setdefault('Last-Modified', http_date(last_modified))
+    # Let browsers keep the response but check back every time.
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def conditional(view):
+    """Answer GET/HEAD with 304 when the user's data version is unchanged.
+
+    Works for sync and async views. Other methods, anonymous requests and
+    responses that would carry flash messages are always rendered. The
+    version read is left on ``request.data_version`` for fragment cache keys.
+    """
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def inner(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return await view(request, *args, **kwargs)
+            user = await request.auser()
+            has_messages = await sync_to_async(lambda: bool(messages.get_messages(request)))()
+            if not user.is_authenticated or has_messages:
+                return await view(request, *args, **kwargs)
+            version, updated_at = await aget(user)
+            request.data_version = version
+            etag, last_modified = _validators(user, version, updated_at)
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            return _respond(response, etag, last_modified)
+    else:
+        @functools.wraps(view)
+        def inner(request, *args, **kwargs):
+            if (request.method not in ('GET', 'HEAD') or not request.user.is_authenticated
+                    or messages.get_messages(request)):
+                return view(request, *args, **kwargs)
+            version, updated_at = get(request.user)
+            request.data_version = version
+            etag, last_modified = _validators(request.user, version, updated_at)
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            return _respond(response, etag, last_modified)
+    return inner
@@ -0,0 +1,207 @@
+import datetime
+
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import redirect, render
+
+from . import budgets as budget_status
+from . import metrics as request_metrics
+from . import versions
+from .kinds import kind_named
+from .labels import label_id, set_label_names
+from .ledger import LedgerPaginator
+from .models import Budget, BudgetAlert, MonthlyRollup, RecurringTransaction
+from .money import parse_amount
+from .rates import preferred_currency
+from .recurring import materialize, schedule
+from .versions import conditional
+
+# Create your views here.
+@staff_member_required
+def metrics(request):
+    return HttpResponse(request_metrics.render(),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@login_required(login_url='/authentication/login')
+@conditional
+def ledger(request):
+    paginator = LedgerPaginator(request.user, settings.LEDGER_PAGE_SIZE,
+                                preferred_currency(request.user))
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    return render(request, 'core/ledger.html', {'page_obj': page_obj})
+
+@login_required(login_url='/authentication/login')
+@conditional
+def ledger_data(request):
+    paginator = LedgerPaginator(request.user, settings.LEDGER_PAGE_SIZE,
+                                preferred_currency(request.user))
+    page = paginator.get_page(request.GET.get('cursor'))
+    return JsonResponse({'results': [entry._asdict() for entry in page],
+                         'has_previous': page.has_previous(), 'has_next': page.has_next(),
+                         'previous_cursor': page.previous_cursor, 'next_cursor': page.next_cursor,
+                         'last_cursor': page.last_cursor})
+
+@login_required(login_url='/authentication/login')
+@conditional
+def budgets(request):
+    def page():
+        alerts = list(BudgetAlert.objects.filter(budget__owner=request.user)
+                      .select_related('budget').order_by('-created_at')[:10])
+        set_label_names([alert.budget for alert in alerts])
+        context = {
+            'budgets': budget_status.status(request.user),
+            'alerts': alerts,
+            'values': request.POST,
+        }
+        return render(request, 'core/budgets.html', context)
+
+    if request.method == 'GET':
+        return page()
+
+    if request.method == 'POST':
+        kind = request.POST.get('kind')
+        label = request.POST.get('source' if kind == MonthlyRollup.INCOME else 'category')
+        amount = request.POST.get('amount')
+
+        if kind not in (MonthlyRollup.EXPENSE, MonthlyRollup.INCOME):
+            messages.error(request, 'Type is required')
+            return page()
+
+        try:
+            label = label_id(kind_named(kind), label)
+        except ValueError as e:
+            messages.error(request, str(e))
+            return page()
+
+        if not amount:
+            messages.error(request, 'Amount is required')
+            return page()
+        try:
+            amount = parse_amount(amount)
+        except ValueError as e:
+            messages.error(request, str(e))
+            return page()
+        alert_at = request.POST.get('alert_at') or '100'
+        if not alert_at.isdigit() or not 0 < int(alert_at) <= 1000:
+            messages.error(request, 'Alert threshold must be between 1 and 1000 percent')
+            return page()
+
+        with transaction.atomic():
+            Budget.objects.update_or_create(
+                owner=request.user, kind=kind, label=label,
+                defaults={'amount': amount, 'alert_at': int(alert_at),
+                          'currency': preferred_currency(request.user)})
+            versions.bump([request.user.pk])
+        messages.success(request, 'Budget saved successfully')
+
+        return redirect('budgets')
+
+@login_required(login_url='/authentication/login')
+def delete_budget(request, id):
+    with transaction.atomic():
+        Budget.objects.filter(owner=request.user, pk=id).delete()
+        versions.bump([request.user.pk])
+    messages.success(request, 'Budget removed')
+    return redirect('budgets')
+
+@login_required(login_url='/authentication/login')
+@conditional
+def budget_data(request):
+    month = request.GET.get('month')
+    try:
+        month = datetime.date.fromisoformat(month + '-01') if month else datetime.date.today()
+    except ValueError:
+        return JsonResponse({'error': 'month must be in YYYY-MM format'}, status=400)
+    rows = budget_status.status(request.user, month)
+    return JsonResponse({'month': month.strftime('%Y-%m'),
+                         'budgets': [budget_status.as_dict(budget) for budget in rows]})
+
+@login_required(login_url='/authentication/login')
+def recurring(request):
+    def page():
+        rules = list(RecurringTransaction.objects.filter(owner=request.user))
+        set_label_names(rules)
+        rules.sort(key=lambda rule: (rule.kind, rule.label_name))
+        context = {
+            'rules': rules,
+            'frequencies': RecurringTransaction.FREQUENCY_CHOICES,
+            'values': request.POST,
+        }
+        return render(request, 'core/recurring.html', context)
+
+    if request.method == 'GET':
+        return page()
+
+    if request.method == 'POST':
+        kind = request.POST.get('kind')
+        label = request.POST.get('source' if kind == MonthlyRollup.INCOME else 'category')
+        amount = request.POST.get('amount')
+        description = request.POST.get('description')
+        frequency = request.POST.get('frequency')
+        interval = request.POST.get('interval') or '1'
+
+        if kind not in (MonthlyRollup.EXPENSE, MonthlyRollup.INCOME):
+            messages.error(request, 'Type is required')
+            return page()
+
+        try:
+            label = label_id(kind_named(kind), label)
+        except ValueError as e:
+            messages.error(request, str(e))
+            return page()
+
+        if not amount:
+            messages.error(request, 'Amount is required')
+            return page()
+        try:
+            amount = parse_amount(amount)
+        except ValueError as e:
+            messages.error(request, str(e))
+            return page()
+
+        if not description:
+            messages.error(request, 'description is required')
+            return page()
+
+        if frequency not in dict(RecurringTransaction.FREQUENCY_CHOICES):
+            messages.error(request, 'Frequency is required')
+            return page()
+
+        if not interval.isdigit() or not 0 < int(interval) <= 1000:
+            messages.error(request, 'Repeat every must be between 1 and 1000')
+            return page()
+        try:
+            start_date = datetime.date.fromisoformat(request.POST.get('start_date', ''))
+            end_date = request.POST.get('end_date')
+            end_date = datetime.date.fromisoformat(end_date) if end_date else None
+        except ValueError:
+            messages.error(request, 'Dates must be in YYYY-MM-DD format')
+            return page()
+        earliest = datetime.date.today() - datetime.timedelta(days=settings.RECURRING_MAX_BACKFILL_DAYS)
+        if start_date < earliest:
+            messages.error(request, 'First date must be on or after %s' % earliest.isoformat())
+            return page()
+
+        rule = RecurringTransaction(owner=request.user, kind=kind, label=label, amount=amount,
+                                    currency=preferred_currency(request.user),
+                                    description=description, frequency=frequency,
+                                    interval=int(interval), start_date=start_date,
+                                    end_date=end_date)
+        schedule(rule)
+        with transaction.atomic():
+            rule.save()
+            created = materialize([rule])
+        messages.success(request, 'Recurring transaction saved, %d added so far' % created)
+
+        return redirect('recurring')
+
+@login_required(login_url='/authentication/login')
+def delete_recurring(request, id):
+    # Rows already added stay; they just lose the link to the rule.
+    RecurringTransaction.objects.filter(owner=request.user, pk=id).delete()
+    messages.success(request, 'Recurring transaction removed')
+    return redirect('recurring')
@@ -1,13 +1,15 @@
 from django.contrib import admin
+
+from core.admin import LabelAdmin
 from .models import Expense, Category
 
 
 class ExpenseAdmin(admin.ModelAdmin):
     list_display = ('amount', 'description', 'owner', 'category', 'date',)
-    search_fields = ('description', 'category', 'date',)
+    search_fields = ('description', 'category__name', 'date',)
 
     list_per_page = 5
 
 # Register your models here.
 admin.site.register(Expense)
-admin.site.register(Category)
\ No newline at end of file
+admin.site.register(Category, LabelAdmin)
\ No newline at end of file
@@ -0,0 +1,67 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+CENT = Decimal('0.01')
+
+
+def float_to_decimal(apps, schema_editor):
+    Model = apps.get_model('expenses', 'expense')
+    batch = []
+    for row in Model.objects.only('id', 'amount').iterator(chunk_size=BATCH_SIZE):
+        # repr() is the shortest string that round-trips, so 0.1 becomes
+        # Decimal('0.1') rather than 0.1000000000000000055...
+        row.amount_decimal = Decimal(repr(row.amount)).quantize(CENT, rounding=ROUND_HALF_UP)
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            Model.objects.bulk_update(batch, ['amount_decimal'])
+            batch = []
+    Model.objects.bulk_update(batch, ['amount_decimal'])
+
+
+def decimal_to_float(apps, schema_editor):
+    Model = apps.get_model('expenses', 'expense')
+    batch = []
+    for row in Model.objects.only('id', 'amount_decimal').iterator(chunk_size=BATCH_SIZE):
+        row.amount = float(row.amount_decimal)
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            Model.objects.bulk_update(batch, ['amount'])
+            batch = []
+    Model.objects.bulk_update(batch, ['amount'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0004_import_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expense',
+            name='amount_decimal',
+            field=models.DecimalField(decimal_places=2, max_digits=14, null=True),
+        ),
+        migrations.AlterField(
+            model_name='expense',
+            name='amount',
+            field=models.FloatField(null=True),
+        ),
+        migrations.RunPython(float_to_decimal, decimal_to_float),
+        migrations.RemoveField(
+            model_name='expense',
+            name='amount',
+        ),
+        migrations.RenameField(
+            model_name='expense',
+            old_name='amount_decimal',
+            new_name='amount',
+        ),
+        migrations.AlterField(
+            model_name='expense',
+            name='amount',
+            field=models.DecimalField(decimal_places=2, max_digits=14),
+        ),
+    ]
@@ -0,0 +1,98 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Substr, Trim
+
+
+def drop_trigram_index(apps, schema_editor):
+    # 0002's index over the text column; labels are now matched by id.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS expenses_expense_category_trgm')
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE INDEX IF NOT EXISTS expenses_expense_category_trgm ON expenses_expense '
+                              'USING gin (UPPER(category) gin_trgm_ops)')
+
+
+def dedupe_categories(apps, schema_editor):
+    # One Category row per distinct name, covering every name the expenses
+    # use. Names are trimmed and cut to the Category.name length first.
+    Category = apps.get_model('expenses', 'Category')
+    Expense = apps.get_model('expenses', 'Expense')
+    Expense.objects.update(category=Trim(Substr('category', 1, 255)))
+    Category.objects.update(name=Trim('name'))
+    duplicates = (Category.objects.values('name').annotate(keep=Min('pk'), n=Count('pk'))
+                  .filter(n__gt=1))
+    for row in duplicates:
+        Category.objects.filter(name=row['name']).exclude(pk=row['keep']).delete()
+    existing = set(Category.objects.values_list('name', flat=True))
+    used = Expense.objects.order_by().values_list('category', flat=True).distinct()
+    Category.objects.bulk_create(Category(name=name) for name in used if name not in existing)
+
+
+def fill_category_ids(apps, schema_editor):
+    Category = apps.get_model('expenses', 'Category')
+    Expense = apps.get_model('expenses', 'Expense')
+    Expense.objects.update(category_ref=Subquery(
+        Category.objects.filter(name=OuterRef('category')).values('pk')[:1]))
+
+
+def fill_category_names(apps, schema_editor):
+    Category = apps.get_model('expenses', 'Category')
+    Expense = apps.get_model('expenses', 'Expense')
+    Expense.objects.update(category=Subquery(
+        Category.objects.filter(pk=OuterRef('category_ref')).values('name')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0007_recurrence'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_trigram_index, create_trigram_index),
+        migrations.RunPython(dedupe_categories, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='expense',
+            name='category_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT,
+                                    related_name='+', to='expenses.category'),
+        ),
+        migrations.RunPython(fill_category_ids, fill_category_names),
+        migrations.RemoveIndex(
+            model_name='expense',
+            name='expense_owner_category_idx',
+        ),
+        # Unapplying re-adds the name column to a table that has rows.
+        migrations.AlterField(
+            model_name='expense',
+            name='category',
+            field=models.CharField(max_length=266, default=''),
+        ),
+        migrations.RemoveField(
+            model_name='expense',
+            name='category',
+        ),
+        migrations.RenameField(
+            model_name='expense',
+            old_name='category_ref',
+            new_name='category',
+        ),
+        migrations.AlterField(
+            model_name='expense',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='expenses.category'),
+        ),
+        migrations.AlterField(
+            model_name='category',
+            name='name',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['owner', 'category', 'date'], name='expense_owner_category_idx'),
+        ),
+    ]
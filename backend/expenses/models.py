@@ -4,21 +4,33 @@ from django.utils.timezone import now
 
 # Create your models here.
 class Expense(models.Model):
-    amount = models.FloatField()
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
     date = models.DateField(default=now)
     description = models.TextField()
     owner = models.ForeignKey(to=User, on_delete=models.CASCADE)
-    category = models.CharField(max_length=266)
+    category = models.ForeignKey(to='Category', on_delete=models.PROTECT)
+    currency = models.CharField(max_length=3, default='VND')  # ISO 4217 code
+    import_hash = models.CharField(max_length=64, blank=True, default='')  # set by bulk imports
+    recurrence = models.ForeignKey(to='core.RecurringTransaction', null=True, blank=True,
+                                   on_delete=models.SET_NULL)  # the rule that generated the row
 
     def __str__(self):
-        return self.category
+        return self.category.name
 
     class Meta:
         ordering: ['-date']
+        indexes = [
+            models.Index(fields=['owner', '-date', '-id'], name='expense_owner_date_idx'),
+            models.Index(fields=['owner', 'category', 'date'], name='expense_owner_category_idx'),
+            models.Index(fields=['owner', 'import_hash'], name='expense_owner_import_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['recurrence', 'date'], name='unique_expense_occurrence'),
+        ]
 
 
 class Category(models.Model):
-    name = models.CharField(max_length=255)
+    name = models.CharField(max_length=255, unique=True)
 
     class Meta:
         verbose_name_plural = 'Categories'
@@ -1,3 +1,204 @@
-from django.test import TestCase
+import json
+from decimal import Decimal
+
+from asgiref.sync import iscoroutinefunction
+from django.core.cache import cache
+from django.db.models import Sum
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core import labels, versions
+from core.batch import apply_batch
+from core.kinds import EXPENSE
+from core.seeding import seed
+from . import views
+from .models import Expense
 
 # Create your tests here.
+class ExpenseQueryCountTests(TestCase):
+    """Query budgets for the expense views; they must not grow with the data."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Cached category/source ids may belong to another class's rolled back rows.
+        cache.clear()
+        cls.user, = seed(1, 60, 0, prefix='expense-test', seed=1)
+        cls.expense = Expense.objects.filter(owner=cls.user).latest('date', 'id')
+        versions.bump([cls.user.pk])
+
+    def setUp(self):
+        cache.clear()
+        # The category/source list is shared by all users, so it is
+        # normally cached already.
+        labels.names(EXPENSE)
+        self.client.force_login(self.user)
+        # Same month and category as an existing row, so the rollup
+        # bucket is updated in place.
+        self.form = {'amount': '12.50', 'description': 'lunch',
+                     'expense_date': self.expense.date.isoformat(), 'category': self.expense.category.name}
+
+    def add_rows(self, count):
+        seed(1, count, 0, prefix='expense-extra', seed=2)
+        Expense.objects.filter(owner__username__startswith='expense-extra').update(owner=self.user)
+
+    def test_index(self):
+        # session, user, data version, currency preference, page, row count
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('expenses'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page_obj']), 5)
+
+    def test_index_next_page(self):
+        first = self.client.get(reverse('expenses')).context['page_obj']
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('expenses'), {'cursor': first.next_cursor})
+        self.assertTrue(response.context['page_obj'].has_previous())
+
+    def test_index_repeat_view(self):
+        self.client.get(reverse('expenses'))
+        # session, user, data version; the table comes from the fragment cache
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('expenses'))
+        self.assertContains(response, 'app-table')
+        self.assertNotContains(response, 'lunch')
+        self.client.post(reverse('add-expenses'), self.form)
+        self.assertContains(self.client.get(reverse('expenses')), 'lunch')
+
+    def test_search(self):
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('search_expenses'), {'searchText': 'food'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['results'])
+        response = self.client.get(reverse('search_expenses'), {'searchText': 'food', 'page': 'x'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('autocomplete_expenses'), {'q': 'fo', 'limit': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_summary(self):
+        # session, user, data version, currency preference, rollups, edges
+        with self.assertNumQueries(6):
+            self.client.get(reverse('expense_category_summary'))
+
+    def test_summary_does_not_grow_with_rows(self):
+        self.add_rows(200)
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('expense_category_summary'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_series(self):
+        self.add_rows(200)
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('expense_category_series'), {'interval': 'week', 'days': 3650})
+        data = response.json()
+        self.assertEqual(len(data['totals']), len(data['periods']))
+        self.assertEqual(sum(map(Decimal, data['totals'])),
+                         Expense.objects.filter(owner=self.user).aggregate(total=Sum('amount'))['total'])
+        self.assertEqual(self.client.get(reverse('expense_category_series'), {'interval': 'hour'}).status_code, 400)
+
+    def test_json_endpoints_require_login(self):
+        for name in ('expense_category_summary', 'expense_category_series', 'search_expenses', 'autocomplete_expenses'):
+            response = Client().get(reverse(name))
+            self.assertRedirects(response, '/authentication/login?next=' + reverse(name),
+                                 fetch_redirect_response=False)
+
+    async def test_async_views(self):
+        for name in ('search_expenses', 'autocomplete_expenses', 'expense_category_summary', 'expense_category_series'):
+            self.assertTrue(iscoroutinefunction(getattr(views, name)), name)
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('search_expenses'), {'searchText': 'food'})
+        self.assertTrue(response.json()['results'])
+        response = await self.async_client.get(reverse('expense_category_summary'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_add(self):
+        # session, user, currency preference, savepoint, insert, rollup
+        # update, suggestion lookup and insert, data version, release
+        with self.assertNumQueries(10):
+            response = self.client.post(reverse('add-expenses'), self.form)
+        self.assertRedirects(response, reverse('expenses'), fetch_redirect_response=False)
+        self.assertTrue(Expense.objects.filter(owner=self.user, description='lunch').exists())
+
+    def test_add_rejects_huge_amount(self):
+        response = self.client.post(reverse('add-expenses'), {**self.form, 'amount': '1e30'})
+        self.assertContains(response, 'Amount is too large')
+        self.assertFalse(Expense.objects.filter(owner=self.user, description='lunch').exists())
+
+    def test_edit(self):
+        # session, user, row, currency preference, savepoint, update, rollup
+        # update, suggestion lookup, delete of the old description's and
+        # insert of the new one's, data version, release
+        with self.assertNumQueries(12):
+            response = self.client.post(reverse('expense-edit', args=[self.expense.pk]), self.form)
+        self.assertRedirects(response, reverse('expenses'), fetch_redirect_response=False)
+        self.expense.refresh_from_db()
+        self.assertEqual(self.expense.description, 'lunch')
+
+    def test_batch(self):
+        other = Expense.objects.create(owner=seed(1, 0, 0, prefix='expense-other')[0], amount='1.00',
+                                       date=self.expense.date, description='not mine', category=self.expense.category)
+        bucket = {'date': self.expense.date.isoformat(), 'category': self.expense.category.name}
+        mine = apply_batch(EXPENSE, self.user, [dict(bucket, op='create', amount='2.00', description='x')])[0]
+        operations = [
+            dict(bucket, op='create', amount='3.20', description='coffee'),
+            dict(bucket, op='create', amount='', description='bad'),
+            {'op': 'update', 'id': self.expense.pk, 'description': 'renamed'},
+            {'op': 'delete', 'id': mine['id']},
+            {'op': 'delete', 'id': other.pk},
+        ]
+        # session, user, savepoint, locking select, insert, update, delete,
+        # rollup update, suggestion lookup, delete and insert, data version,
+        # release
+        with self.assertNumQueries(13):
+            response = self.client.post(reverse('batch-expenses'), json.dumps({'operations': operations}),
+                                        content_type='application/json')
+        results = response.json()['results']
+        self.assertEqual([r['status'] for r in results], ['created', 'error', 'updated', 'deleted', 'error'])
+        self.assertEqual(results[1]['error'], 'Amount is required')
+        self.assertEqual(results[4]['error'], 'Not found')
+        self.assertTrue(Expense.objects.filter(pk=results[0]['id'], owner=self.user).exists())
+        self.assertEqual(Expense.objects.get(pk=self.expense.pk).description, 'renamed')
+        self.assertFalse(Expense.objects.filter(pk=mine['id']).exists())
+        self.assertTrue(Expense.objects.filter(pk=other.pk).exists())
+
+    def test_batch_rejects_non_string_fields(self):
+        bucket = {'date': self.expense.date.isoformat(), 'category': self.expense.category.name}
+        results = apply_batch(EXPENSE, self.user, [
+            dict(bucket, op='create', amount='1.00', description=['a']),
+            dict(bucket, op='create', amount='1.00', description='x', date=20240101),
+            dict(bucket, op='create', amount='1.00', description='x', category={'name': 'Food'}),
+            {'op': 'update', 'id': self.expense.pk, 'description': 5},
+        ])
+        self.assertEqual([r['error'] for r in results], [
+            'description must be a string', 'date must be a string', 'category must be a string',
+            'description must be a string'])
+        self.assertEqual(Expense.objects.get(pk=self.expense.pk).description, self.expense.description)
+
+    def test_not_modified(self):
+        urls = [reverse('expenses'), reverse('expense_category_summary'), reverse('search_expenses') + '?searchText=food']
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        for url, etag in zip(urls, etags):
+            # session, user, data version; the expense table is not read
+            with self.assertNumQueries(3):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+        apply_batch(EXPENSE, self.user, [{'op': 'delete', 'id': self.expense.pk}])
+        for url, etag in zip(urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+
+    def test_label_rename_changes_etag(self):
+        response = self.client.get(reverse('expenses'))
+        category = self.expense.category
+        category.name = 'Renamed category'
+        category.save()
+        response = self.client.get(reverse('expenses'), HTTP_IF_NONE_MATCH=response['ETag'],
+                                   HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertContains(response, 'Renamed category')
+
+    def test_batch_requires_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        response = client.post(reverse('batch-expenses'), json.dumps({'operations': []}),
+                               content_type='application/json')
+        self.assertEqual(response.status_code, 403)
@@ -5,11 +5,18 @@ from . import views
 urlpatterns = [
     path('', views.index, name='expenses'),
     path('add-expense', views.add_expense, name="add-expenses"),
+    path('import-expenses', views.import_expenses, name="import-expenses"),
+    path('batch-expenses', views.batch_expenses, name="batch-expenses"),
     path('edit-expense/<int:id>', views.expense_edit, name="expense-edit"),
     path('expense_delete/<int:id>', views.delete_expense, name="expense-delete"),
     path('search-expenses', csrf_exempt(views.search_expenses),
          name="search_expenses"),
+    path('autocomplete-expenses', views.autocomplete_expenses,
+         name="autocomplete_expenses"),
     path('expense_category_summary', views.expense_category_summary,
          name="expense_category_summary"),
+    path('expense_category_series', views.expense_category_series,
+         name="expense_category_series"),
+    path('export-expenses', views.export_expenses, name="export-expenses"),
     path('stats', views.stats_view, name="statsexpenses"),
 ]
@@ -1,38 +1,47 @@
-import datetime
+import copy
+import functools
 import json
 from django.http import JsonResponse
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
-from .models import Category, Expense
+from .models import Expense
+from django.conf import settings
 from django.contrib import messages
-from django.core.paginator import Paginator
-from userpreferences.models import UserPreference
-from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from core.aggregation import date_window, totals
+from core.batch import apply_batch
+from core.exports import export_response
+from core.importers import import_file
+from core.kinds import EXPENSE
+from core.labels import label_id
+from core.money import parse_amount
+from core.pagination import CursorPaginator
+from core.rates import apreferred_currency, preferred_currency, validate_currency
+from core.rollups import asummarize, row_count
+from core.search import asearch
+from core.series import aseries
+from core.signals import transactions_changed
+from core.typeahead import asuggest
+from core.versions import conditional
 
 # Create your views here.
 @login_required(login_url='/authentication/login')
+@conditional
 def index(request):
-    categories = Category.objects.all()
-    expenses = Expense.objects.filter(owner=request.user).order_by('-date')
-    paginator = Paginator(expenses, 5)
-    page_number = request.GET.get('page')
-    page_obj = Paginator.get_page(paginator, page_number)
-    try:
-        currency = UserPreference.objects.get(user=request.user).currency
-    except ObjectDoesNotExist:
-        currency = '(VND - Vietnamese Dong)'
+    expenses = Expense.objects.filter(owner=request.user).select_related('category')
+    count = None
+    if settings.LIST_SHOW_TOTAL:
+        count = functools.partial(row_count, EXPENSE, request.user)
+    paginator = CursorPaginator(expenses, 5, count=count)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     context = {
-        'expenses': expenses,
         'page_obj': page_obj,
-        'currency': currency
     }
     return render(request, 'expenses/index.html', context)
 
 @login_required(login_url='/authentication/login')
 def add_expense(request):
-    categories = Category.objects.all()
     context = {
-        'categories': categories,
         'values': request.POST
     }
     if request.method == 'GET':
@@ -44,6 +53,17 @@ def add_expense(request):
         if not amount:
             messages.error(request, 'Amount is required')
             return render(request, 'expenses/add_expense.html', context)
+        try:
+            amount = parse_amount(amount)
+        except ValueError as e:
+            messages.error(request, str(e))
+            return render(request, 'expenses/add_expense.html', context)
+        try:
+            currency = validate_currency(request.POST.get('currency')
+                                         or preferred_currency(request.user))
+        except ValueError as e:
+            messages.error(request, str(e))
+            return render(request, 'expenses/add_expense.html', context)
         description = request.POST['description']
         date = request.POST['expense_date']
         category = request.POST['category']
@@ -59,21 +79,64 @@ def add_expense(request):
         if not category:
             messages.error(request, 'Category is required')
             return render(request, 'expenses/add_expense.html', context)
+        try:
+            category = label_id(EXPENSE, category)
+        except ValueError as e:
+            messages.error(request, str(e))
+            return render(request, 'expenses/add_expense.html', context)
 
-        Expense.objects.create(owner=request.user, amount=amount, date=date,
-                               category=category, description=description)
+        with transaction.atomic():
+            expense = Expense.objects.create(owner=request.user, amount=amount, date=date,
+                                             category_id=category, description=description,
+                                             currency=currency)
+            transactions_changed.send(sender=Expense, added=[expense])
         messages.success(request, 'Expense saved successfully')
 
         return redirect('expenses')
    
+@login_required(login_url='/authentication/login')
+def import_expenses(request):
+    if request.method == 'GET':
+        return render(request, 'expenses/import_expenses.html')
+
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        if not upload:
+            messages.error(request, 'File is required')
+            return render(request, 'expenses/import_expenses.html')
+        try:
+            result = import_file(EXPENSE, request.user, upload.file,
+                                 format=request.POST.get('format') or None, name=upload.name)
+        except ValueError as e:
+            messages.error(request, str(e))
+            return render(request, 'expenses/import_expenses.html')
+        for line, message in result.errors:
+            messages.warning(request, 'Line %d: %s' % (line, message))
+        messages.success(request, 'Import finished: %s' % result)
+
+        return redirect('expenses')
+
+@login_required(login_url='/authentication/login')
+def batch_expenses(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+    try:
+        operations = json.loads(request.body)['operations']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected a JSON object with an operations list'}, status=400)
+    try:
+        results = apply_batch(EXPENSE, request.user, operations)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'results': results})
+
 @login_required(login_url='/authentication/login') 
 def expense_edit(request, id):
-    expense = Expense.objects.get(pk=id)
-    categories = Category.objects.all()
+    expense = Expense.objects.select_related('category').get(pk=id)
+    previous = copy.copy(expense)
     context = {
         'expense': expense,
         'values': expense,
-        'categories': categories
     }
     if request.method == 'GET':
         return render(request, 'expenses/edit_expense.html', context)
@@ -83,6 +146,17 @@ def expense_edit(request, id):
         if not amount:
             messages.error(request, 'Amount is required')
             return render(request, 'expenses/edit_expense.html', context)
+        try:
+            amount = parse_amount(amount)
+        except ValueError as e:
+            messages.error(request, str(e))
+            return render(request, 'expenses/edit_expense.html', context)
+        try:
+            currency = validate_currency(request.POST.get('currency')
+                                         or preferred_currency(request.user))
+        except ValueError as e:
+            messages.error(request, str(e))
+            return render(request, 'expenses/edit_expense.html', context)
         description = request.POST['description']
         date = request.POST['expense_date']
         category = request.POST['category']
@@ -90,14 +164,22 @@ def expense_edit(request, id):
         if not description:
             messages.error(request, 'description is required')
             return render(request, 'expenses/edit_expense.html', context)
+        try:
+            category = label_id(EXPENSE, category)
+        except ValueError as e:
+            messages.error(request, str(e))
+            return render(request, 'expenses/edit_expense.html', context)
 
         expense.owner = request.user
         expense.amount = amount
         expense.date = date
-        expense.category = category
+        expense.category_id = category
         expense.description = description
+        expense.currency = currency
 
-        expense.save()
+        with transaction.atomic():
+            expense.save()
+            transactions_changed.send(sender=Expense, added=[expense], removed=[previous])
         messages.success(request, 'Expense updated  successfully')
 
         return redirect('expenses')
@@ -105,45 +187,71 @@ def expense_edit(request, id):
 @login_required(login_url='/authentication/login') 
 def delete_expense(request, id):
     expense = Expense.objects.get(pk=id)
-    expense.delete()
+    with transaction.atomic():
+        expense.delete()
+        transactions_changed.send(sender=Expense, removed=[expense])
     messages.success(request, 'Expense removed')
     return redirect('expenses')
 
-def search_expenses(request):
-    if request.method == 'POST':
-        search_str = json.loads(request.body).get('searchText')
-        expenses = Expense.objects.filter(
-            amount__istartswith=search_str, owner=request.user) | Expense.objects.filter(
-            date__istartswith=search_str, owner=request.user) | Expense.objects.filter(
-            description__icontains=search_str, owner=request.user) | Expense.objects.filter(
-            category__icontains=search_str, owner=request.user)
-        data = expenses.values()
-        return JsonResponse(list(data), safe=False)
-
-def expense_category_summary(request):
-    todays_date = datetime.date.today()
-    six_months_ago = todays_date-datetime.timedelta(days=30*6)
-    expenses = Expense.objects.filter(owner=request.user,
-                                      date__gte=six_months_ago, date__lte=todays_date)
-    finalrep = {}
-
-    def get_category(expense):
-        return expense.category
-    category_list = list(set(map(get_category, expenses)))
-
-    def get_expense_category_amount(category):
-        amount = 0
-        filtered_by_category = expenses.filter(category=category)
-
-        for item in filtered_by_category:
-            amount += item.amount
-        return amount
-
-    for x in expenses:
-        for y in category_list:
-            finalrep[y] = get_expense_category_amount(y)
-
-    return JsonResponse({'expense_category_data': finalrep}, safe=False)
+@login_required(login_url='/authentication/login')
+@conditional
+async def search_expenses(request):
+    if request.method in ('GET', 'POST'):
+        data = request.GET if request.method == 'GET' else json.loads(request.body)
+        try:
+            page = int(data.get('page', 1))
+            limit = data.get('limit')
+            limit = None if limit is None else int(limit)
+        except (TypeError, ValueError):
+            return JsonResponse({'error': 'Invalid page or limit'}, status=400)
+        user = await request.auser()
+        results, has_next = await asearch(EXPENSE, user, data.get('searchText'), page=page, per_page=limit)
+        return JsonResponse({'results': results, 'has_next': has_next})
+
+@login_required(login_url='/authentication/login')
+@conditional
+async def autocomplete_expenses(request):
+    limit = request.GET.get('limit')
+    try:
+        limit = None if limit is None else int(limit)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid limit'}, status=400)
+    user = await request.auser()
+    results = await asuggest(EXPENSE, user, request.GET.get('q'), limit)
+    return JsonResponse({'results': results})
+
+@login_required(login_url='/authentication/login')
+@conditional
+async def expense_category_summary(request):
+    user = await request.auser()
+    currency = await apreferred_currency(user)
+    try:
+        start, end = date_window(request.GET)
+        summary = await asummarize(EXPENSE, user, start, end, currency)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'expense_category_data': totals(summary),
+                         'expense_category_stats': summary,
+                         'start': start, 'end': end, 'currency': currency}, safe=False)
+
+@login_required(login_url='/authentication/login')
+@conditional
+async def expense_category_series(request):
+    try:
+        start, end = date_window(request.GET)
+        user = await request.auser()
+        data = await aseries(EXPENSE, user, request.GET.get('interval', 'month'), start, end,
+                             await apreferred_currency(user))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(data)
+
+@login_required(login_url='/authentication/login')
+def export_expenses(request):
+    try:
+        return export_response(EXPENSE, request.user, request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
 
 def stats_view(request):
     return render(request, 'expenses/statsExpenses.html')
\ No newline at end of file
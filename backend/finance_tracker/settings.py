@@ -45,9 +45,12 @@ INSTALLED_APPS = [
     'expenses',
     'userpreferences',
     'income',
+    'core',
+    'authentication',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -57,6 +60,10 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# MetricsMiddleware logs a warning for any request running more queries than
+# this; None disables the check.
+METRICS_QUERY_BUDGET = 20
+
 ROOT_URLCONF = 'finance_tracker.urls'
 
 TEMPLATES = [
@@ -70,6 +77,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'core.context_processors.reference_data',
+                'core.context_processors.fragment_cache',
             ],
         },
     },
@@ -92,6 +101,28 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# The local-memory cache is per process; point this at Redis or Memcached
+# when running several workers so invalidations reach all of them.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Reference data (currency preference, categories, sources, currency list)
+# is cached under versioned keys and invalidated by model signals.
+REFERENCE_CACHE_VERSION = 1
+REFERENCE_CACHE_TIMEOUT = 60 * 60
+
+# The sidebar and the expense/income tables are cached as template
+# fragments per user; the table keys include the user's data version, so a
+# write, a currency change or a renamed category/source renders them again.
+TEMPLATE_FRAGMENT_TIMEOUT = 60 * 60
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -146,4 +177,79 @@ EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_USE_TLS = True
 DEFAULT_FROM_EMAIL = os.getenv('EMAIL_HOST_USER')
 EMAIL_PORT = 587
-EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
\ No newline at end of file
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
+
+# Outgoing mail is stored in authentication.QueuedEmail and sent by a small
+# pool of worker threads, one SMTP connection per batch. The pool is
+# started by finance_tracker.wsgi/asgi, so only server processes run it. It
+# polls every EMAIL_QUEUE_POLL_INTERVAL seconds, so mail left pending by a
+# restart is sent, and messages claimed longer than
+# EMAIL_QUEUE_CLAIM_TIMEOUT ago are returned to the queue. With
+# EMAIL_QUEUE_WORKERS = 0 nothing is sent in-process; run the
+# send_queued_mail command instead. Failed sends are retried after
+# EMAIL_QUEUE_RETRY_DELAY seconds, doubling each time, up to
+# EMAIL_QUEUE_MAX_ATTEMPTS.
+EMAIL_QUEUE_WORKERS = 2
+EMAIL_QUEUE_MAXSIZE = 1000
+EMAIL_QUEUE_BATCH_SIZE = 50
+EMAIL_QUEUE_POLL_INTERVAL = 30
+EMAIL_QUEUE_RETRY_DELAY = 60
+EMAIL_QUEUE_MAX_ATTEMPTS = 5
+EMAIL_QUEUE_CLAIM_TIMEOUT = 10 * 60
+
+# The username/email validation endpoints check an in-memory Bloom filter
+# of the values in use (authentication.availability) and only query
+# auth_user when it reports a likely match, or when a user was saved since
+# it was loaded. Each process reloads it every
+# AVAILABILITY_FILTER_TIMEOUT seconds, sized for the current users plus
+# AVAILABILITY_FILTER_HEADROOM signups at the given false positive rate.
+AVAILABILITY_FILTER_TIMEOUT = 15 * 60
+AVAILABILITY_FILTER_HEADROOM = 10000
+AVAILABILITY_FILTER_ERROR_RATE = 0.01
+
+# Default look-back window, in days, for the category/source summary charts.
+SUMMARY_WINDOW_DAYS = 180
+
+# Most buckets one cashflow series request may return.
+SERIES_MAX_POINTS = 1000
+
+# Search box results per page, and the largest page a client may ask for.
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+
+# Suggestions returned by the description typeahead of the add/edit forms.
+TYPEAHEAD_LIMIT = 8
+TYPEAHEAD_MAX_LIMIT = 50
+
+# Exchange rates are stored as the value of one unit in this currency, and
+# held in memory per process for this many seconds after loading.
+EXCHANGE_RATE_BASE = 'USD'
+EXCHANGE_RATE_CACHE_TIMEOUT = 3600
+# Default file read by the load_exchange_rates command.
+EXCHANGE_RATES_FILE = os.path.join(BASE_DIR, 'exchange_rates.csv')
+
+# Rows per page of the combined income/expense ledger.
+LEDGER_PAGE_SIZE = 20
+
+# Show the record count (read from the monthly rollups) under the list tables.
+LIST_SHOW_TOTAL = True
+
+# Bulk CSV/OFX imports: rows per bulk_create/transaction, and the category or
+# source given to OFX transactions, which carry none.
+IMPORT_BATCH_SIZE = 500
+IMPORT_DEFAULT_LABEL = 'Imported'
+
+# Largest list of create/update/delete operations accepted by the batch API.
+BATCH_MAX_OPERATIONS = 500
+
+# Recurring transaction rules claimed per transaction by run_recurring.
+RECURRING_BATCH_SIZE = 200
+
+# Occurrences added per rule per call; a rule further behind is caught up by
+# later run_recurring batches. New rules may start at most
+# RECURRING_MAX_BACKFILL_DAYS in the past.
+RECURRING_MAX_OCCURRENCES = 500
+RECURRING_MAX_BACKFILL_DAYS = 366
+
+# Rows fetched per round trip while streaming CSV/XLSX exports.
+EXPORT_CHUNK_SIZE = 2000
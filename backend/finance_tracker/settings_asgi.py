@@ -0,0 +1,19 @@
+"""
+Settings profile for serving finance_tracker over ASGI.
+
+Selected by finance_tracker/asgi.py, e.g.
+
+    uvicorn finance_tracker.asgi:application --workers 4
+
+It is the production profile (finance_tracker.settings_production: DEBUG
+off, hashed and precompressed static files, cached template loader). The
+search, summary and signup validation endpoints are async views, so a
+single worker keeps serving other requests while their queries run.
+
+Leave the database CONN_MAX_AGE at its default of 0 here: async views run
+each ORM call in a thread pool, so a persistent connection would be pinned
+to every pool thread. Let a pooler such as PgBouncer keep server
+connections warm.
+"""
+
+from .settings_production import *  # noqa: F401,F403
@@ -6,44 +6,69 @@ const paginationContainer = document.querySelector(".pagination-container");
 tableOutput.style.display = "none";
 const noResults = document.querySelector(".no-results");
 const tbody = document.querySelector(".table-body");
+const moreResults = document.querySelector(".more-results");
+
+let searchText = "";
+let searchPage = 1;
+
+// The endpoint returns one page of matches at a time; "More results"
+// appends the next page while has_next is true.
+const showResults = (query, page) => {
+  fetch(
+    "/search-expenses?" + new URLSearchParams({ searchText: query, page: page })
+  )
+    .then((res) => res.json())
+    .then((data) => {
+      if (query !== searchText || page !== searchPage) {
+        // A newer search was started while this one was in flight.
+        return;
+      }
+      const results = data.results;
+      appTable.style.display = "none";
+      tableOutput.style.display = "block";
+
+      if (results.length === 0 && page === 1) {
+        noResults.style.display = "block";
+        tableOutput.style.display = "none";
+      } else {
+        noResults.style.display = "none";
+        results.forEach((item) => {
+          tbody.innerHTML += `
+              <tr>
+              <td>${item.amount} ${item.currency}</td>
+              <td>${item.category}</td>
+              <td>${item.description}</td>
+              <td>${item.date}</td>
+              </tr>`;
+        });
+      }
+      moreResults.style.display = data.has_next ? "inline-block" : "none";
+    });
+};
 
 searchField.addEventListener("keyup", (e) => {
   const searchValue = e.target.value;
 
   if (searchValue.trim().length > 0) {
+    if (searchValue === searchText) {
+      return;
+    }
     paginationContainer.style.display = "none";
     tbody.innerHTML = "";
-    fetch("/search-expenses", {
-      body: JSON.stringify({ searchText: searchValue }),
-      method: "POST",
-    })
-      .then((res) => res.json())
-      .then((data) => {
-        console.log("data", data);
-        appTable.style.display = "none";
-        tableOutput.style.display = "block";
-
-        console.log("data.length", data.length);
-
-        if (data.length === 0) {
-          noResults.style.display = "block";
-          tableOutput.style.display = "none";
-        } else {
-          noResults.style.display = "none";
-          data.forEach((item) => {
-            tbody.innerHTML += `
-                <tr>
-                <td>${item.amount}</td>
-                <td>${item.category}</td>
-                <td>${item.description}</td>
-                <td>${item.date}</td>
-                </tr>`;
-          });
-        }
-      });
+    moreResults.style.display = "none";
+    searchText = searchValue;
+    searchPage = 1;
+    showResults(searchText, searchPage);
   } else {
+    searchText = "";
     tableOutput.style.display = "none";
     appTable.style.display = "block";
     paginationContainer.style.display = "block";
   }
-});
\ No newline at end of file
+});
+
+moreResults.addEventListener("click", () => {
+  moreResults.style.display = "none";
+  searchPage += 1;
+  showResults(searchText, searchPage);
+});
@@ -1,29 +1,32 @@
+const COLORS = [
+  "rgba(255, 99, 132, 1)",
+  "rgba(54, 162, 235, 1)",
+  "rgba(255, 206, 86, 1)",
+  "rgba(75, 192, 192, 1)",
+  "rgba(153, 102, 255, 1)",
+  "rgba(255, 159, 64, 1)",
+];
+const startField = document.querySelector("#rangeStart");
+const endField = document.querySelector("#rangeEnd");
+const intervalField = document.querySelector("#rangeInterval");
+let myChart = null;
+let seriesChart = null;
+
 const renderChart = (data, labels) => {
     var ctx = document.getElementById("myChart").getContext("2d");
-    var myChart = new Chart(ctx, {
+    if (myChart) {
+      myChart.destroy();
+    }
+    myChart = new Chart(ctx, {
       type: "doughnut",
       data: {
         labels: labels,
         datasets: [
           {
-            label: "Last 6 months incomes",
+            label: "Income in range",
             data: data,
-            backgroundColor: [
-              "rgba(255, 99, 132, 0.2)",
-              "rgba(54, 162, 235, 0.2)",
-              "rgba(255, 206, 86, 0.2)",
-              "rgba(75, 192, 192, 0.2)",
-              "rgba(153, 102, 255, 0.2)",
-              "rgba(255, 159, 64, 0.2)",
-            ],
-            borderColor: [
-              "rgba(255, 99, 132, 1)",
-              "rgba(54, 162, 235, 1)",
-              "rgba(255, 206, 86, 1)",
-              "rgba(75, 192, 192, 1)",
-              "rgba(153, 102, 255, 1)",
-              "rgba(255, 159, 64, 1)",
-            ],
+            backgroundColor: COLORS.map((color) => color.replace(", 1)", ", 0.2)")),
+            borderColor: COLORS,
             borderWidth: 1,
           },
         ],
@@ -36,21 +39,61 @@ const renderChart = (data, labels) => {
       },
     });
   };
-  
+
+const renderSeries = (results) => {
+    var ctx = document.getElementById("seriesChart").getContext("2d");
+    if (seriesChart) {
+      seriesChart.destroy();
+    }
+    const datasets = Object.entries(results.series).map(([label, series], i) => ({
+      label: label,
+      data: series.total.map(Number),
+      backgroundColor: COLORS[i % COLORS.length].replace(", 1)", ", 0.5)"),
+    }));
+    seriesChart = new Chart(ctx, {
+      type: "bar",
+      data: { labels: results.periods, datasets: datasets },
+      options: {
+        title: {
+          display: true,
+          text: "Income per " + results.interval,
+        },
+        scales: {
+          xAxes: [{ stacked: true }],
+          yAxes: [{ stacked: true }],
+        },
+      },
+    });
+  };
+
   const getChartData = () => {
-    console.log("fetching");
-    fetch("/income/income_source_summary")
+    const range = new URLSearchParams({
+      start: startField.value,
+      end: endField.value,
+    });
+    fetch("/income/income_source_summary?" + range)
       .then((res) => res.json())
       .then((results) => {
-        console.log("results", results);
         const source_data = results.income_source_data;
         const [labels, data] = [
           Object.keys(source_data),
-          Object.values(source_data),
+          Object.values(source_data).map(Number),
         ];
-  
+
         renderChart(data, labels);
       });
+    range.set("interval", intervalField.value);
+    fetch("/income/income_source_series?" + range)
+      .then((res) => res.json())
+      .then(renderSeries);
   };
-  
-  document.onload = getChartData();
\ No newline at end of file
+
+  const today = new Date();
+  endField.value = today.toISOString().slice(0, 10);
+  today.setDate(today.getDate() - 180);
+  startField.value = today.toISOString().slice(0, 10);
+  [startField, endField, intervalField].forEach((field) =>
+    field.addEventListener("change", getChartData)
+  );
+
+  document.onload = getChartData();
@@ -0,0 +1,39 @@
+// Suggests the user's own descriptions in inputs marked with
+// data-autocomplete="<url>". Picking one also selects its category/source
+// in the form's <select name="<data-label-field>">.
+document.querySelectorAll("[data-autocomplete]").forEach((input) => {
+  const list = document.createElement("datalist");
+  list.id = input.name + "-suggestions";
+  input.after(list);
+  input.setAttribute("list", list.id);
+  input.setAttribute("autocomplete", "off");
+  const labelField = input.dataset.labelField;
+  const select = input.form.querySelector(`select[name="${labelField}"]`);
+  let suggestions = [];
+
+  input.addEventListener("input", () => {
+    const picked = suggestions.find((item) => item.description === input.value);
+    if (picked) {
+      if (select && picked[labelField]) {
+        select.value = picked[labelField];
+      }
+      return;
+    }
+    const prefix = input.value.trim();
+    if (!prefix) {
+      list.innerHTML = "";
+      return;
+    }
+    fetch(input.dataset.autocomplete + "?" + new URLSearchParams({ q: prefix }))
+      .then((res) => res.json())
+      .then((data) => {
+        suggestions = data.results || [];
+        list.innerHTML = "";
+        suggestions.forEach((item) => {
+          const option = document.createElement("option");
+          option.value = item.description;
+          list.appendChild(option);
+        });
+      });
+  });
+});
@@ -16,6 +16,7 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from core import views as core_views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -23,4 +24,12 @@ urlpatterns = [
     path('authentication/', include('authentication.urls')),
     path('preferences/', include('userpreferences.urls')),
     path('income/', include('income.urls')),
+    path('metrics', core_views.metrics, name='metrics'),
+    path('ledger', core_views.ledger, name='ledger'),
+    path('ledger-data', core_views.ledger_data, name='ledger-data'),
+    path('budgets', core_views.budgets, name='budgets'),
+    path('budget-delete/<int:id>', core_views.delete_budget, name='budget-delete'),
+    path('budget-data', core_views.budget_data, name='budget-data'),
+    path('recurring', core_views.recurring, name='recurring'),
+    path('recurring-delete/<int:id>', core_views.delete_recurring, name='recurring-delete'),
 ]
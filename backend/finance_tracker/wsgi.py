@@ -9,8 +9,18 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'finance_tracker.settings')
 
 application = get_wsgi_application()
+
+# Only processes that serve requests send queued mail in-process; shells,
+# management commands and test runs leave the queue alone. Servers that
+# fork after loading this module (gunicorn --preload) should also call
+# start_workers() from their post-fork hook.
+if settings.EMAIL_QUEUE_WORKERS:
+    from authentication.mail import start_workers
+
+    start_workers()
@@ -1,6 +1,8 @@
 from django.contrib import admin
+
+from core.admin import LabelAdmin
 from .models import Income, Source
 # Register your models here.
 
 admin.site.register(Income)
-admin.site.register(Source)
+admin.site.register(Source, LabelAdmin)
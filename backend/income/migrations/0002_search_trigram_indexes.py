@@ -0,0 +1,37 @@
+from django.db import migrations
+
+# Trigram GIN indexes over the expressions Django emits for ``icontains`` on
+# PostgreSQL (UPPER(column) LIKE UPPER(%s)), so substring search is an index
+# lookup instead of a table scan. Other databases keep scanning.
+INDEXES = [
+    ('income_income_description_trgm', 'description'),
+    ('income_income_source_trgm', 'source'),
+]
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, column in INDEXES:
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS %s ON income_income '
+            'USING gin (UPPER(%s) gin_trgm_ops)' % (name, column))
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _ in INDEXES:
+        schema_editor.execute('DROP INDEX IF EXISTS %s' % name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('income', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:19
+
+import re
+
+from django.db import migrations, models
+
+
+def currency_from_preferences(apps, schema_editor):
+    # Amounts were entered in the owner's preferred currency, stored as e.g.
+    # "USD - United States Dollar".
+    UserPreference = apps.get_model('userpreferences', 'UserPreference')
+    Income = apps.get_model('income', 'Income')
+    for user_id, currency in UserPreference.objects.exclude(currency=None).values_list('user_id', 'currency'):
+        match = re.search(r'\b[A-Z]{3}\b', currency)
+        if match and match.group() != 'VND':
+            Income.objects.filter(owner_id=user_id).update(currency=match.group())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('income', '0005_decimal_amount'),
+        ('userpreferences', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='income',
+            name='currency',
+            field=models.CharField(default='VND', max_length=3),
+        ),
+        migrations.RunPython(currency_from_preferences, migrations.RunPython.noop),
+    ]
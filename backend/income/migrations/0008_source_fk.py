@@ -0,0 +1,98 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Substr, Trim
+
+
+def drop_trigram_index(apps, schema_editor):
+    # 0002's index over the text column; labels are now matched by id.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS income_income_source_trgm')
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE INDEX IF NOT EXISTS income_income_source_trgm ON income_income '
+                              'USING gin (UPPER(source) gin_trgm_ops)')
+
+
+def dedupe_sources(apps, schema_editor):
+    # One Source row per distinct name, covering every name the income rows
+    # use. Names are trimmed and cut to the Source.name length first.
+    Source = apps.get_model('income', 'Source')
+    Income = apps.get_model('income', 'Income')
+    Income.objects.update(source=Trim(Substr('source', 1, 255)))
+    Source.objects.update(name=Trim('name'))
+    duplicates = (Source.objects.values('name').annotate(keep=Min('pk'), n=Count('pk'))
+                  .filter(n__gt=1))
+    for row in duplicates:
+        Source.objects.filter(name=row['name']).exclude(pk=row['keep']).delete()
+    existing = set(Source.objects.values_list('name', flat=True))
+    used = Income.objects.order_by().values_list('source', flat=True).distinct()
+    Source.objects.bulk_create(Source(name=name) for name in used if name not in existing)
+
+
+def fill_source_ids(apps, schema_editor):
+    Source = apps.get_model('income', 'Source')
+    Income = apps.get_model('income', 'Income')
+    Income.objects.update(source_ref=Subquery(
+        Source.objects.filter(name=OuterRef('source')).values('pk')[:1]))
+
+
+def fill_source_names(apps, schema_editor):
+    Source = apps.get_model('income', 'Source')
+    Income = apps.get_model('income', 'Income')
+    Income.objects.update(source=Subquery(
+        Source.objects.filter(pk=OuterRef('source_ref')).values('name')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('income', '0007_recurrence'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_trigram_index, create_trigram_index),
+        migrations.RunPython(dedupe_sources, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='income',
+            name='source_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT,
+                                    related_name='+', to='income.source'),
+        ),
+        migrations.RunPython(fill_source_ids, fill_source_names),
+        migrations.RemoveIndex(
+            model_name='income',
+            name='income_owner_source_idx',
+        ),
+        # Unapplying re-adds the name column to a table that has rows.
+        migrations.AlterField(
+            model_name='income',
+            name='source',
+            field=models.CharField(max_length=266, default=''),
+        ),
+        migrations.RemoveField(
+            model_name='income',
+            name='source',
+        ),
+        migrations.RenameField(
+            model_name='income',
+            old_name='source_ref',
+            new_name='source',
+        ),
+        migrations.AlterField(
+            model_name='income',
+            name='source',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='income.source'),
+        ),
+        migrations.AlterField(
+            model_name='source',
+            name='name',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='income',
+            index=models.Index(fields=['owner', 'source', 'date'], name='income_owner_source_idx'),
+        ),
+    ]
@@ -4,21 +4,33 @@ from django.utils.timezone import now
 
 # Create your models here.
 class Income(models.Model):
-    amount = models.FloatField()  # DECIMAL
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
     date = models.DateField(default=now)
     description = models.TextField()
     owner = models.ForeignKey(to=User, on_delete=models.CASCADE)
-    source = models.CharField(max_length=266)
+    source = models.ForeignKey(to='Source', on_delete=models.PROTECT)
+    currency = models.CharField(max_length=3, default='VND')  # ISO 4217 code
+    import_hash = models.CharField(max_length=64, blank=True, default='')  # set by bulk imports
+    recurrence = models.ForeignKey(to='core.RecurringTransaction', null=True, blank=True,
+                                   on_delete=models.SET_NULL)  # the rule that generated the row
 
     def __str__(self):
-        return self.source
+        return self.source.name
 
     class Meta:
         ordering: ['-date']
+        indexes = [
+            models.Index(fields=['owner', '-date', '-id'], name='income_owner_date_idx'),
+            models.Index(fields=['owner', 'source', 'date'], name='income_owner_source_idx'),
+            models.Index(fields=['owner', 'import_hash'], name='income_owner_import_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['recurrence', 'date'], name='unique_income_occurrence'),
+        ]
 
 
 class Source(models.Model):
-    name = models.CharField(max_length=255)
+    name = models.CharField(max_length=255, unique=True)
 
     def __str__(self):
         return self.name
\ No newline at end of file
@@ -1,3 +1,176 @@
-from django.test import TestCase
+import json
+from decimal import Decimal
+
+from asgiref.sync import iscoroutinefunction
+from django.core.cache import cache
+from django.db.models import Sum
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core import labels, versions
+from core.batch import apply_batch
+from core.kinds import INCOME
+from core.seeding import seed
+from . import views
+from .models import Income
 
 # Create your tests here.
+class IncomeQueryCountTests(TestCase):
+    """Query budgets for the income views; they must not grow with the data."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Cached category/source ids may belong to another class's rolled back rows.
+        cache.clear()
+        cls.user, = seed(1, 0, 60, prefix='income-test', seed=1)
+        cls.income = Income.objects.filter(owner=cls.user).latest('date', 'id')
+        versions.bump([cls.user.pk])
+
+    def setUp(self):
+        cache.clear()
+        # The category/source list is shared by all users, so it is
+        # normally cached already.
+        labels.names(INCOME)
+        self.client.force_login(self.user)
+        # Same month and source as an existing row, so the rollup
+        # bucket is updated in place.
+        self.form = {'amount': '12.50', 'description': 'bonus',
+                     'income_date': self.income.date.isoformat(), 'source': self.income.source.name}
+
+    def add_rows(self, count):
+        seed(1, 0, count, prefix='income-extra', seed=2)
+        Income.objects.filter(owner__username__startswith='income-extra').update(owner=self.user)
+
+    def test_index(self):
+        # session, user, data version, currency preference, page, row count
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('income'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page_obj']), 5)
+
+    def test_index_next_page(self):
+        first = self.client.get(reverse('income')).context['page_obj']
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('income'), {'cursor': first.next_cursor})
+        self.assertTrue(response.context['page_obj'].has_previous())
+
+    def test_index_repeat_view(self):
+        self.client.get(reverse('income'))
+        # session, user, data version; the table comes from the fragment cache
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('income'))
+        self.assertContains(response, 'app-table')
+        self.assertNotContains(response, 'bonus')
+        self.client.post(reverse('add-income'), self.form)
+        self.assertContains(self.client.get(reverse('income')), 'bonus')
+
+    def test_search(self):
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('search_income'), {'searchText': 'salary'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['results'])
+        response = self.client.get(reverse('search_income'), {'searchText': 'salary', 'page': 'x'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('autocomplete_income'), {'q': 'sa', 'limit': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_summary(self):
+        # session, user, data version, currency preference, rollups, edges
+        with self.assertNumQueries(6):
+            self.client.get(reverse('income_source_summary'))
+
+    def test_summary_does_not_grow_with_rows(self):
+        self.add_rows(200)
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('income_source_summary'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_series(self):
+        self.add_rows(200)
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('income_source_series'), {'interval': 'week', 'days': 3650})
+        data = response.json()
+        self.assertEqual(len(data['totals']), len(data['periods']))
+        self.assertEqual(sum(map(Decimal, data['totals'])),
+                         Income.objects.filter(owner=self.user).aggregate(total=Sum('amount'))['total'])
+        self.assertEqual(self.client.get(reverse('income_source_series'), {'interval': 'hour'}).status_code, 400)
+
+    def test_json_endpoints_require_login(self):
+        for name in ('income_source_summary', 'income_source_series', 'search_income', 'autocomplete_income'):
+            response = Client().get(reverse(name))
+            self.assertRedirects(response, '/authentication/login?next=' + reverse(name),
+                                 fetch_redirect_response=False)
+
+    async def test_async_views(self):
+        for name in ('search_income', 'autocomplete_income', 'income_source_summary', 'income_source_series'):
+            self.assertTrue(iscoroutinefunction(getattr(views, name)), name)
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('search_income'), {'searchText': 'salary'})
+        self.assertTrue(response.json()['results'])
+        response = await self.async_client.get(reverse('income_source_summary'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_add(self):
+        # session, user, currency preference, savepoint, insert, rollup
+        # update, suggestion lookup and insert, data version, release
+        with self.assertNumQueries(10):
+            response = self.client.post(reverse('add-income'), self.form)
+        self.assertRedirects(response, reverse('income'), fetch_redirect_response=False)
+        self.assertTrue(Income.objects.filter(owner=self.user, description='bonus').exists())
+
+    def test_edit(self):
+        # session, user, row, currency preference, savepoint, update, rollup
+        # update, suggestion lookup, delete of the old description's and
+        # insert of the new one's, data version, release
+        with self.assertNumQueries(12):
+            response = self.client.post(reverse('income-edit', args=[self.income.pk]), self.form)
+        self.assertRedirects(response, reverse('income'), fetch_redirect_response=False)
+        self.income.refresh_from_db()
+        self.assertEqual(self.income.description, 'bonus')
+    def test_batch(self):
+        other = Income.objects.create(owner=seed(1, 0, 0, prefix='income-other')[0], amount='1.00',
+                                       date=self.income.date, description='not mine', source=self.income.source)
+        bucket = {'date': self.income.date.isoformat(), 'source': self.income.source.name}
+        mine = apply_batch(INCOME, self.user, [dict(bucket, op='create', amount='2.00', description='x')])[0]
+        operations = [
+            dict(bucket, op='create', amount='3.20', description='coffee'),
+            dict(bucket, op='create', amount='', description='bad'),
+            {'op': 'update', 'id': self.income.pk, 'description': 'renamed'},
+            {'op': 'delete', 'id': mine['id']},
+            {'op': 'delete', 'id': other.pk},
+        ]
+        # session, user, savepoint, locking select, insert, update, delete,
+        # rollup update, suggestion lookup, delete and insert, data version,
+        # release
+        with self.assertNumQueries(13):
+            response = self.client.post(reverse('batch-income'), json.dumps({'operations': operations}),
+                                        content_type='application/json')
+        results = response.json()['results']
+        self.assertEqual([r['status'] for r in results], ['created', 'error', 'updated', 'deleted', 'error'])
+        self.assertEqual(results[1]['error'], 'Amount is required')
+        self.assertEqual(results[4]['error'], 'Not found')
+        self.assertTrue(Income.objects.filter(pk=results[0]['id'], owner=self.user).exists())
+        self.assertEqual(Income.objects.get(pk=self.income.pk).description, 'renamed')
+        self.assertFalse(Income.objects.filter(pk=mine['id']).exists())
+        self.assertTrue(Income.objects.filter(pk=other.pk).exists())
+
+    def test_not_modified(self):
+        urls = [reverse('income'), reverse('income_source_summary'), reverse('search_income') + '?searchText=salary']
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        for url, etag in zip(urls, etags):
+            # session, user, data version; the income table is not read
+            with self.assertNumQueries(3):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+        apply_batch(INCOME, self.user, [{'op': 'delete', 'id': self.income.pk}])
+        for url, etag in zip(urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+
+    def test_batch_requires_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        response = client.post(reverse('batch-income'), json.dumps({'operations': []}),
+                               content_type='application/json')
+        self.assertEqual(response.status_code, 403)
@@ -6,11 +6,18 @@ from django.views.decorators.csrf import csrf_exempt
 urlpatterns = [
     path('', views.index, name="income"),
     path('add-income', views.add_income, name="add-income"),
+    path('import-income', views.import_income, name="import-income"),
+    path('batch-income', views.batch_income, name="batch-income"),
     path('edit-income/<int:id>', views.income_edit, name="income-edit"),
     path('income-delete/<int:id>', views.delete_income, name="income-delete"),
     path('search-income', csrf_exempt(views.search_income),
          name="search_income"),
+    path('autocomplete-income', views.autocomplete_income,
+         name="autocomplete_income"),
     path('income_source_summary', views.income_source_summary,
          name="income_source_summary"),
+    path('income_source_series', views.income_source_series,
+         name="income_source_series"),
+    path('export-income', views.export_income, name="export-income"),
     path('stats', views.stats_view, name="statsincome"),
 ]
\ No newline at end of file
@@ -1,52 +1,78 @@
-import datetime
+import copy
+import functools
 import json
 from django.http import JsonResponse
 from django.shortcuts import render
-from .models import Source, Income
-from userpreferences.models import UserPreference
+from .models import Income
 from django.shortcuts import redirect
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.conf import settings
 from django.contrib import messages
-from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from core.aggregation import date_window, totals
+from core.batch import apply_batch
+from core.exports import export_response
+from core.importers import import_file
+from core.kinds import INCOME
+from core.labels import label_id
+from core.money import parse_amount
+from core.pagination import CursorPaginator
+from core.rates import apreferred_currency, preferred_currency, validate_currency
+from core.rollups import asummarize, row_count
+from core.search import asearch
+from core.series import aseries
+from core.signals import transactions_changed
+from core.typeahead import asuggest
+from core.versions import conditional
 
 # Create your views here.
-def search_income(request):
-    if request.method == 'POST':
-        search_str = json.loads(request.body).get('searchText')
-        income = Income.objects.filter(
-            amount__istartswith=search_str, owner=request.user) | Income.objects.filter(
-            date__istartswith=search_str, owner=request.user) | Income.objects.filter(
-            description__icontains=search_str, owner=request.user) | Income.objects.filter(
-            source__icontains=search_str, owner=request.user)
-        data = income.values()
-        return JsonResponse(list(data), safe=False)
+@login_required(login_url='/authentication/login')
+@conditional
+async def search_income(request):
+    if request.method in ('GET', 'POST'):
+        data = request.GET if request.method == 'GET' else json.loads(request.body)
+        try:
+            page = int(data.get('page', 1))
+            limit = data.get('limit')
+            limit = None if limit is None else int(limit)
+        except (TypeError, ValueError):
+            return JsonResponse({'error': 'Invalid page or limit'}, status=400)
+        user = await request.auser()
+        results, has_next = await asearch(INCOME, user, data.get('searchText'), page=page, per_page=limit)
+        return JsonResponse({'results': results, 'has_next': has_next})
 
 
 @login_required(login_url='/authentication/login')
-def index(request):
-    source = Source.objects.all()
-    income = Income.objects.filter(owner=request.user).order_by('-date')
-    paginator = Paginator(income, 5)
-    page_number = request.GET.get('page')
-    page_obj = Paginator.get_page(paginator, page_number)
+@conditional
+async def autocomplete_income(request):
+    limit = request.GET.get('limit')
     try:
-        currency = UserPreference.objects.get(user=request.user).currency
-    except ObjectDoesNotExist:
-        currency = '(VND - Vietnamese Dong)'
+        limit = None if limit is None else int(limit)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid limit'}, status=400)
+    user = await request.auser()
+    results = await asuggest(INCOME, user, request.GET.get('q'), limit)
+    return JsonResponse({'results': results})
+
+
+@login_required(login_url='/authentication/login')
+@conditional
+def index(request):
+    income = Income.objects.filter(owner=request.user).select_related('source')
+    count = None
+    if settings.LIST_SHOW_TOTAL:
+        count = functools.partial(row_count, INCOME, request.user)
+    paginator = CursorPaginator(income, 5, count=count)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     context = {
-        'income': income,
         'page_obj': page_obj,
-        'currency': currency
     }
     return render(request, 'income/index.html', context)
 
 
 @login_required(login_url='/authentication/login')
 def add_income(request):
-    sources = Source.objects.all()
     context = {
-        'sources': sources,
         'values': request.POST
     }
     if request.method == 'GET':
@@ -58,6 +84,17 @@ def add_income(request):
         if not amount:
             messages.error(request, 'Amount is required')
             return render(request, 'income/add_income.html', context)
+        try:
+            amount = parse_amount(amount)
+        except ValueError as e:
+            messages.error(request, str(e))
+            return render(request, 'income/add_income.html', context)
+        try:
+            currency = validate_currency(request.POST.get('currency')
+                                         or preferred_currency(request.user))
+        except ValueError as e:
+            messages.error(request, str(e))
+            return render(request, 'income/add_income.html', context)
         description = request.POST['description']
         date = request.POST['income_date']
         source = request.POST['source']
@@ -73,22 +110,67 @@ def add_income(request):
         if not source:
             messages.error(request, 'Source is required')  
             return render(request, 'income/add_income.html', context)
+        try:
+            source = label_id(INCOME, source)
+        except ValueError as e:
+            messages.error(request, str(e))
+            return render(request, 'income/add_income.html', context)
 
-        Income.objects.create(owner=request.user, amount=amount, date=date,
-                                  source=source, description=description)
+        with transaction.atomic():
+            income = Income.objects.create(owner=request.user, amount=amount, date=date,
+                                           source_id=source, description=description,
+                                           currency=currency)
+            transactions_changed.send(sender=Income, added=[income])
         messages.success(request, 'Record saved successfully')
 
         return redirect('income')
 
 
+@login_required(login_url='/authentication/login')
+def import_income(request):
+    if request.method == 'GET':
+        return render(request, 'income/import_income.html')
+
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        if not upload:
+            messages.error(request, 'File is required')
+            return render(request, 'income/import_income.html')
+        try:
+            result = import_file(INCOME, request.user, upload.file,
+                                 format=request.POST.get('format') or None, name=upload.name)
+        except ValueError as e:
+            messages.error(request, str(e))
+            return render(request, 'income/import_income.html')
+        for line, message in result.errors:
+            messages.warning(request, 'Line %d: %s' % (line, message))
+        messages.success(request, 'Import finished: %s' % result)
+
+        return redirect('income')
+
+
+@login_required(login_url='/authentication/login')
+def batch_income(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+    try:
+        operations = json.loads(request.body)['operations']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected a JSON object with an operations list'}, status=400)
+    try:
+        results = apply_batch(INCOME, request.user, operations)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'results': results})
+
+
 @login_required(login_url='/authentication/login')
 def income_edit(request, id):
-    income = Income.objects.get(pk=id)
-    sources = Source.objects.all()
+    income = Income.objects.select_related('source').get(pk=id)
+    previous = copy.copy(income)
     context = {
         'income': income,
         'values': income,
-        'sources': sources
     }
     if request.method == 'GET':
         return render(request, 'income/edit_income.html', context)
@@ -98,6 +180,17 @@ def income_edit(request, id):
         if not amount:
             messages.error(request, 'Amount is required')
             return render(request, 'income/edit_income.html', context)
+        try:
+            amount = parse_amount(amount)
+        except ValueError as e:
+            messages.error(request, str(e))
+            return render(request, 'income/edit_income.html', context)
+        try:
+            currency = validate_currency(request.POST.get('currency')
+                                         or preferred_currency(request.user))
+        except ValueError as e:
+            messages.error(request, str(e))
+            return render(request, 'income/edit_income.html', context)
         description = request.POST['description']
         date = request.POST['income_date']
         source = request.POST['source']
@@ -105,12 +198,20 @@ def income_edit(request, id):
         if not description:
             messages.error(request, 'description is required')
             return render(request, 'income/edit_income.html', context)
+        try:
+            source = label_id(INCOME, source)
+        except ValueError as e:
+            messages.error(request, str(e))
+            return render(request, 'income/edit_income.html', context)
         income.amount = amount
         income. date = date
-        income.source = source
+        income.source_id = source
         income.description = description
+        income.currency = currency
 
-        income.save()
+        with transaction.atomic():
+            income.save()
+            transactions_changed.send(sender=Income, added=[income], removed=[previous])
         messages.success(request, 'Record updated  successfully')
 
         return redirect('income')
@@ -118,34 +219,44 @@ def income_edit(request, id):
 @login_required(login_url='/authentication/login')
 def delete_income(request, id):
     income = Income.objects.get(pk=id)
-    income.delete()
+    with transaction.atomic():
+        income.delete()
+        transactions_changed.send(sender=Income, removed=[income])
     messages.success(request, 'record removed')
     return redirect('income')
 
-def income_source_summary(request):
-    todays_date = datetime.date.today()
-    six_months_ago = todays_date-datetime.timedelta(days=30*6)
-    incomes = Income.objects.filter(owner=request.user,
-                                      date__gte=six_months_ago, date__lte=todays_date)
-    finalrep = {}
-
-    def get_source(income):
-        return income.source
-    source_list = list(set(map(get_source, incomes)))
-
-    def get_income_source_amount(source):
-        amount = 0
-        filtered_by_source = incomes.filter(source=source)
-
-        for item in filtered_by_source:
-            amount += item.amount
-        return amount
+@login_required(login_url='/authentication/login')
+@conditional
+async def income_source_summary(request):
+    user = await request.auser()
+    currency = await apreferred_currency(user)
+    try:
+        start, end = date_window(request.GET)
+        summary = await asummarize(INCOME, user, start, end, currency)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'income_source_data': totals(summary),
+                         'income_source_stats': summary,
+                         'start': start, 'end': end, 'currency': currency}, safe=False)
 
-    for x in incomes:
-        for y in source_list:
-            finalrep[y] = get_income_source_amount(y)
+@login_required(login_url='/authentication/login')
+@conditional
+async def income_source_series(request):
+    try:
+        start, end = date_window(request.GET)
+        user = await request.auser()
+        data = await aseries(INCOME, user, request.GET.get('interval', 'month'), start, end,
+                             await apreferred_currency(user))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(data)
 
-    return JsonResponse({'income_source_data': finalrep}, safe=False)
+@login_required(login_url='/authentication/login')
+def export_income(request):
+    try:
+        return export_response(INCOME, request.user, request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
 
 def stats_view(request):
     return render(request, 'income/statsIncome.html')
\ No newline at end of file
@@ -0,0 +1,150 @@
+"""
+Compare how many concurrent connections the WSGI and ASGI deployments sustain.
+
+Start the same code base twice, e.g.
+
+    gunicorn finance_tracker.wsgi:application --workers 4 --bind 127.0.0.1:8000
+    uvicorn finance_tracker.asgi:application --workers 4 --port 8001
+
+then point this script at both with a logged-in session cookie:
+
+    python scripts/compare_load.py \\
+        --target wsgi=http://127.0.0.1:8000 --target asgi=http://127.0.0.1:8001 \\
+        --path /search-expenses --body '{"searchText": "food"}' \\
+        --cookie "sessionid=..." --concurrency 10 50 200 --duration 15
+
+For every target and concurrency level it keeps that many keep-alive
+connections busy for --duration seconds and prints throughput, latency
+percentiles and the number of failed or timed-out requests. Only the
+standard library is used.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+
+async def read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('connection closed')
+    status = int(status_line.split()[1])
+    length = None
+    chunked = False
+    close = False
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name = name.strip().lower()
+        value = value.strip()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'transfer-encoding' and 'chunked' in value.lower():
+            chunked = True
+        elif name == 'connection' and value.lower() == 'close':
+            close = True
+    if chunked:
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length is not None:
+        await reader.readexactly(length)
+    else:
+        await reader.read()
+        close = True
+    return status, close
+
+
+async def client(url, request, deadline, timeout, latencies, failures):
+    reader = writer = None
+    while time.monotonic() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(url.hostname, url.port or 80), timeout)
+            started = time.monotonic()
+            writer.write(request)
+            await writer.drain()
+            status, close = await asyncio.wait_for(read_response(reader), timeout)
+            if status >= 500:
+                failures.append(status)
+            else:
+                latencies.append(time.monotonic() - started)
+            if close:
+                writer.close()
+                writer = None
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+            failures.append(type(e).__name__)
+            if writer is not None:
+                writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+def build_request(url, args):
+    method = 'POST' if args.body is not None else 'GET'
+    body = (args.body or '').encode()
+    headers = [
+        '%s %s HTTP/1.1' % (method, args.path),
+        'Host: %s' % url.netloc,
+        'Connection: keep-alive',
+        'Content-Length: %d' % len(body),
+        'Content-Type: application/json',
+    ]
+    if args.cookie:
+        headers.append('Cookie: %s' % args.cookie)
+    return ('\r\n'.join(headers) + '\r\n\r\n').encode() + body
+
+
+async def run_level(url, request, concurrency, args):
+    latencies = []
+    failures = []
+    deadline = time.monotonic() + args.duration
+    await asyncio.gather(*(client(url, request, deadline, args.timeout, latencies, failures)
+                           for _ in range(concurrency)))
+    return latencies, failures
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def main(args):
+    print('%-8s %6s %9s %8s %8s %8s %8s' % ('target', 'conns', 'req/s', 'p50 ms', 'p95 ms',
+                                           'p99 ms', 'failed'))
+    for target in args.target:
+        name, _, base = target.partition('=')
+        url = urlsplit(base)
+        request = build_request(url, args)
+        for concurrency in args.concurrency:
+            latencies, failures = await run_level(url, request, concurrency, args)
+            print('%-8s %6d %9.1f %8.1f %8.1f %8.1f %8d' % (
+                name, concurrency, len(latencies) / args.duration,
+                statistics.median(latencies) * 1000 if latencies else float('nan'),
+                percentile(latencies, 0.95) * 1000, percentile(latencies, 0.99) * 1000,
+                len(failures)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--target', action='append', required=True,
+                        help='name=http://host:port; repeat to compare deployments.')
+    parser.add_argument('--path', default='/search-expenses')
+    parser.add_argument('--body', help='JSON request body; sends a POST when given.')
+    parser.add_argument('--cookie', help='Cookie header, e.g. "sessionid=...".')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 50, 200])
+    parser.add_argument('--duration', type=float, default=10.0,
+                        help='Seconds per concurrency level.')
+    parser.add_argument('--timeout', type=float, default=10.0,
+                        help='Seconds before a request counts as failed.')
+    asyncio.run(main(parser.parse_args()))
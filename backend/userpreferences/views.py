@@ -1,20 +1,12 @@
 
 from django.shortcuts import render
-import os
-import json
-from django.conf import settings
 from .models import UserPreference
+from core.cache import get_currencies
 from django.contrib import messages
 
 # Create your views here.
 def index(request):
-    currency_data = []
-    file_path = os.path.join(settings.BASE_DIR, 'currencies.json')
-
-    with open(file_path, 'r') as json_file:
-        data = json.load(json_file)
-        for n, v in data.items():
-            currency_data.append({'name': n, 'value': v})
+    currency_data = get_currencies()
 
     exists = UserPreference.objects.filter(user=request.user).exists()
     user_preferences = None